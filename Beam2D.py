@@ -0,0 +1,472 @@
+"""
+Shared kernels for the 2D bead-spring / beam simulations.
+
+Gradients and Hessians of the discrete stretching and bending energies for a
+planar rod with DOF vector q = [x_0, y_0, x_1, y_1, ...], the elastic force
+assembly routines and the implicit Newton solver used by
+SimplySupportLoaded.py (backward Euler by default, or any scheme of
+TimeIntegrators.py).
+
+getFb and getFs run on the vectorized planar kernels of the DER engine
+(DER.py); gradEb, hessEb, gradEs and hessEs are the original per-node
+expressions, kept as the reference for the tests at the end of this file.
+"""
+
+import numpy as np
+
+from DER import getFb_planar, getFs_planar
+from ModelSetup import diagonalProduct
+from TimeIntegrators import BackwardEuler
+from Timing import NULL_STATS
+from Telemetry import telemetry, DEBUG
+
+def crossMat(a):
+    """
+    Returns the cross product matrix of vector 'a'.
+
+    Parameters:
+    a : np.ndarray
+        A 3-element array representing a vector.
+
+    Returns:
+    A : np.ndarray
+        The cross product matrix corresponding to vector 'a'.
+    """
+    A = np.array([[0, -a[2], a[1]],
+                  [a[2], 0, -a[0]],
+                  [-a[1], a[0], 0]])
+
+    return A
+
+def gradEb(xkm1, ykm1, xk, yk, xkp1, ykp1, curvature0, l_k, EI):
+    """
+    Returns the derivative of bending energy E_k^b with respect to
+    x_{k-1}, y_{k-1}, x_k, y_k, x_{k+1}, and y_{k+1}.
+
+    Parameters:
+    xkm1, ykm1 : float
+        Coordinates of the previous node (x_{k-1}, y_{k-1}).
+    xk, yk : float
+        Coordinates of the current node (x_k, y_k).
+    xkp1, ykp1 : float
+        Coordinates of the next node (x_{k+1}, y_{k+1}).
+    curvature0 : float
+        Discrete natural curvature at node (xk, yk).
+    l_k : float
+        Voronoi length of node (xk, yk).
+    EI : float
+        Bending stiffness.
+
+    Returns:
+    dF : np. 
+        Derivative of bending energy.
+    """
+
+    # Nodes in 3D
+    node0 = np.array([xkm1, ykm1, 0.0])
+    node1 = np.array([xk, yk, 0])
+    node2 = np.array([xkp1, ykp1, 0])
+
+    # Unit vectors along z-axis
+    m2e = np.array([0, 0, 1])
+    m2f = np.array([0, 0, 1])
+
+    kappaBar = curvature0
+
+    # Initialize gradient of curvature
+    gradKappa = np.zeros(6)
+
+    # Edge vectors
+    ee = node1 - node0
+    ef = node2 - node1
+
+    # Norms of edge vectors
+    norm_e = np.linalg.norm(ee)
+    norm_f = np.linalg.norm(ef)
+
+    # Unit tangents
+    te = ee / norm_e
+    tf = ef / norm_f
+
+    # Curvature binormal
+    kb = 2.0 * np.cross(te, tf) / (1.0 + np.dot(te, tf))
+
+    chi = 1.0 + np.dot(te, tf)
+    tilde_t = (te + tf) / chi
+    tilde_d2 = (m2e + m2f) / chi
+
+    # Curvature
+    kappa1 = kb[2]
+
+    # Gradient of kappa1 with respect to edge vectors
+    Dkappa1De = 1.0 / norm_e * (-kappa1 * tilde_t + np.cross(tf, tilde_d2))
+    Dkappa1Df = 1.0 / norm_f * (-kappa1 * tilde_t - np.cross(te, tilde_d2))
+
+    # Populate the gradient of kappa
+    gradKappa[0:2] = -Dkappa1De[0:2]
+    gradKappa[2:4] = Dkappa1De[0:2] - Dkappa1Df[0:2]
+    gradKappa[4:6] = Dkappa1Df[0:2]
+
+    # Gradient of bending energy
+    dkappa = kappa1 - kappaBar
+    dF = gradKappa * EI * dkappa / l_k
+
+    return dF
+
+def hessEb(xkm1, ykm1, xk, yk, xkp1, ykp1, curvature0, l_k, EI):
+    """
+    Returns the Hessian (second derivative) of bending energy E_k^b
+    with respect to x_{k-1}, y_{k-1}, x_k, y_k, x_{k+1}, and y_{k+1}.
+
+    Parameters:
+    xkm1, ykm1 : float
+        Coordinates of the previous node (x_{k-1}, y_{k-1}).
+    xk, yk : float
+        Coordinates of the current node (x_k, y_k).
+    xkp1, ykp1 : float
+        Coordinates of the next node (x_{k+1}, y_{k+1}).
+    curvature0 : float
+        Discrete natural curvature at node (xk, yk).
+    l_k : float
+        Voronoi length of node (xk, yk).
+    EI : float
+        Bending stiffness.
+
+    Returns:
+    dJ : np.ndarray
+        Hessian of bending energy.
+    """
+
+    # Nodes in 3D
+    node0 = np.array([xkm1, ykm1, 0])
+    node1 = np.array([xk, yk, 0])
+    node2 = np.array([xkp1, ykp1, 0])
+
+    # Unit vectors along z-axis
+    m2e = np.array([0, 0, 1])
+    m2f = np.array([0, 0, 1])
+
+    kappaBar = curvature0
+
+    # Initialize gradient of curvature
+    gradKappa = np.zeros(6)
+
+    # Edge vectors
+    ee = node1 - node0
+    ef = node2 - node1
+
+    # Norms of edge vectors
+    norm_e = np.linalg.norm(ee)
+    norm_f = np.linalg.norm(ef)
+
+    # Unit tangents
+    te = ee / norm_e
+    tf = ef / norm_f
+
+    # Curvature binormal
+    kb = 2.0 * np.cross(te, tf) / (1.0 + np.dot(te, tf))
+
+    chi = 1.0 + np.dot(te, tf)
+    tilde_t = (te + tf) / chi
+    tilde_d2 = (m2e + m2f) / chi
+
+    # Curvature
+    kappa1 = kb[2]
+
+    # Gradient of kappa1 with respect to edge vectors
+    Dkappa1De = 1.0 / norm_e * (-kappa1 * tilde_t + np.cross(tf, tilde_d2))
+    Dkappa1Df = 1.0 / norm_f * (-kappa1 * tilde_t - np.cross(te, tilde_d2))
+
+    # Populate the gradient of kappa
+    gradKappa[0:2] = -Dkappa1De[0:2]
+    gradKappa[2:4] = Dkappa1De[0:2] - Dkappa1Df[0:2]
+    gradKappa[4:6] = Dkappa1Df[0:2]
+
+    # Compute the Hessian (second derivative of kappa)
+    DDkappa1 = np.zeros((6, 6))
+
+    norm2_e = norm_e**2
+    norm2_f = norm_f**2
+
+    Id3 = np.eye(3)
+
+    # Helper matrices for second derivatives
+    tt_o_tt = np.outer(tilde_t, tilde_t)
+    tmp = np.cross(tf, tilde_d2)
+    tf_c_d2t_o_tt = np.outer(tmp, tilde_t)
+    kb_o_d2e = np.outer(kb, m2e)
+
+    D2kappa1De2 = (2 * kappa1 * tt_o_tt - tf_c_d2t_o_tt - tf_c_d2t_o_tt.T) / norm2_e - \
+                  kappa1 / (chi * norm2_e) * (Id3 - np.outer(te, te)) + \
+                  (kb_o_d2e + kb_o_d2e.T) / (4 * norm2_e)
+
+    tmp = np.cross(te, tilde_d2)
+    te_c_d2t_o_tt = np.outer(tmp, tilde_t)
+    tt_o_te_c_d2t = te_c_d2t_o_tt.T
+    kb_o_d2f = np.outer(kb, m2f)
+
+    D2kappa1Df2 = (2 * kappa1 * tt_o_tt + te_c_d2t_o_tt + te_c_d2t_o_tt.T) / norm2_f - \
+                  kappa1 / (chi * norm2_f) * (Id3 - np.outer(tf, tf)) + \
+                  (kb_o_d2f + kb_o_d2f.T) / (4 * norm2_f)
+    D2kappa1DeDf = -kappa1 / (chi * norm_e * norm_f) * (Id3 + np.outer(te, tf)) \
+                  + 1.0 / (norm_e * norm_f) * (2 * kappa1 * tt_o_tt - tf_c_d2t_o_tt + \
+                  tt_o_te_c_d2t - crossMat(tilde_d2))
+    D2kappa1DfDe = D2kappa1DeDf.T
+
+    # Populate the Hessian of kappa
+    DDkappa1[0:2, 0:2] = D2kappa1De2[0:2, 0:2]
+    DDkappa1[0:2, 2:4] = -D2kappa1De2[0:2, 0:2] + D2kappa1DeDf[0:2, 0:2]
+    DDkappa1[0:2, 4:6] = -D2kappa1DeDf[0:2, 0:2]
+    DDkappa1[2:4, 0:2] = -D2kappa1De2[0:2, 0:2] + D2kappa1DfDe[0:2, 0:2]
+    DDkappa1[2:4, 2:4] = D2kappa1De2[0:2, 0:2] - D2kappa1DeDf[0:2, 0:2] - \
+                         D2kappa1DfDe[0:2, 0:2] + D2kappa1Df2[0:2, 0:2]
+    DDkappa1[2:4, 4:6] = D2kappa1DeDf[0:2, 0:2] - D2kappa1Df2[0:2, 0:2]
+    DDkappa1[4:6, 0:2] = -D2kappa1DfDe[0:2, 0:2]
+    DDkappa1[4:6, 2:4] = D2kappa1DfDe[0:2, 0:2] - D2kappa1Df2[0:2, 0:2]
+    DDkappa1[4:6, 4:6] = D2kappa1Df2[0:2, 0:2]
+
+    # Hessian of bending energy
+    dkappa = kappa1 - kappaBar
+    dJ = 1.0 / l_k * EI * np.outer(gradKappa, gradKappa)
+    dJ += 1.0 / l_k * dkappa * EI * DDkappa1
+
+    return dJ
+
+def getFb(q, EI, deltaL, computeJ=True):
+    """
+    Compute the bending force and Jacobian of the bending force.
+
+    Uses the fused, node-vectorized planar kernels of the DER engine: the
+    shared geometry of every interior node is computed once for both the
+    gradient and the Hessian.
+
+    Parameters:
+    q : np.ndarray
+        DOF vector [x_0, y_0, x_1, y_1, ...].
+    EI : float
+        The bending stiffness.
+    deltaL : float
+        The Voronoi length.
+    computeJ : bool
+        If False only the force is computed and Jb is None (explicit schemes).
+
+    Returns:
+    Fb : np.ndarray
+        Bending force.
+    Jb : np.ndarray
+        Jacobian of the bending force (or None).
+    """
+    # Zero natural curvature and a uniform Voronoi length
+    return getFb_planar(q, 0.0, EI, deltaL, computeJ)
+
+def gradEs(xk, yk, xkp1, ykp1, l_k, EA):
+    """
+    Calculate the gradient of the stretching energy with respect to the coordinates.
+
+    Args:
+    - xk (float): x coordinate of the current point
+    - yk (float): y coordinate of the current point
+    - xkp1 (float): x coordinate of the next point
+    - ykp1 (float): y coordinate of the next point
+    - l_k (float): reference length
+    - EA (float): elastic modulus
+
+    Returns:
+    - F (np.array): Gradient array
+    """
+    F = np.zeros(4)
+    F[0] = -(1.0 - np.sqrt((xkp1 - xk)**2.0 + (ykp1 - yk)**2.0) / l_k) * ((xkp1 - xk)**2.0 + (ykp1 - yk)**2.0)**(-0.5) / l_k * (-2.0 * xkp1 + 2.0 * xk)
+    F[1] = -(0.1e1 - np.sqrt((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) / l_k) * ((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) ** (-0.1e1 / 0.2e1) / l_k * (-0.2e1 * ykp1 + 0.2e1 * yk)
+    F[2] = -(0.1e1 - np.sqrt((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) / l_k) * ((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) ** (-0.1e1 / 0.2e1) / l_k * (0.2e1 * xkp1 - 0.2e1 * xk)
+    F[3] = -(0.1e1 - np.sqrt((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) / l_k) * ((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) ** (-0.1e1 / 0.2e1) / l_k * (0.2e1 * ykp1 - 0.2e1 * yk)
+
+    F = 0.5 * EA * l_k * F  # Scale by EA and l_k
+
+    return F
+
+def hessEs(xk, yk, xkp1, ykp1, l_k, EA):
+    """
+    This function returns the 4x4 Hessian of the stretching energy E_k^s with
+    respect to x_k, y_k, x_{k+1}, and y_{k+1}.
+    """
+    J = np.zeros((4, 4))  # Initialize the Hessian matrix
+    J11 = (1 / ((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) / l_k ** 2 * (-2 * xkp1 + 2 * xk) ** 2) / 0.2e1 + (0.1e1 - np.sqrt(((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2)) / l_k) * (((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) ** (-0.3e1 / 0.2e1)) / l_k * ((-2 * xkp1 + 2 * xk) ** 2) / 0.2e1 - 0.2e1 * (0.1e1 - np.sqrt(((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2)) / l_k) * (((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) ** (-0.1e1 / 0.2e1)) / l_k
+    J12 = (1 / ((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) / l_k ** 2 * (-2 * ykp1 + 2 * yk) * (-2 * xkp1 + 2 * xk)) / 0.2e1 + (0.1e1 - np.sqrt(((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2)) / l_k) * (((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) ** (-0.3e1 / 0.2e1)) / l_k * (-2 * xkp1 + 2 * xk) * (-2 * ykp1 + 2 * yk) / 0.2e1
+    J13 = (1 / ((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) / l_k ** 2 * (2 * xkp1 - 2 * xk) * (-2 * xkp1 + 2 * xk)) / 0.2e1 + (0.1e1 - np.sqrt(((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2)) / l_k) * (((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) ** (-0.3e1 / 0.2e1)) / l_k * (-2 * xkp1 + 2 * xk) * (2 * xkp1 - 2 * xk) / 0.2e1 + 0.2e1 * (0.1e1 - np.sqrt(((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2)) / l_k) * (((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) ** (-0.1e1 / 0.2e1)) / l_k
+    J14 = (1 / ((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) / l_k ** 2 * (2 * ykp1 - 2 * yk) * (-2 * xkp1 + 2 * xk)) / 0.2e1 + (0.1e1 - np.sqrt(((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2)) / l_k) * (((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) ** (-0.3e1 / 0.2e1)) / l_k * (-2 * xkp1 + 2 * xk) * (2 * ykp1 - 2 * yk) / 0.2e1
+    J22 = (1 / ((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) / l_k ** 2 * (-2 * ykp1 + 2 * yk) ** 2) / 0.2e1 + (0.1e1 - np.sqrt(((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2)) / l_k) * (((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) ** (-0.3e1 / 0.2e1)) / l_k * ((-2 * ykp1 + 2 * yk) ** 2) / 0.2e1 - 0.2e1 * (0.1e1 - np.sqrt(((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2)) / l_k) * (((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) ** (-0.1e1 / 0.2e1)) / l_k
+    J23 = (1 / ((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) / l_k ** 2 * (2 * xkp1 - 2 * xk) * (-2 * ykp1 + 2 * yk)) / 0.2e1 + (0.1e1 - np.sqrt(((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2)) / l_k) * (((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) ** (-0.3e1 / 0.2e1)) / l_k * (-2 * ykp1 + 2 * yk) * (2 * xkp1 - 2 * xk) / 0.2e1
+    J24 = (1 / ((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) / l_k ** 2 * (2 * ykp1 - 2 * yk) * (-2 * ykp1 + 2 * yk)) / 0.2e1 + (0.1e1 - np.sqrt(((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2)) / l_k) * (((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) ** (-0.3e1 / 0.2e1)) / l_k * (-2 * ykp1 + 2 * yk) * (2 * ykp1 - 2 * yk) / 0.2e1 + 0.2e1 * (0.1e1 - np.sqrt(((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2)) / l_k) * (((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) ** (-0.1e1 / 0.2e1)) / l_k
+    J33 = (1 / ((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) / l_k ** 2 * (2 * xkp1 - 2 * xk) ** 2) / 0.2e1 + (0.1e1 - np.sqrt(((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2)) / l_k) * (((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) ** (-0.3e1 / 0.2e1)) / l_k * ((2 * xkp1 - 2 * xk) ** 2) / 0.2e1 - 0.2e1 * (0.1e1 - np.sqrt(((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2)) / l_k) * (((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) ** (-0.1e1 / 0.2e1)) / l_k
+    J34 = (1 / ((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) / l_k ** 2 * (2 * ykp1 - 2 * yk) * (2 * xkp1 - 2 * xk)) / 0.2e1 + (0.1e1 - np.sqrt(((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2)) / l_k) * (((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) ** (-0.3e1 / 0.2e1)) / l_k * (2 * xkp1 - 2 * xk) * (2 * ykp1 - 2 * yk) / 0.2e1
+    J44 = (1 / ((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) / l_k ** 2 * (2 * ykp1 - 2 * yk) ** 2) / 0.2e1 + (0.1e1 - np.sqrt(((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2)) / l_k) * (((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) ** (-0.3e1 / 0.2e1)) / l_k * ((2 * ykp1 - 2 * yk) ** 2) / 0.2e1 - 0.2e1 * (0.1e1 - np.sqrt(((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2)) / l_k) * (((xkp1 - xk) ** 2 + (ykp1 - yk) ** 2) ** (-0.1e1 / 0.2e1)) / l_k
+
+    J = np.array([[J11, J12, J13, J14],
+                   [J12, J22, J23, J24],
+                   [J13, J23, J33, J34],
+                   [J14, J24, J34, J44]])
+
+    J *= 0.5 * EA * l_k
+
+    return J
+
+def getFs(q, EA, deltaL, computeJ=True):
+    """
+    Compute the stretching force and Jacobian of the stretching force.
+
+    Uses the edge-vectorized planar kernels of the DER engine; every edge
+    length is computed once per call.
+
+    Parameters:
+    q : np.ndarray
+        DOF vector [x_0, y_0, x_1, y_1, ...].
+    EA : float
+        The stretching stiffness.
+    deltaL : float
+        The reference edge length.
+    computeJ : bool
+        If False only the force is computed and Js is None (explicit schemes).
+
+    Returns:
+    Fs : np.ndarray
+        Stretching force.
+    Js : np.ndarray
+        Jacobian of the stretching force (or None).
+    """
+    return getFs_planar(q, EA, deltaL, computeJ)
+
+def objfun(q_guess, q_old, u_old, dt, tol, maximum_iter,
+           m, mMat,  # inertia (mass matrix or the mass vector)
+           EI, EA,   # elastic stiffness
+           W, C,     # external force (damping matrix or vector of damping coefficients)
+           deltaL,
+           free_index, # free_index indicates the DOFs that evolve under equations of motion
+           scheme=None, # time integration scheme (TimeIntegrators.py), backward Euler if None
+           stats=None): # Timing.SolverStats or Memory.MemoryStats collecting per-phase statistics
+    # With a scheme object the velocity at the end of the step is scheme.u
+
+    if scheme is None:
+        scheme = BackwardEuler()
+    if stats is None:
+        stats = NULL_STATS
+    scheme.start(q_old, u_old, dt, m,
+                 lambda: (getFb(q_old, EI, deltaL, computeJ=False)[0] +
+                          getFs(q_old, EA, deltaL, computeJ=False)[0] + W - diagonalProduct(C, u_old)),
+                 free_index)
+
+    q_new = q_guess.copy()
+
+    # Newton-Raphson scheme
+    iter_count = 0  # number of iterations
+    error = tol * 10  # norm of function value (initialized to a value higher than tolerance)
+    flag = 1  # Start with a 'good' simulation (flag=1 means no error)
+
+    while error > tol:
+        # Get elastic forces where the scheme evaluates them (q_new for backward Euler)
+        t = stats.tic()
+        q_eval = scheme.evaluation_point(q_new)
+        Fb, Jb = getFb(q_eval, EI, deltaL)
+        t = stats.toc('getFb', t)
+        Fs, Js = getFs(q_eval, EA, deltaL)
+        t = stats.toc('getFs', t)
+
+        # Viscous force
+        Fv = -diagonalProduct(C, scheme.velocity(q_new))
+
+        # Equation of motion
+        G = Fb + Fs + W + Fv
+        f = scheme.residual(q_new, m, G)
+
+        # Manipulate the Jacobians
+        J = scheme.jacobian(mMat, Jb + Js, C)
+
+        # We have to separate the "free" parts of f and J
+        f_free = f[free_index]
+        J_free = J[np.ix_(free_index, free_index)]
+        t = stats.toc('eom', t)
+
+        # Newton's update
+        # q_new = q_new - np.linalg.solve(J, f)
+        # We have to only update the free DOFs
+        dq_free = np.linalg.solve(J_free, f_free)
+        t = stats.toc('solve', t)
+        q_new[free_index] = q_new[free_index] - dq_free
+
+        # Get the norm
+        # error = np.linalg.norm(f)
+        # We have to calculate the errors based on free DOFs
+        error = np.linalg.norm(f_free)
+
+        # Update iteration number
+        iter_count += 1
+        telemetry.emit('newton_iteration', DEBUG, iteration = iter_count - 1, residual = error)
+
+        if iter_count > maximum_iter:
+            flag = -1  # return with an error signal
+            return q_new, flag
+
+    stats.end_step(iter_count)
+    scheme.finish(q_new, G)
+    return q_new, flag
+
+def test_getFs():
+    """
+    Checks the vectorized stretching force and Jacobian against the
+    per-edge expressions gradEs and hessEs.
+    """
+    rng = np.random.default_rng(0)
+    nv = 7
+    deltaL = 0.1
+    EA = 3.0e3
+    q = np.zeros(2 * nv)
+    q[0::2] = np.arange(nv) * deltaL
+    q = q + 0.02 * rng.standard_normal(2 * nv)
+
+    Fs_ref = np.zeros(2 * nv)
+    Js_ref = np.zeros((2 * nv, 2 * nv))
+    for k in range(nv - 1):
+        ind = np.arange(2*k, 2*k+4)
+        Fs_ref[ind] -= gradEs(q[2*k], q[2*k+1], q[2*k+2], q[2*k+3], deltaL, EA)
+        Js_ref[np.ix_(ind, ind)] -= hessEs(q[2*k], q[2*k+1], q[2*k+2], q[2*k+3], deltaL, EA)
+
+    Fs, Js = getFs(q, EA, deltaL)
+    assert np.allclose(Fs, Fs_ref, rtol=1e-12, atol=1e-12 * np.abs(Fs_ref).max()), "Stretching force mismatch"
+    assert np.allclose(Js, Js_ref, rtol=1e-12, atol=1e-12 * np.abs(Js_ref).max()), "Stretching Jacobian mismatch"
+
+    Fs_only, Js_none = getFs(q, EA, deltaL, computeJ=False)
+    assert np.array_equal(Fs_only, Fs) and Js_none is None, "Force-only stretching mismatch"
+
+    print("All test cases passed")
+
+def test_getFb():
+    """
+    Checks the fused bending force and Jacobian against the per-node
+    expressions gradEb and hessEb.
+    """
+    rng = np.random.default_rng(1)
+    nv = 7
+    deltaL = 0.1
+    EI = 2.0
+    q = np.zeros(2 * nv)
+    q[0::2] = np.arange(nv) * deltaL
+    q = q + 0.02 * rng.standard_normal(2 * nv)
+
+    Fb_ref = np.zeros(2 * nv)
+    Jb_ref = np.zeros((2 * nv, 2 * nv))
+    for k in range(1, nv - 1):
+        ind = np.arange(2*k-2, 2*k+4)
+        Fb_ref[ind] -= gradEb(*q[2*k-2:2*k+4], 0, deltaL, EI)
+        Jb_ref[np.ix_(ind, ind)] -= hessEb(*q[2*k-2:2*k+4], 0, deltaL, EI)
+
+    Fb, Jb = getFb(q, EI, deltaL)
+    assert np.allclose(Fb, Fb_ref, rtol=1e-12, atol=1e-12 * np.abs(Fb_ref).max()), "Bending force mismatch"
+    assert np.allclose(Jb, Jb_ref, rtol=1e-12, atol=1e-12 * np.abs(Jb_ref).max()), "Bending Jacobian mismatch"
+
+    Fb_only, Jb_none = getFb(q, EI, deltaL, computeJ=False)
+    assert np.allclose(Fb_only, Fb, rtol=1e-14, atol=0) and Jb_none is None, "Force-only bending mismatch"
+
+    print("All test cases passed")
+
+if __name__ == "__main__":
+    test_getFs()
+    test_getFb()
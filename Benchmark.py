@@ -0,0 +1,228 @@
+"""
+Scaling benchmarks of the DER engine (DER.py).
+
+For every rod size nv the suite times
+
+    getFs, getFb, getFt    elastic force and Jacobian assembly
+    frames                 computeTimeParallel + getRefTwist + computeMaterialFrame
+    objfun                 one Newton solve of a time step (from rest, under gravity)
+    step                   one time step as in the main loop of DER.py (objfun and
+                           the state update)
+
+on the helix of DER.py (RodLength = 0.2, natR = 0.02, r0 = 1e-3) discretized
+with nv nodes, and reports the time per call and per element, the memory
+high-water (tracemalloc peak of one call) and the Newton iterations. The
+'helix' case runs the original simulation of DER.py (nv = 20, dt = 0.01) for
+a fixed number of steps and also records the z-coordinate of the last node,
+so an optimization that changes the result is caught as well.
+
+The Jacobians are dense (ndof x ndof), so sizes whose Jacobians do not fit in
+max_dense_bytes are reported as skipped instead of run.
+
+    python Benchmark.py                                  # nv = 10, 100, 1000
+    python Benchmark.py --nv 10 100 1000 10000 --repeat 5
+    python Benchmark.py --save benchmark_baseline.json   # store a baseline
+    python Benchmark.py --baseline benchmark_baseline.json --tolerance 0.5
+
+With --baseline the run fails (exit status 1) if a case is more than
+tolerance slower per element than the baseline, needs more Newton
+iterations, or if the helix result moved. Baselines are machine dependent;
+store one per machine.
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import DER
+from ModelSetup import rodNodes, rodMass, derGravity, derDOF, referenceLengths
+from Timing import SolverStats
+
+def helixRod(nv, RodLength=0.2, natR=0.02, r0=1e-3, Y=10e6, nu=0.5, rho=1000.0, dt=0.01):
+    """
+    Model of the DER.py helix (clamped ring of radius natR under gravity)
+    with nv nodes, as a dict of the arguments of DER.objfun.
+    """
+    ndof = 4 * nv - 1
+    nodes = rodNodes(nv, RodLength, natR)
+
+    G = Y / (2.0 * (1.0 + nu))
+    EI = Y * np.pi * r0**4 / 4
+    GJ = G * np.pi * r0**4 / 2
+    EA = Y * np.pi * r0**2
+
+    massVector = rodMass(nv, RodLength, r0, rho)
+    Fg = derGravity(massVector, [0, 0, -9.81])
+    q0 = derDOF(nodes)
+    refLen, voronoiRefLen = referenceLengths(nodes)
+
+    tangent = DER.computeTangent(q0)
+    a1_first = np.cross(tangent[0, :], np.array([0, 0, -1]))
+    a1, a2 = DER.computeSpaceParallel(a1_first / np.linalg.norm(a1_first), q0)
+    m1, m2 = DER.computeMaterialFrame(a1, a2, q0[3::4])
+    refTwist = DER.getRefTwist(a1, tangent, np.zeros(nv))
+
+    return dict(q0=q0, u=np.zeros(ndof), a1=a1, a2=a2, freeIndex=np.arange(7, ndof),
+                dt=dt, tol=EI / RodLength**2 * 1e-3, refTwist=refTwist,
+                massVector=massVector, mMat=massVector, EA=EA, refLen=refLen,
+                EI=EI, GJ=GJ, voronoiRefLen=voronoiRefLen, kappaBar=DER.getKappa(q0, m1, m2),
+                twistBar=np.zeros(nv), Fg=Fg, m1=m1, m2=m2)
+
+def _objfun(model, q, u, a1, a2, stats):
+    return DER.objfun(q.copy(), q, u, a1, a2, model['freeIndex'], model['dt'], model['tol'],
+                      model['refTwist'], model['massVector'], model['mMat'], model['EA'],
+                      model['refLen'], model['EI'], model['GJ'], model['voronoiRefLen'],
+                      model['kappaBar'], model['twistBar'], model['Fg'], stats = stats)
+
+def measure(fn, repeat):
+    """
+    Best wall time of repeat calls of fn and the tracemalloc peak [bytes] of
+    one more call.
+    """
+    best = np.inf
+    for k in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+def benchmarkSize(nv, repeat=3, max_dense_bytes=2e9):
+    """Records of every case for a rod with nv nodes."""
+    ndof = 4 * nv - 1
+    cases = ('getFs', 'getFb', 'getFt', 'frames', 'objfun', 'step')
+    if 8 * ndof**2 * 6 > max_dense_bytes:
+        return [{'case': case, 'nv': nv, 'skipped': 'dense Jacobian exceeds max_dense_bytes'}
+                for case in cases]
+
+    model = helixRod(nv)
+    q = model['q0'] + 1e-4 * np.random.default_rng(0).standard_normal(ndof)
+    m1, m2 = DER.computeMaterialFrame(model['a1'], model['a2'], q[3::4])
+
+    def frames():
+        a1, a2 = DER.computeTimeParallel(model['a1'], model['q0'], q)
+        refTwist = DER.getRefTwist(a1, DER.computeTangent(q), model['refTwist'])
+        return DER.computeMaterialFrame(a1, a2, q[3::4])
+
+    stats = SolverStats()
+    def step():
+        qNew, uNew, a1, a2 = _objfun(model, model['q0'], model['u'], model['a1'], model['a2'], stats)
+        DER.getRefTwist(a1, DER.computeTangent(qNew), model['refTwist'])
+        return qNew.copy()
+
+    functions = {
+        'getFs': (lambda: DER.getFs(q, model['EA'], model['refLen']), nv - 1),
+        'getFb': (lambda: DER.getFb(q, m1, m2, model['kappaBar'], model['EI'], model['voronoiRefLen']), nv - 2),
+        'getFt': (lambda: DER.getFt(q, model['refTwist'], model['twistBar'], model['GJ'], model['voronoiRefLen']), nv - 2),
+        'frames': (frames, nv - 1),
+        'objfun': (lambda: _objfun(model, model['q0'], model['u'], model['a1'], model['a2'], stats), nv),
+        'step': (step, nv),
+    }
+
+    records = []
+    for case in cases:
+        fn, nelem = functions[case]
+        stats.reset()
+        t, peak = measure(fn, repeat)
+        record = {'case': case, 'nv': nv, 'time': t, 'time_per_element': t / nelem,
+                  'peak_memory': peak}
+        if stats.steps:
+            record['newton_iterations'] = stats.newton_iterations[-1]
+        records.append(record)
+    return records
+
+def helixCase(Nsteps=20):
+    """The simulation of DER.py (nv = 20) for Nsteps steps."""
+    model = helixRod(20)
+    q, u, a1, a2 = model['q0'].copy(), model['u'].copy(), model['a1'], model['a2']
+    refTwist = model['refTwist']
+    stats = SolverStats()
+    t0 = time.perf_counter()
+    for timeStep in range(Nsteps):
+        q, u, a1, a2 = DER.objfun(q.copy(), q, u, a1, a2, model['freeIndex'], model['dt'], model['tol'],
+                                  refTwist, model['massVector'], model['mMat'], model['EA'],
+                                  model['refLen'], model['EI'], model['GJ'], model['voronoiRefLen'],
+                                  model['kappaBar'], model['twistBar'], model['Fg'], stats = stats)
+    t = time.perf_counter() - t0
+    return {'case': 'helix', 'nv': 20, 'steps': Nsteps, 'time': t,
+            'time_per_element': t / (Nsteps * 20),
+            'newton_iterations': int(np.sum(stats.newton_iterations)), 'endZ': float(q[-1])}
+
+def runBenchmarks(nvs=(10, 100, 1000), repeat=3, max_dense_bytes=2e9, helix_steps=20):
+    """All records: the helix case and every case for every nv."""
+    records = [helixCase(helix_steps)]
+    for nv in nvs:
+        records += benchmarkSize(nv, repeat, max_dense_bytes)
+    return records
+
+def compareBaseline(records, baseline, tolerance=0.5, rtol=1e-8):
+    """
+    Regressions of records with respect to baseline (both lists of records):
+    time per element more than (1 + tolerance) times the baseline, more Newton
+    iterations, or a helix endZ that differs by more than rtol.
+    """
+    reference = {(r['case'], r['nv']): r for r in baseline}
+    regressions = []
+    for r in records:
+        base = reference.get((r['case'], r['nv']))
+        if base is None or 'skipped' in r or 'skipped' in base:
+            continue
+        name = f"{r['case']} nv={r['nv']}"
+        if r['time_per_element'] > (1 + tolerance) * base['time_per_element']:
+            regressions.append(f"{name}: {r['time_per_element']:.3e} s per element, "
+                               f"baseline {base['time_per_element']:.3e}")
+        if r.get('newton_iterations', 0) > base.get('newton_iterations', np.inf):
+            regressions.append(f"{name}: {r['newton_iterations']} Newton iterations, "
+                               f"baseline {base['newton_iterations']}")
+        if 'endZ' in base and abs(r['endZ'] - base['endZ']) > rtol * abs(base['endZ']):
+            regressions.append(f"{name}: endZ = {r['endZ']:.12e}, baseline {base['endZ']:.12e}")
+    return regressions
+
+def report(records):
+    """Table of the records."""
+    lines = [f"{'case':<8}{'nv':>7}{'time [s]':>12}{'per element [s]':>17}{'peak [MB]':>11}{'Newton':>8}"]
+    for r in records:
+        if 'skipped' in r:
+            lines.append(f"{r['case']:<8}{r['nv']:>7}  skipped: {r['skipped']}")
+            continue
+        peak = f"{r['peak_memory'] / 1e6:.2f}" if 'peak_memory' in r else '-'
+        lines.append(f"{r['case']:<8}{r['nv']:>7}{r['time']:>12.4e}{r['time_per_element']:>17.4e}"
+                     f"{peak:>11}{r.get('newton_iterations', ''):>8}")
+    return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scaling benchmarks of the DER engine')
+    parser.add_argument('--nv', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-dense-bytes', type=float, default=2e9)
+    parser.add_argument('--helix-steps', type=int, default=20)
+    parser.add_argument('--save', help='write the records to this JSON file')
+    parser.add_argument('--baseline', help='compare with the records of this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed relative slowdown per element')
+    args = parser.parse_args(argv)
+
+    records = runBenchmarks(args.nv, args.repeat, args.max_dense_bytes, args.helix_steps)
+    print(report(records))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(records, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compareBaseline(records, json.load(f), args.tolerance)
+        for line in regressions:
+            print('REGRESSION ' + line)
+        if regressions:
+            return 1
+        print('No regression against ' + args.baseline)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,401 @@
+"""
+Compiled (Numba) element kernels and assembly loops of the DER engine.
+
+getFs_compiled, getFb_compiled and getFt_compiled return the same forces
+and Jacobians as DER.getFs, DER.getFb and DER.getFt. Every element is
+evaluated with scalar 3-vector arithmetic (the same formulas as
+gradEs_hessEs, gradEb_hessEb and gradEt_hessEt) and scattered into the
+global arrays in the same loop, so no (ne, 11, 11) stack of element
+Hessians is ever built. The element loops run in parallel with prange:
+elements are split into colours (2 for stretching, 3 for bending and
+twisting) so that two elements of the same colour never share a DOF and the
+scatter needs no locks or private copies.
+
+numba is optional. When it is not installed HAVE_NUMBA is False, njit is a
+no-op and prange is range, so the kernels still run (slowly) as plain Python
+and can be tested; DER then keeps its NumPy loops (see DER.set_backend).
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        # Stand-in for numba.njit used both as @njit and @njit(...)
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda f: f
+
+# Small 3-vector helpers
+
+@njit(cache=True)
+def _cross(a, b):
+    out = np.empty(3)
+    out[0] = a[1] * b[2] - a[2] * b[1]
+    out[1] = a[2] * b[0] - a[0] * b[2]
+    out[2] = a[0] * b[1] - a[1] * b[0]
+    return out
+
+@njit(cache=True)
+def _dot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+@njit(cache=True)
+def _outer(a, b):
+    out = np.empty((3, 3))
+    for i in range(3):
+        for j in range(3):
+            out[i, j] = a[i] * b[j]
+    return out
+
+@njit(cache=True)
+def _crossMat(a):
+    out = np.zeros((3, 3))
+    out[0, 1] = -a[2]
+    out[0, 2] = a[1]
+    out[1, 0] = a[2]
+    out[1, 2] = -a[0]
+    out[2, 0] = -a[1]
+    out[2, 1] = a[0]
+    return out
+
+@njit(cache=True)
+def _curvatureBlocks(DDkappa, De2, Df2, DeDf, DfDe, Dthetae2, Dthetaf2,
+                     DeDthetae, DeDthetaf, DfDthetae, DfDthetaf):
+    # Hessian of one curvature (or of the twist) from its edge blocks, as in
+    # DER.gradEb_hessEb
+    for i in range(3):
+        for j in range(3):
+            DDkappa[i, j] = De2[i, j]
+            DDkappa[i, 4 + j] = - De2[i, j] + DfDe[i, j]
+            DDkappa[i, 8 + j] = - DfDe[i, j]
+            DDkappa[4 + i, j] = - De2[i, j] + DeDf[i, j]
+            DDkappa[4 + i, 4 + j] = De2[i, j] - DeDf[i, j] - DfDe[i, j] + Df2[i, j]
+            DDkappa[4 + i, 8 + j] = DfDe[i, j] - Df2[i, j]
+            DDkappa[8 + i, j] = - DeDf[i, j]
+            DDkappa[8 + i, 4 + j] = DeDf[i, j] - Df2[i, j]
+            DDkappa[8 + i, 8 + j] = Df2[i, j]
+
+    DDkappa[3, 3] = Dthetae2
+    DDkappa[7, 7] = Dthetaf2
+    for i in range(3):
+        DDkappa[i, 3] = - DeDthetae[i]
+        DDkappa[4 + i, 3] = DeDthetae[i] - DfDthetae[i]
+        DDkappa[8 + i, 3] = DfDthetae[i]
+        DDkappa[i, 7] = - DeDthetaf[i]
+        DDkappa[4 + i, 7] = DeDthetaf[i] - DfDthetaf[i]
+        DDkappa[8 + i, 7] = DfDthetaf[i]
+    for i in (0, 1, 2, 4, 5, 6, 8, 9, 10):
+        DDkappa[3, i] = DDkappa[i, 3]
+        DDkappa[7, i] = DDkappa[i, 7]
+
+# Element kernels (gradient and Hessian of one element, scattered into F, J)
+
+@njit(cache=True)
+def gradEs_hessEs_scatter(q, c, l_k, EA, F, J):
+    """
+    Stretching force and Jacobian of edge c (DER.gradEs_hessEs) subtracted
+    from F and J in place.
+    """
+    s0 = 4 * c
+    s1 = 4 * c + 4
+    edge = np.empty(3)
+    for i in range(3):
+        edge[i] = q[s1 + i] - q[s0 + i]
+    edgeLen = np.sqrt(_dot(edge, edge))
+    epsX = edgeLen / l_k - 1
+    a = EA * (1 / l_k - 1 / edgeLen)
+    b = EA / edgeLen**3
+
+    for i in range(3):
+        dF = EA * edge[i] / edgeLen * epsX
+        F[s0 + i] += dF
+        F[s1 + i] -= dF
+        for j in range(3):
+            M = b * edge[i] * edge[j]
+            if i == j:
+                M += a
+            J[s0 + i, s0 + j] -= M
+            J[s1 + i, s1 + j] -= M
+            J[s0 + i, s1 + j] += M
+            J[s1 + i, s0 + j] += M
+
+@njit(cache=True)
+def gradEb_hessEb_scatter(q, c, m1e, m2e, m1f, m2f, kappaBar1, kappaBar2, l_k, EI, F, J):
+    """
+    Bending force and Jacobian at interior node c (DER.gradEb_hessEb,
+    Panetta et al. 2019) subtracted from F[4c-4:4c+7] and J in place.
+    """
+    s = 4 * c - 4
+    ee = np.empty(3)
+    ef = np.empty(3)
+    for i in range(3):
+        ee[i] = q[s + 4 + i] - q[s + i]
+        ef[i] = q[s + 8 + i] - q[s + 4 + i]
+    norm_e = np.sqrt(_dot(ee, ee))
+    norm_f = np.sqrt(_dot(ef, ef))
+    te = ee / norm_e
+    tf = ef / norm_f
+
+    chi = 1.0 + _dot(te, tf)
+    kb = 2.0 * _cross(te, tf) / chi
+    tilde_t = (te + tf) / chi
+    tilde_d1 = (m1e + m1f) / chi
+    tilde_d2 = (m2e + m2f) / chi
+
+    kappa1 = 0.5 * _dot(kb, m2e + m2f)
+    kappa2 = - 0.5 * _dot(kb, m1e + m1f)
+
+    ## Gradient of the two curvatures
+    tf_c_d2t = _cross(tf, tilde_d2)
+    te_c_d2t = _cross(te, tilde_d2)
+    tf_c_d1t = _cross(tf, tilde_d1)
+    te_c_d1t = _cross(te, tilde_d1)
+    Dkappa1De = (- kappa1 * tilde_t + tf_c_d2t) / norm_e
+    Dkappa1Df = (- kappa1 * tilde_t - te_c_d2t) / norm_f
+    Dkappa2De = (- kappa2 * tilde_t - tf_c_d1t) / norm_e
+    Dkappa2Df = (- kappa2 * tilde_t + te_c_d1t) / norm_f
+
+    gradKappa1 = np.empty(11)
+    gradKappa2 = np.empty(11)
+    for i in range(3):
+        gradKappa1[i] = - Dkappa1De[i]
+        gradKappa1[4 + i] = Dkappa1De[i] - Dkappa1Df[i]
+        gradKappa1[8 + i] = Dkappa1Df[i]
+        gradKappa2[i] = - Dkappa2De[i]
+        gradKappa2[4 + i] = Dkappa2De[i] - Dkappa2Df[i]
+        gradKappa2[8 + i] = Dkappa2Df[i]
+    gradKappa1[3] = - 0.5 * _dot(kb, m1e)
+    gradKappa1[7] = - 0.5 * _dot(kb, m1f)
+    gradKappa2[3] = - 0.5 * _dot(kb, m2e)
+    gradKappa2[7] = - 0.5 * _dot(kb, m2f)
+
+    ## Hessian of the two curvatures
+    norm2_e = norm_e**2
+    norm2_f = norm_f**2
+    Id3 = np.eye(3)
+    tt_o_tt = _outer(tilde_t, tilde_t)
+    te_o_te = _outer(te, te)
+    tf_o_tf = _outer(tf, tf)
+    te_o_tf = _outer(te, tf)
+
+    tf_c_d2t_o_tt = _outer(tf_c_d2t, tilde_t)
+    te_c_d2t_o_tt = _outer(te_c_d2t, tilde_t)
+    tf_c_d1t_o_tt = _outer(tf_c_d1t, tilde_t)
+    te_c_d1t_o_tt = _outer(te_c_d1t, tilde_t)
+
+    D2kappa1De2 = (1.0 / norm2_e * (2 * kappa1 * tt_o_tt - tf_c_d2t_o_tt - tf_c_d2t_o_tt.T)
+                   - kappa1 / (chi * norm2_e) * (Id3 - te_o_te) + 1.0 / (2.0 * norm2_e) * _outer(kb, m2e))
+    D2kappa1Df2 = (1.0 / norm2_f * (2 * kappa1 * tt_o_tt + te_c_d2t_o_tt + te_c_d2t_o_tt.T)
+                   - kappa1 / (chi * norm2_f) * (Id3 - tf_o_tf) + 1.0 / (2.0 * norm2_f) * _outer(kb, m2f))
+    D2kappa1DfDe = (- kappa1 / (chi * norm_e * norm_f) * (Id3 + te_o_tf)
+                    + 1.0 / (norm_e * norm_f) * (2 * kappa1 * tt_o_tt - tf_c_d2t_o_tt
+                                                 + te_c_d2t_o_tt.T - _crossMat(tilde_d2)))
+    D2kappa2De2 = (1.0 / norm2_e * (2.0 * kappa2 * tt_o_tt + tf_c_d1t_o_tt + tf_c_d1t_o_tt.T)
+                   - kappa2 / (chi * norm2_e) * (Id3 - te_o_te) - 1.0 / (2.0 * norm2_e) * _outer(kb, m1e))
+    D2kappa2Df2 = (1.0 / norm2_f * (2 * kappa2 * tt_o_tt - te_c_d1t_o_tt - te_c_d1t_o_tt.T)
+                   - kappa2 / (chi * norm2_f) * (Id3 - tf_o_tf) - 1.0 / (2.0 * norm2_f) * _outer(kb, m1f))
+    D2kappa2DfDe = (- kappa2 / (chi * norm_e * norm_f) * (Id3 + te_o_tf)
+                    + 1.0 / (norm_e * norm_f) * (2 * kappa2 * tt_o_tt + tf_c_d1t_o_tt
+                                                 - te_c_d1t_o_tt.T + _crossMat(tilde_d1)))
+
+    kb_m1e = _dot(kb, m1e)
+    kb_m1f = _dot(kb, m1f)
+    kb_m2e = _dot(kb, m2e)
+    kb_m2f = _dot(kb, m2f)
+
+    DDkappa1 = np.zeros((11, 11))
+    DDkappa2 = np.zeros((11, 11))
+    _curvatureBlocks(DDkappa1, D2kappa1De2, D2kappa1Df2, D2kappa1DfDe.T, D2kappa1DfDe,
+                     - 0.5 * kb_m2e, - 0.5 * kb_m2f,
+                     (0.5 * kb_m1e * tilde_t - _cross(tf, m1e) / chi) / norm_e,
+                     (0.5 * kb_m1f * tilde_t - _cross(tf, m1f) / chi) / norm_e,
+                     (0.5 * kb_m1e * tilde_t + _cross(te, m1e) / chi) / norm_f,
+                     (0.5 * kb_m1f * tilde_t + _cross(te, m1f) / chi) / norm_f)
+    _curvatureBlocks(DDkappa2, D2kappa2De2, D2kappa2Df2, D2kappa2DfDe.T, D2kappa2DfDe,
+                     0.5 * kb_m1e, 0.5 * kb_m1f,
+                     (0.5 * kb_m2e * tilde_t - _cross(tf, m2e) / chi) / norm_e,
+                     (0.5 * kb_m2f * tilde_t - _cross(tf, m2f) / chi) / norm_e,
+                     (0.5 * kb_m2e * tilde_t + _cross(te, m2e) / chi) / norm_f,
+                     (0.5 * kb_m2f * tilde_t + _cross(te, m2f) / chi) / norm_f)
+
+    ## Gradient and Hessian of Eb, scattered straight into F and J
+    dE_dKappa1 = EI / l_k * (kappa1 - kappaBar1)
+    dE_dKappa2 = EI / l_k * (kappa2 - kappaBar2)
+    d2E_dKappa2 = EI / l_k
+    for i in range(11):
+        F[s + i] -= dE_dKappa1 * gradKappa1[i] + dE_dKappa2 * gradKappa2[i]
+        for j in range(11):
+            J[s + i, s + j] -= (dE_dKappa1 * DDkappa1[i, j] + dE_dKappa2 * DDkappa2[i, j]
+                                + d2E_dKappa2 * (gradKappa1[i] * gradKappa1[j]
+                                                 + gradKappa2[i] * gradKappa2[j]))
+
+@njit(cache=True)
+def gradEt_hessEt_scatter(q, c, refTwist, twistBar, l_k, GJ, F, J):
+    """
+    Twisting force and Jacobian at interior node c (DER.gradEt_hessEt,
+    Panetta et al. 2019) subtracted from F[4c-4:4c+7] and J in place.
+    """
+    s = 4 * c - 4
+    ee = np.empty(3)
+    ef = np.empty(3)
+    for i in range(3):
+        ee[i] = q[s + 4 + i] - q[s + i]
+        ef[i] = q[s + 8 + i] - q[s + 4 + i]
+    norm_e = np.sqrt(_dot(ee, ee))
+    norm_f = np.sqrt(_dot(ef, ef))
+    norm2_e = norm_e**2
+    norm2_f = norm_f**2
+    te = ee / norm_e
+    tf = ef / norm_f
+
+    chi = 1.0 + _dot(te, tf)
+    kb = 2.0 * _cross(te, tf) / chi
+    tilde_t = (te + tf) / chi
+
+    ## Gradient of twist wrt DOFs
+    gradTwist = np.zeros(11)
+    for i in range(3):
+        gradTwist[i] = - 0.5 / norm_e * kb[i]
+        gradTwist[8 + i] = 0.5 / norm_f * kb[i]
+        gradTwist[4 + i] = - (gradTwist[i] + gradTwist[8 + i])
+    gradTwist[3] = - 1
+    gradTwist[7] = 1
+
+    ## Hessian of twist wrt DOFs (Panetta 2019)
+    kb_o_tt = _outer(kb, tilde_t)
+    D2mDe2 = -0.5 / norm2_e * (_outer(kb, te + tilde_t) + 2.0 / chi * _crossMat(tf))
+    D2mDf2 = -0.5 / norm2_f * (_outer(kb, tf + tilde_t) - 2.0 / chi * _crossMat(te))
+    D2mDfDe = 0.5 / (norm_e * norm_f) * (2.0 / chi * _crossMat(te) - kb_o_tt)
+    D2mDeDf = 0.5 / (norm_e * norm_f) * (-2.0 / chi * _crossMat(tf) - kb_o_tt)
+
+    DDtwist = np.zeros((11, 11))
+    zero3 = np.zeros(3)
+    _curvatureBlocks(DDtwist, D2mDe2, D2mDf2, D2mDeDf, D2mDfDe, 0.0, 0.0,
+                     zero3, zero3, zero3, zero3)
+
+    ## Gradient and Hessian of Et, scattered straight into F and J
+    integratedTwist = q[s + 7] - q[s + 3] + refTwist - twistBar
+    dE_dTau = GJ / l_k * integratedTwist
+    d2E_dTau2 = GJ / l_k
+    for i in range(11):
+        F[s + i] -= dE_dTau * gradTwist[i]
+        for j in range(11):
+            J[s + i, s + j] -= dE_dTau * DDtwist[i, j] + d2E_dTau2 * gradTwist[i] * gradTwist[j]
+
+# Parallel assembly loops
+#
+# Element c of colour k satisfies c % ncolours == k. Stretching edges c and
+# c+2 share no node, bending/twisting stencils c and c+3 share no DOF, so the
+# elements of one colour can be scattered concurrently.
+
+@njit(parallel=True, cache=True)
+def _assembleFs(q, EA, refLen, Fs, Js):
+    ne = refLen.shape[0]
+    for colour in range(2):
+        for k in prange((ne - colour + 1) // 2):
+            c = 2 * k + colour
+            gradEs_hessEs_scatter(q, c, refLen[c], EA, Fs, Js)
+
+@njit(parallel=True, cache=True)
+def _assembleFb(q, m1, m2, kappaBar, EI, voronoiRefLen, Fb, Jb):
+    ne = m1.shape[0]
+    for colour in range(3):
+        for k in prange((ne - 1 - colour + 2) // 3):
+            c = 1 + 3 * k + colour
+            gradEb_hessEb_scatter(q, c, m1[c - 1], m2[c - 1], m1[c], m2[c],
+                                  kappaBar[c, 0], kappaBar[c, 1], voronoiRefLen[c], EI, Fb, Jb)
+
+@njit(parallel=True, cache=True)
+def _assembleFt(q, refTwist, twistBar, GJ, voronoiRefLen, Ft, Jt):
+    ne = (q.shape[0] + 1) // 4 - 1
+    for colour in range(3):
+        for k in prange((ne - 1 - colour + 2) // 3):
+            c = 1 + 3 * k + colour
+            gradEt_hessEt_scatter(q, c, refTwist[c], twistBar[c], voronoiRefLen[c], GJ, Ft, Jt)
+
+def _vector(x, n):
+    # Contiguous float copy of a per-element quantity (scalar or array)
+    return np.ascontiguousarray(np.broadcast_to(np.asarray(x, dtype=float), n))
+
+def getFs_compiled(q, EA, refLen):
+    """Stretching force and Jacobian, same as DER.getFs."""
+    q = np.ascontiguousarray(q, dtype=float)
+    ndof = len(q)
+    ne = (ndof + 1) // 4 - 1
+    Fs = np.zeros(ndof)
+    Js = np.zeros((ndof, ndof))
+    _assembleFs(q, float(EA), _vector(refLen, ne), Fs, Js)
+    return Fs, Js
+
+def getFb_compiled(q, m1, m2, kappaBar, EI, voronoiRefLen):
+    """Bending force and Jacobian, same as DER.getFb."""
+    q = np.ascontiguousarray(q, dtype=float)
+    ndof = len(q)
+    nv = (ndof + 1) // 4
+    Fb = np.zeros(ndof)
+    Jb = np.zeros((ndof, ndof))
+    _assembleFb(q, np.ascontiguousarray(m1, dtype=float), np.ascontiguousarray(m2, dtype=float),
+                _vector(kappaBar, (nv, 2)), float(EI), _vector(voronoiRefLen, nv), Fb, Jb)
+    return Fb, Jb
+
+def getFt_compiled(q, refTwist, twistBar, GJ, voronoiRefLen):
+    """Twisting force and Jacobian, same as DER.getFt."""
+    q = np.ascontiguousarray(q, dtype=float)
+    ndof = len(q)
+    nv = (ndof + 1) // 4
+    Ft = np.zeros(ndof)
+    Jt = np.zeros((ndof, ndof))
+    _assembleFt(q, _vector(refTwist, nv), _vector(twistBar, nv), float(GJ),
+                _vector(voronoiRefLen, nv), Ft, Jt)
+    return Ft, Jt
+
+def test_compiled_kernels():
+    """
+    This function checks the compiled kernels against the NumPy loops of
+    DER (getFs, getFb, getFt) on a randomly bent and twisted rod. Without
+    numba the kernels run as plain Python, so the check covers both backends.
+    """
+    import DER
+
+    rng = np.random.default_rng(4)
+    nv = 9
+    ndof = 4 * nv - 1
+    q = np.zeros(ndof)
+    q[0::4] = np.arange(nv) * 0.1
+    q += 0.02 * rng.standard_normal(ndof)
+    refLen = rng.uniform(0.08, 0.12, nv - 1)
+    voronoiRefLen = rng.uniform(0.08, 0.12, nv)
+    kappaBar = 0.1 * rng.standard_normal((nv, 2))
+    refTwist = 0.05 * rng.standard_normal(nv)
+    twistBar = 0.05 * rng.standard_normal(nv)
+
+    a1_first = np.cross(DER.computeTangent(q)[0, :], np.array([0.0, 0.0, 1.0]))
+    a1, a2 = DER.computeSpaceParallel(a1_first / np.linalg.norm(a1_first), q)
+    m1, m2 = DER.computeMaterialFrame(a1, a2, q[3::4])
+
+    backend = DER.backend
+    try:
+        DER.set_backend('numpy')
+        reference = (DER.getFs(q, 10.0, refLen),
+                     DER.getFb(q, m1, m2, kappaBar, 0.5, voronoiRefLen),
+                     DER.getFt(q, refTwist, twistBar, 0.3, voronoiRefLen))
+    finally:
+        DER.set_backend(backend)
+    compiled = (getFs_compiled(q, 10.0, refLen),
+                getFb_compiled(q, m1, m2, kappaBar, 0.5, voronoiRefLen),
+                getFt_compiled(q, refTwist, twistBar, 0.3, voronoiRefLen))
+
+    for k, ((F_ref, J_ref), (F, J)) in enumerate(zip(reference, compiled)):
+        assert np.allclose(F, F_ref, rtol=1e-10, atol=1e-12), f"Test case {2 * k + 1} failed"
+        assert np.allclose(J, J_ref, rtol=1e-10, atol=1e-10), f"Test case {2 * k + 2} failed"
+
+    print("All test cases passed")
+
+if __name__ == "__main__":
+    test_compiled_kernels()
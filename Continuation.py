@@ -0,0 +1,343 @@
+"""
+Load-stepping / arc-length continuation for the static 2D beam.
+
+Traces the equilibrium path
+
+    R(q, lam) = -(Fb(q) + Fs(q) + F0 + lam * P) = 0
+
+of the beam in SimplySupportLoaded.py as the load factor lam is increased.
+Every step is warm started from the previous converged point plus a tangent
+predictor, and the corrector is either plain load control (lam fixed) or
+pseudo arc-length control (Riks), which lets the path go around limit points
+where the stiffness matrix becomes singular. The whole load-deflection curve
+is produced by one incremental run instead of one cold simulation per load.
+"""
+
+import numpy as np
+
+from Beam2D import getFb, getFs
+
+def static_residual(q, lam, P, F0, EI, EA, deltaL):
+    """
+    Residual and tangent stiffness of the static equilibrium equations.
+
+    Parameters:
+    q : np.ndarray
+        DOF vector [x_0, y_0, x_1, y_1, ...].
+    lam : float
+        Load factor multiplying the reference load P.
+    P : np.ndarray
+        Reference (scalable) external load vector.
+    F0 : np.ndarray
+        Constant external load vector (e.g. gravity).
+    EI, EA : float
+        Bending and stretching stiffness.
+    deltaL : float
+        Reference edge length.
+
+    Returns:
+    f : np.ndarray
+        Residual -(Fb + Fs + F0 + lam * P).
+    K : np.ndarray
+        Tangent stiffness df/dq. The derivative with respect to lam is -P.
+    """
+    Fb, Jb = getFb(q, EI, deltaL)
+    Fs, Js = getFs(q, EA, deltaL)
+
+    f = -(Fb + Fs + F0 + lam * P)
+    K = -(Jb + Js)
+
+    return f, K
+
+def trace_equilibrium(q_start, P, F0, EI, EA, deltaL, free_index,
+                      lam_end=1.0, ds=None, method='arc',
+                      tol=None, maximum_iter=25, desired_iter=4,
+                      ds_min=None, ds_max=None, max_steps=500, psi=None):
+    """
+    Trace the equilibrium path from lam = 0 up to lam = lam_end.
+
+    Parameters:
+    q_start : np.ndarray
+        Initial guess for the equilibrium at lam = 0 (e.g. the undeformed beam).
+    P, F0 : np.ndarray
+        Reference load vector (scaled by lam) and constant load vector.
+    EI, EA, deltaL : float
+        Stiffness and discretization parameters passed to the kernels.
+    free_index : np.ndarray
+        DOFs that are solved for; the remaining ones keep their values in q_start.
+    lam_end : float
+        Final load factor. The trace stops at the first converged point with
+        lam >= lam_end (the last point is pulled back onto lam_end).
+    ds : float
+        Initial step size. For method='load' this is the load increment, for
+        method='arc' the arc length in the scaled (q, psi * lam) space.
+        Defaults to lam_end / 10 (times the load scale for 'arc').
+    method : str
+        'load' for load control with tangent predictor, 'arc' for
+        pseudo arc-length control.
+    tol : float
+        Tolerance on the norm of the free residual. Defaults to 1e-8 times
+        the norm of the full load.
+    maximum_iter : int
+        Newton iterations allowed per step before the step is cut in half.
+    desired_iter : int
+        Target number of corrector iterations; the step size is adapted
+        towards it.
+    ds_min, ds_max : float
+        Bounds on the adaptive step size.
+    max_steps : int
+        Maximum number of continuation steps.
+    psi : float
+        Load scaling of the arc-length constraint. Defaults to the norm of the
+        initial linear response K^-1 P, which weights displacement and load
+        equally on the first step.
+
+    Returns:
+    lam_path : np.ndarray
+        Load factors of the converged points, shape (npts,).
+    q_path : np.ndarray
+        Converged DOF vectors, shape (npts, ndof).
+    iter_path : np.ndarray
+        Number of corrector iterations for every point, shape (npts,).
+    """
+    if method not in ('load', 'arc'):
+        raise ValueError("method must be 'load' or 'arc'")
+
+    P_free = P[free_index]
+    if tol is None:
+        tol = 1e-8 * max(np.linalg.norm((F0 + lam_end * P)[free_index]), 1.0)
+
+    # Equilibrium at lam = 0
+    q, iter_count, converged = solve_static(q_start.copy(), 0.0, P, F0, EI, EA, deltaL,
+                                            free_index, tol, maximum_iter)
+    if not converged:
+        raise RuntimeError('Could not find the equilibrium at lam = 0')
+    lam = 0.0
+
+    lam_path = [lam]
+    q_path = [q.copy()]
+    iter_path = [iter_count]
+
+    # Initial tangent (displacement per unit load)
+    f, K = static_residual(q, lam, P, F0, EI, EA, deltaL)
+    dq_dlam = np.linalg.solve(K[np.ix_(free_index, free_index)], P_free)
+    if psi is None:
+        psi = max(np.linalg.norm(dq_dlam), np.finfo(float).eps)
+
+    if ds is None:
+        ds = lam_end / 10 if method == 'load' else psi * lam_end / 10
+    if ds_min is None:
+        ds_min = ds * 1e-4
+    if ds_max is None:
+        ds_max = ds * 10
+
+    # Previous tangent in (q_free, lam), used to keep the direction of travel
+    t_prev = None
+
+    step = 0
+    while lam < lam_end and step < max_steps:
+        step += 1
+
+        if method == 'load':
+            dlam = min(ds, lam_end - lam)
+            # Euler predictor along the tangent
+            q_pred = q.copy()
+            q_pred[free_index] += dq_dlam * dlam
+            q_new, iter_count, converged = solve_static(q_pred, lam + dlam, P, F0, EI, EA,
+                                                        deltaL, free_index, tol, maximum_iter)
+            lam_new = lam + dlam
+        else:
+            t_q, t_lam = _arc_tangent(dq_dlam, psi, t_prev)
+            q_pred = q.copy()
+            q_pred[free_index] += ds * t_q
+            lam_pred = lam + ds * t_lam
+            q_new, lam_new, iter_count, converged = _correct_arc(q_pred, lam_pred, q, lam,
+                                                                 t_q, t_lam, ds, psi,
+                                                                 P, F0, EI, EA, deltaL,
+                                                                 free_index, tol, maximum_iter)
+
+        if not converged:
+            ds = ds / 2
+            if ds < ds_min:
+                raise RuntimeError(f'Continuation stalled at lam = {lam:.6e}')
+            continue
+
+        if method == 'arc':
+            t_prev = (t_q, t_lam)
+
+        # Do not overshoot the requested load level
+        if lam_new > lam_end and method == 'arc':
+            q_new, iter_extra, converged = solve_static(q_new, lam_end, P, F0, EI, EA, deltaL,
+                                                        free_index, tol, maximum_iter)
+            if not converged:
+                ds = ds / 2
+                continue
+            lam_new = lam_end
+            iter_count += iter_extra
+
+        q, lam = q_new, lam_new
+        lam_path.append(lam)
+        q_path.append(q.copy())
+        iter_path.append(iter_count)
+
+        # New tangent at the converged point
+        f, K = static_residual(q, lam, P, F0, EI, EA, deltaL)
+        dq_dlam = np.linalg.solve(K[np.ix_(free_index, free_index)], P_free)
+
+        # Adapt the step size towards the desired number of iterations
+        ds = ds * np.clip(np.sqrt(desired_iter / max(iter_count, 1)), 0.5, 2.0)
+        ds = min(max(ds, ds_min), ds_max)
+
+    return np.array(lam_path), np.array(q_path), np.array(iter_path)
+
+def solve_static(q, lam, P, F0, EI, EA, deltaL, free_index, tol, maximum_iter):
+    """
+    Newton solve of the static equilibrium at a fixed load factor, starting
+    from q. Returns (q, iterations, converged).
+    """
+    q = q.copy()
+    for iter_count in range(1, maximum_iter + 1):
+        f, K = static_residual(q, lam, P, F0, EI, EA, deltaL)
+        f_free = f[free_index]
+        if np.linalg.norm(f_free) < tol:
+            return q, iter_count - 1, True
+        q[free_index] -= np.linalg.solve(K[np.ix_(free_index, free_index)], f_free)
+    f, K = static_residual(q, lam, P, F0, EI, EA, deltaL)
+    return q, maximum_iter, np.linalg.norm(f[free_index]) < tol
+
+def _arc_tangent(dq_dlam, psi, t_prev):
+    """
+    Unit tangent (t_q, t_lam) of the path in the scaled (q, psi * lam) space.
+    The sign follows the previous tangent so the trace passes limit points.
+    """
+    t_lam = 1.0 / np.sqrt(np.dot(dq_dlam, dq_dlam) + psi**2)
+    t_q = dq_dlam * t_lam
+    if t_prev is not None and np.dot(t_q, t_prev[0]) + psi**2 * t_lam * t_prev[1] < 0:
+        t_q, t_lam = -t_q, -t_lam
+    return t_q, t_lam
+
+def _correct_arc(q, lam, q_old, lam_old, t_q, t_lam, ds, psi,
+                 P, F0, EI, EA, deltaL, free_index, tol, maximum_iter):
+    """
+    Newton corrector on the equilibrium equations augmented with the
+    pseudo arc-length constraint
+
+        g = t_q . (q - q_old) + psi^2 t_lam (lam - lam_old) - ds = 0.
+
+    The constraint is linear, so it holds exactly after every update and
+    only the equilibrium residual is checked. The bordered system is solved
+    with one factorization and two right-hand sides.
+    Returns (q, lam, iterations, converged).
+    """
+    q = q.copy()
+    P_free = P[free_index]
+    dq_old = q_old[free_index]
+    for iter_count in range(1, maximum_iter + 1):
+        f, K = static_residual(q, lam, P, F0, EI, EA, deltaL)
+        f_free = f[free_index]
+        g = np.dot(t_q, q[free_index] - dq_old) + psi**2 * t_lam * (lam - lam_old) - ds
+        if np.linalg.norm(f_free) < tol:
+            return q, lam, iter_count - 1, True
+
+        # K dq - P dlam = -f  ->  dq = a + b dlam
+        ab = np.linalg.solve(K[np.ix_(free_index, free_index)], np.column_stack((-f_free, P_free)))
+        a, b = ab[:, 0], ab[:, 1]
+        dlam = -(g + np.dot(t_q, a)) / (np.dot(t_q, b) + psi**2 * t_lam)
+
+        q[free_index] += a + b * dlam
+        lam += dlam
+
+    f, K = static_residual(q, lam, P, F0, EI, EA, deltaL)
+    return q, lam, maximum_iter, np.linalg.norm(f[free_index]) < tol
+
+def write_curve(filename, lam_path, q_path, P, dof):
+    """
+    Write the load-deflection curve to a CSV file.
+
+    Columns: load factor, load magnitude |lam * P|, displacement of DOF 'dof'
+    relative to the first point of the path.
+    """
+    load = lam_path * np.linalg.norm(P)
+    deflection = q_path[:, dof] - q_path[0, dof]
+    np.savetxt(filename, np.column_stack((lam_path, load, deflection)), delimiter=',',
+               header='lam,load,deflection', comments='')
+
+def test_continuation():
+    """
+    This function traces the beam of SimplySupportLoaded.py with load
+    control and arc-length control and checks that the points of both paths
+    are the equilibria found by solve_static at the same load factor, that
+    both reach lam_end at the same state, and that write_curve round-trips.
+    """
+    import os
+    import tempfile
+
+    from SimplySupportLoaded import q0, P, W, EI, EA, deltaL, free_index, Load_index
+
+    F0 = W - P
+    lam_end = 2.0
+    tol = 1e-8 * np.linalg.norm((F0 + lam_end * P)[free_index])
+
+    paths = {}
+    for k, method in enumerate(('load', 'arc')):
+        lam_path, q_path, iter_path = trace_equilibrium(q0, P, F0, EI, EA, deltaL, free_index,
+                                                        lam_end=lam_end, method=method)
+        assert lam_path[0] == 0 and lam_path[-1] == lam_end, f"Test case {3 * k + 1} failed ({method})"
+        assert np.all(np.diff(lam_path) > 0) and len(lam_path) == len(q_path) == len(iter_path), \
+            f"Test case {3 * k + 2} failed ({method})"
+        # Every point is the equilibrium of a cold solve from the undeformed
+        # beam (up to the residual tolerance: 1e-6 of the largest deflection)
+        scale = np.max(np.abs(q_path[-1] - q_path[0]))
+        for lam, q in zip(lam_path[::2], q_path[::2]):
+            q_ref, iterations, converged = solve_static(q0, lam, P, F0, EI, EA, deltaL,
+                                                        free_index, tol, 100)
+            assert converged and np.allclose(q, q_ref, rtol=0, atol=1e-6 * scale), \
+                f"Test case {3 * k + 3} failed ({method}, lam = {lam})"
+        paths[method] = (lam_path, q_path)
+
+    # Both controls end on the same curve at lam_end
+    assert np.allclose(paths['arc'][1][-1], paths['load'][1][-1], rtol=0, atol=1e-6 * scale), "Test case 7 failed"
+
+    lam_path, q_path = paths['arc']
+    dof = 2 * Load_index[1] + 1
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'curve.csv')
+        write_curve(filename, lam_path, q_path, P, dof)
+        with open(filename) as f:
+            assert f.readline().strip() == 'lam,load,deflection', "Test case 8 failed"
+        data = np.loadtxt(filename, delimiter=',', skiprows=1)
+    assert np.allclose(data[:, 0], lam_path, rtol=1e-15, atol=0), "Test case 9 failed"
+    assert np.allclose(data[:, 1], lam_path * np.linalg.norm(P), rtol=1e-15, atol=0), "Test case 10 failed"
+    assert np.allclose(data[:, 2], q_path[:, dof] - q_path[0, dof], rtol=1e-15, atol=0), "Test case 11 failed"
+
+    try:
+        trace_equilibrium(q0, P, F0, EI, EA, deltaL, free_index, method='riks')
+        assert False, "Test case 12 failed"
+    except ValueError:
+        pass
+    print("All test cases passed")
+
+if __name__ == "__main__":
+    test_continuation()
+
+    import matplotlib.pyplot as plt
+
+    from SimplySupportLoaded import (q0, P, W, EI, EA, deltaL, free_index,
+                                     Load_index, Load_F)
+
+    F0 = W - P # Gravity only; the point load is traced by the load factor
+    lam_end = 1.0
+
+    lam_path, q_path, iter_path = trace_equilibrium(q0, P, F0, EI, EA, deltaL, free_index,
+                                                    lam_end=lam_end, method='arc')
+    print(f'{len(lam_path)} points, {np.sum(iter_path)} Newton iterations in total')
+
+    dof = 2 * Load_index[1] + 1 # Vertical DOF under the load
+    write_curve('loadDeflection.csv', lam_path, q_path, P, dof)
+
+    plt.figure(1)
+    plt.plot(-(q_path[:, dof] - q_path[0, dof]), lam_path * np.linalg.norm(Load_F), 'ko-')
+    plt.xlabel('Deflection under the load, $\\delta$ [m]')
+    plt.ylabel('Load, P [N]')
+    plt.savefig('loadDeflection.png')
+    plt.show()
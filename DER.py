@@ -1,9 +1,14 @@
 
 
 import numpy as np
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
-from IPython.display import clear_output
+
+from TimeIntegrators import BackwardEuler, make_scheme
+from Timing import NULL_STATS, SolverStats
+from Memory import MemoryStats, predictMemory
+from Profiling import from_argv
+from ModelSetup import rodNodes, rodMass, derGravity, derDOF, referenceLengths
+from Telemetry import telemetry, DEBUG, INFO
+from CompiledKernels import HAVE_NUMBA, getFs_compiled, getFb_compiled, getFt_compiled
 
 # Miscellaneous Functions
 
@@ -69,7 +74,6 @@ def test_signedAngle():
 
   print("All test cases passed")
 
-test_signedAngle()
 
 def rotateAxisAngle(v = None,z = None,theta = None):
     # This function rotates a vector "v" around a specified axis "z" by an angle "theta".
@@ -129,7 +133,6 @@ def test_rotateAxisAngle():
 
   print("Test case passed")
 
-test_rotateAxisAngle()
 
 def parallel_transport(u = None,t1 = None,t2 = None):
 
@@ -181,10 +184,9 @@ def test_parallel_transport():
 
   print("All test cases passed")
 
-test_parallel_transport()
 
 def crossMat(a):
-    A=np.matrix([[0,- a[2],a[1]],[a[2],0,- a[0]],[- a[1],a[0],0]])
+    A=np.array([[0,- a[2],a[1]],[a[2],0,- a[0]],[- a[1],a[0],0]])
     return A
 
 # Functions to Calculate Tangent, Material Frame, and Reference Frame
@@ -750,7 +752,37 @@ def gradEt_hessEt(node0 = None,node1 = None,node2 = None,theta_e = None,
 
  # Evaluating Elastic Forces Along Arclength
 
+# Assembly backend of getFs, getFb and getFt: 'numpy' runs the element loops
+# below, 'numba' the compiled kernels of CompiledKernels.py (default when
+# numba is installed).
+backend = 'numba' if HAVE_NUMBA else 'numpy'
+
+def set_backend(name):
+  global backend
+  if name not in ('numpy', 'numba'):
+    raise ValueError(f'Unknown backend: {name}')
+  if name == 'numba' and not HAVE_NUMBA:
+    raise ImportError('The numba backend needs numba to be installed')
+  backend = name
+
+# Threads of the 'numba' backend: its prange loops run on num_threads
+# threads. The 'numpy' backend assembles on the calling thread (its element
+# loops are many small numpy calls that hold the GIL, so threads gain nothing).
+num_threads = 1
+
+def set_num_threads(n):
+  global num_threads
+  if n < 1:
+    raise ValueError('The number of threads must be at least 1')
+  num_threads = int(n)
+  if HAVE_NUMBA:
+    import numba
+    numba.set_num_threads(min(num_threads, numba.config.NUMBA_NUM_THREADS))
+
 def getFs(q, EA, refLen):
+  if backend == 'numba':
+    return getFs_compiled(q, EA, refLen)
+
   ndof = len(q)
   nv = int((ndof + 1) / 4 ) # Number of vertices
   ne = nv - 1 # Number of edges
@@ -774,6 +806,9 @@ def getFs(q, EA, refLen):
 
 
 def getFb(q, m1, m2, kappaBar, EI, voronoiRefLen):
+  if backend == 'numba':
+    return getFb_compiled(q, m1, m2, kappaBar, EI, voronoiRefLen)
+
   ndof = len(q)
   nv = int((ndof + 1) / 4 ) # Number of vertices
   ne = nv - 1 # Number of edges
@@ -805,6 +840,9 @@ def getFb(q, m1, m2, kappaBar, EI, voronoiRefLen):
 
 
 def getFt(q, refTwist, twistBar, GJ, voronoiRefLen):
+  if backend == 'numba':
+    return getFt_compiled(q, refTwist, twistBar, GJ, voronoiRefLen)
+
   ndof = len(q)
   nv = int((ndof + 1) / 4 ) # Number of vertices
   ne = nv - 1 # Number of edges
@@ -833,9 +871,492 @@ def getFt(q, refTwist, twistBar, GJ, voronoiRefLen):
 
   return Ft, Jt
 
+# Force-Only Kernels
+#
+# Explicit time integration needs the elastic forces but never the
+# Jacobians. The kernels below evaluate the gradients of the three energies
+# for all elements at once (same formulas as gradEs_hessEs, gradEb_hessEb and
+# gradEt_hessEt without the Hessian part) and getForces scatters them into a
+# single force vector.
+
+def nodePositions(q):
+  # (nv,3) array of node positions of a DER DOF vector
+  return np.append(q, 0.0).reshape(-1, 4)[:, 0:3]
+
+def gradEs_vec(q, refLen, EA):
+
+# Edge-vectorized gradient of the stretching energy.
+
+# Inputs:
+# q: 4*nv-1 vector - DOF vector
+# refLen: ne vector - reference length (undeformed) of every edge
+# EA: scalar - stretching stiffness - Young's modulus times area
+
+# Outputs:
+# dF: (ne,6) array - gradient of the stretching energy of every edge with
+#     respect to [x_k, y_k, z_k, x_{k+1}, y_{k+1}, z_{k+1}]
+
+  edge = np.diff(nodePositions(q), axis=0) # (ne,3)
+  edgeLen = np.sqrt(np.sum(edge**2, axis=1))
+
+  dF_unit = (EA * (edgeLen / refLen - 1) / edgeLen)[:, None] * edge
+  dF = np.concatenate((- dF_unit, dF_unit), axis=1)
+  return dF
+
+def gradEb_vec(q, m1, m2, kappaBar, voronoiRefLen, EI):
+
+# Node-vectorized gradient of the bending energy (Panetta et al. 2019).
+
+# Inputs:
+# q: 4*nv-1 vector - DOF vector
+# m1, m2: (ne,3) arrays - material directors of every edge
+# kappaBar: (nv,2) array - natural curvature at every node
+# voronoiRefLen: nv vector - voronoi length (undeformed) of every node
+# EI: scalar - bending stiffness
+
+# Outputs:
+# dF: (nv-2,11) array - gradient of the bending energy at every interior node
+#     with respect to the 11 DOFs q[4k-4 : 4k+7]
+
+  edge = np.diff(nodePositions(q), axis=0)
+  edgeLen = np.sqrt(np.sum(edge**2, axis=1))
+  tangent = edge / edgeLen[:, None]
+
+  norm_e = edgeLen[:-1, None]
+  norm_f = edgeLen[1:, None]
+  te = tangent[:-1]
+  tf = tangent[1:]
+  m1e, m2e, m1f, m2f = m1[:-1], m2[:-1], m1[1:], m2[1:]
+
+  # Curvature binormal
+  chi = 1.0 + np.sum(te * tf, axis=1)[:, None]
+  kb = 2.0 * np.cross(te, tf) / chi
+  tilde_t = (te + tf) / chi
+  tilde_d1 = (m1e + m1f) / chi
+  tilde_d2 = (m2e + m2f) / chi
+
+  # Curvatures
+  kappa1 = 0.5 * np.sum(kb * (m2e + m2f), axis=1)[:, None]
+  kappa2 = - 0.5 * np.sum(kb * (m1e + m1f), axis=1)[:, None]
+
+  Dkappa1De = (- kappa1 * tilde_t + np.cross(tf, tilde_d2)) / norm_e
+  Dkappa1Df = (- kappa1 * tilde_t - np.cross(te, tilde_d2)) / norm_f
+  Dkappa2De = (- kappa2 * tilde_t - np.cross(tf, tilde_d1)) / norm_e
+  Dkappa2Df = (- kappa2 * tilde_t + np.cross(te, tilde_d1)) / norm_f
+
+  # dE/dkappa of every node
+  EI_l = EI / voronoiRefLen[1:-1, None]
+  dE_dKappa1 = EI_l * (kappa1 - kappaBar[1:-1, 0:1])
+  dE_dKappa2 = EI_l * (kappa2 - kappaBar[1:-1, 1:2])
+
+  # dF = dE_dKappa1 * gradKappa1 + dE_dKappa2 * gradKappa2
+  DEDe = dE_dKappa1 * Dkappa1De + dE_dKappa2 * Dkappa2De
+  DEDf = dE_dKappa1 * Dkappa1Df + dE_dKappa2 * Dkappa2Df
+
+  dF = np.empty((te.shape[0], 11))
+  dF[:, 0:3] = - DEDe
+  dF[:, 4:7] = DEDe - DEDf
+  dF[:, 8:11] = DEDf
+  dF[:, 3] = - 0.5 * (dE_dKappa1[:, 0] * np.sum(kb * m1e, axis=1) +
+                      dE_dKappa2[:, 0] * np.sum(kb * m2e, axis=1))
+  dF[:, 7] = - 0.5 * (dE_dKappa1[:, 0] * np.sum(kb * m1f, axis=1) +
+                      dE_dKappa2[:, 0] * np.sum(kb * m2f, axis=1))
+  return dF
+
+def gradEt_vec(q, refTwist, twistBar, GJ, voronoiRefLen):
+
+# Node-vectorized gradient of the twisting energy (Panetta et al. 2019).
+
+# Inputs:
+# q: 4*nv-1 vector - DOF vector
+# refTwist: nv vector - reference twist (unit: radian) at every node
+# twistBar: nv vector - undeformed twist (unit: radian) at every node
+# GJ: scalar - twisting stiffness
+# voronoiRefLen: nv vector - voronoi length (undeformed) of every node
+
+# Outputs:
+# dF: (nv-2,11) array - gradient of the twisting energy at every interior node
+
+  edge = np.diff(nodePositions(q), axis=0)
+  edgeLen = np.sqrt(np.sum(edge**2, axis=1))
+  tangent = edge / edgeLen[:, None]
+  te = tangent[:-1]
+  tf = tangent[1:]
+
+  kb = 2.0 * np.cross(te, tf) / (1.0 + np.sum(te * tf, axis=1))[:, None]
+
+  theta = q[3::4]
+  integratedTwist = theta[1:] - theta[:-1] + refTwist[1:-1] - twistBar[1:-1]
+  dE_dTau = (GJ / voronoiRefLen[1:-1] * integratedTwist)[:, None]
+
+  gradTwist_e = - 0.5 / edgeLen[:-1, None] * kb
+  gradTwist_f = 0.5 / edgeLen[1:, None] * kb
+
+  dF = np.empty((te.shape[0], 11))
+  dF[:, 0:3] = dE_dTau * gradTwist_e
+  dF[:, 8:11] = dE_dTau * gradTwist_f
+  dF[:, 4:7] = - (dF[:, 0:3] + dF[:, 8:11])
+  dF[:, 3] = - dE_dTau[:, 0]
+  dF[:, 7] = dE_dTau[:, 0]
+  return dF
+
+def assembleForce(dF, start, local, ndof):
+  # Subtract per-element gradients dF (nel, len(local)) from a force vector.
+  # Element i acts on the DOFs start[i] + local. For a fixed column the DOFs
+  # of different elements never coincide, so every column is one
+  # fancy-indexed update.
+  F = np.zeros(ndof)
+  for j in range(len(local)):
+    F[start + local[j]] -= dF[:, j]
+  return F
+
+def getForces(q, m1, m2, refTwist, EA, refLen, EI, GJ, voronoiRefLen, kappaBar, twistBar):
+  # Total elastic force Fs + Fb + Ft without the Jacobians
+  ndof = len(q)
+  nv = int((ndof + 1) / 4)
+
+  F = assembleForce(gradEs_vec(q, refLen, EA), 4 * np.arange(nv - 1),
+                    np.array([0, 1, 2, 4, 5, 6]), ndof)
+  dF = gradEb_vec(q, m1, m2, kappaBar, voronoiRefLen, EI) + \
+       gradEt_vec(q, refTwist, twistBar, GJ, voronoiRefLen)
+  F += assembleForce(dF, 4 * np.arange(nv - 2), np.arange(11), ndof)
+  return F
+
+def getEnergies(q, m1, m2, refTwist, EA, refLen, EI, GJ, voronoiRefLen, kappaBar, twistBar):
+  # Stretching, bending and twisting energies of the whole rod (the
+  # potentials whose gradients are gradEs_vec, gradEb_vec and gradEt_vec)
+  edge = np.diff(nodePositions(q), axis=0)
+  edgeLen = np.sqrt(np.sum(edge**2, axis=1))
+  tangent = edge / edgeLen[:, None]
+  te = tangent[:-1]
+  tf = tangent[1:]
+
+  Es = 0.5 * EA * np.sum((edgeLen / refLen - 1)**2 * refLen)
+
+  kb = 2.0 * np.cross(te, tf) / (1.0 + np.sum(te * tf, axis=1))[:, None]
+  kappa1 = 0.5 * np.sum(kb * (m2[:-1] + m2[1:]), axis=1)
+  kappa2 = - 0.5 * np.sum(kb * (m1[:-1] + m1[1:]), axis=1)
+  l_k = voronoiRefLen[1:-1]
+  Eb = 0.5 * EI * np.sum(((kappa1 - kappaBar[1:-1, 0])**2 + (kappa2 - kappaBar[1:-1, 1])**2) / l_k)
+
+  theta = q[3::4]
+  integratedTwist = theta[1:] - theta[:-1] + refTwist[1:-1] - twistBar[1:-1]
+  Et = 0.5 * GJ * np.sum(integratedTwist**2 / l_k)
+
+  return Es, Eb, Et
+
+def test_getForces():
+  """
+  This function checks getForces against the sum of the forces of getFs,
+  getFb and getFt on a randomly bent and twisted rod.
+  """
+  nv = 6
+  ndof = 4 * nv - 1
+  rng = np.random.default_rng(0)
+  q0 = np.zeros(ndof)
+  q0[0::4] = np.arange(nv) * 0.1
+  q = q0 + 0.01 * rng.standard_normal(ndof)
+
+  refLen = np.full(nv - 1, 0.1)
+  voronoiRefLen = np.full(nv, 0.1)
+  kappaBar = 0.1 * rng.standard_normal((nv, 2))
+  twistBar = 0.01 * rng.standard_normal(nv)
+
+  a1_first = np.cross(computeTangent(q)[0,:], np.array([0.0, 0.0, 1.0]))
+  a1, a2 = computeSpaceParallel(a1_first / np.linalg.norm(a1_first), q)
+  m1, m2 = computeMaterialFrame(a1, a2, q[3::4])
+  refTwist = getRefTwist(a1, computeTangent(q), np.zeros(nv))
+
+  Fs, Js = getFs(q, 10.0, refLen)
+  Fb, Jb = getFb(q, m1, m2, kappaBar, 0.5, voronoiRefLen)
+  Ft, Jt = getFt(q, refTwist, twistBar, 0.3, voronoiRefLen)
+  F = getForces(q, m1, m2, refTwist, 10.0, refLen, 0.5, 0.3, voronoiRefLen, kappaBar, twistBar)
+
+  assert np.allclose(F, Fs + Fb + Ft, rtol=1e-10, atol=1e-12), "Test failed: getForces"
+  print("All test cases passed")
+
+# Planar (2D) Fast Path
+#
+# For rods that stay in the x-y plane the twist decouples, so the DOF vector
+# only needs the node positions: q = [x_0, y_0, x_1, y_1, ...] (2 DOFs per
+# node instead of 4). The curvature is the scalar kappa = 2 (te x tf).z / (1 + te.tf)
+# and the kernels below work directly on 2-vectors, without 3D vectors,
+# cross products or material frames.
+
+def gradEs_planar_vec(q, refLen, EA):
+
+# Edge-vectorized gradient of the stretching energy for a planar DOF vector.
+
+# Inputs:
+# q: 2*nv vector - planar DOF vector [x_0, y_0, x_1, y_1, ...]
+# refLen: ne vector (or scalar) - reference length (undeformed) of every edge
+# EA: scalar - stretching stiffness - Young's modulus times area
+
+# Outputs:
+# dF: (ne,4) array - gradient of the stretching energy of every edge with
+#     respect to [x_k, y_k, x_{k+1}, y_{k+1}]
+
+    edge = np.diff(q.reshape(-1, 2), axis=0) # (ne,2) edge vectors
+    edgeLen = np.sqrt(edge[:, 0]**2 + edge[:, 1]**2)
+
+    dF_unit = (EA * (edgeLen / refLen - 1) / edgeLen)[:, None] * edge
+    dF = np.concatenate((- dF_unit, dF_unit), axis=1)
+    return dF
+
+def gradEs_hessEs_planar_vec(q, refLen, EA):
+
+# Edge-vectorized gradient and Hessian of the stretching energy for a planar
+# DOF vector. Every edge length is computed once and the (ne,4) gradients and
+# (ne,4,4) Hessians are built with broadcasting.
+
+# Inputs:
+# q: 2*nv vector - planar DOF vector [x_0, y_0, x_1, y_1, ...]
+# refLen: ne vector (or scalar) - reference length (undeformed) of every edge
+# EA: scalar - stretching stiffness - Young's modulus times area
+
+# Outputs:
+# dF: (ne,4) array - gradient of the stretching energy of every edge
+# dJ: (ne,4,4) array - hessian of the stretching energy of every edge
+
+    edge = np.diff(q.reshape(-1, 2), axis=0) # (ne,2) edge vectors
+    edgeLen = np.sqrt(edge[:, 0]**2 + edge[:, 1]**2)
+    ne = edge.shape[0]
+
+    ## Gradient of Es
+    dF_unit = (EA * (edgeLen / refLen - 1) / edgeLen)[:, None] * edge
+    dF = np.concatenate((- dF_unit, dF_unit), axis=1)
+
+    ## Hessian of Es
+    a = EA * (1 / refLen - 1 / edgeLen) * np.ones(ne)
+    b = EA / edgeLen ** 3
+    M = b[:, None, None] * edge[:, :, None] * edge[:, None, :] # (ne,2,2)
+    M[:, 0, 0] += a
+    M[:, 1, 1] += a
+
+    dJ = np.empty((ne,4,4))
+    dJ[:,0:2,0:2] = M
+    dJ[:,2:4,2:4] = M
+    dJ[:,0:2,2:4] = - M
+    dJ[:,2:4,0:2] = - M
+    return dF,dJ
+
+def assembleStencil_planar(dF, dJ, ndof):
+  # Scatter per-element energy gradients (nel,2s) and Hessians (nel,2s,2s)
+  # into the force vector and its Jacobian (both minus the energy
+  # derivatives). Element k acts on the s consecutive nodes k, ..., k+s-1
+  # (s = 2 for edges, s = 3 for bending nodes). Neighbouring elements share
+  # nodes, so each block is added in a separate step and no index is
+  # repeated within one fancy-indexed update.
+  nv = int(ndof / 2)
+  s = dF.shape[1] // 2
+  c = np.arange(dF.shape[0])
+
+  F = np.zeros(ndof)
+  F2 = F.reshape(nv, 2)
+  for a in range(s):
+    F2[a:a + len(c)] -= dF[:, 2 * a : 2 * a + 2]
+
+  if dJ is None:
+    return F, None
+
+  J = np.zeros((ndof, ndof))
+  J4 = J.reshape(nv, 2, nv, 2)
+  for a in range(s):
+    for b in range(s):
+      J4[c + a, :, c + b, :] -= dJ[:, 2 * a : 2 * a + 2, 2 * b : 2 * b + 2]
+  return F, J
+
+def bendingGeometry_planar(q):
+  # Shared geometry of every interior node of a planar DOF vector: edge
+  # norms, unit tangents, chi = 1 + te.tf, curvature kappa, tilde_t and the
+  # gradients of kappa with respect to the edge vectors. All arrays have
+  # one row per interior node (nb = nv - 2).
+  x = q.reshape(-1, 2)
+  edge = np.diff(x, axis=0) # (ne,2)
+  edgeLen = np.sqrt(edge[:, 0]**2 + edge[:, 1]**2)
+  tangent = edge / edgeLen[:, None]
+
+  norm_e = edgeLen[:-1]
+  norm_f = edgeLen[1:]
+  te = tangent[:-1]
+  tf = tangent[1:]
+
+  chi = 1.0 + te[:, 0] * tf[:, 0] + te[:, 1] * tf[:, 1]
+  kappa = 2.0 * (te[:, 0] * tf[:, 1] - te[:, 1] * tf[:, 0]) / chi
+  tilde_t = (te + tf) / chi[:, None]
+
+  # tf x tilde_d2 and te x tilde_d2 with tilde_d2 = 2 z / chi
+  tf_c_d2 = (2.0 / chi)[:, None] * np.stack((tf[:, 1], - tf[:, 0]), axis=1)
+  te_c_d2 = (2.0 / chi)[:, None] * np.stack((te[:, 1], - te[:, 0]), axis=1)
+
+  DkappaDe = (- kappa[:, None] * tilde_t + tf_c_d2) / norm_e[:, None]
+  DkappaDf = (- kappa[:, None] * tilde_t - te_c_d2) / norm_f[:, None]
+
+  return norm_e, norm_f, te, tf, chi, kappa, tilde_t, tf_c_d2, te_c_d2, DkappaDe, DkappaDf
+
+def gradEb_planar_vec(q, kappaBar, voronoiRefLen, EI):
+
+# Node-vectorized gradient of the bending energy for a planar DOF vector
+# (no Hessian; used by the explicit integrators).
+
+# Inputs:
+# q: 2*nv vector - planar DOF vector [x_0, y_0, x_1, y_1, ...]
+# kappaBar: nv vector (or scalar) - natural curvature at every node
+# voronoiRefLen: nv vector (or scalar) - voronoi length (undeformed) of every node
+# EI: scalar - bending stiffness
+
+# Outputs:
+# dF: (nv-2,6) array - gradient of the bending energy at every interior node
+#     with respect to [x_{k-1}, y_{k-1}, x_k, y_k, x_{k+1}, y_{k+1}]
+
+  nb = int(len(q) / 2) - 2
+  (norm_e, norm_f, te, tf, chi, kappa, tilde_t,
+   tf_c_d2, te_c_d2, DkappaDe, DkappaDf) = bendingGeometry_planar(q)
+
+  gradKappa = np.concatenate((- DkappaDe, DkappaDe - DkappaDf, DkappaDf), axis=1)
+
+  dkappa = kappa - np.broadcast_to(kappaBar, nb + 2)[1:-1]
+  l_k = np.broadcast_to(voronoiRefLen, nb + 2)[1:-1]
+  dF = (EI / l_k * dkappa)[:, None] * gradKappa
+  return dF
+
+def gradEb_hessEb_planar_vec(q, kappaBar, voronoiRefLen, EI):
+
+# Fused, node-vectorized gradient and Hessian of the bending energy for a
+# planar DOF vector (planar specialization of gradEb_hessEb with m2 = z on
+# both edges). The edges, norms, tangents, kappa, chi, tilde_t and the
+# gradient of kappa are computed once and shared by both outputs.
+
+# Inputs:
+# q: 2*nv vector - planar DOF vector [x_0, y_0, x_1, y_1, ...]
+# kappaBar: nv vector (or scalar) - natural curvature at every node
+# voronoiRefLen: nv vector (or scalar) - voronoi length (undeformed) of every node
+# EI: scalar - bending stiffness
+
+# Outputs:
+# dF: (nv-2,6) array - gradient of the bending energy at every interior node
+# dJ: (nv-2,6,6) array - hessian of the bending energy at every interior node
+
+  nb = int(len(q) / 2) - 2
+  (norm_e, norm_f, te, tf, chi, kappa, tilde_t,
+   tf_c_d2, te_c_d2, DkappaDe, DkappaDf) = bendingGeometry_planar(q)
+
+  ## Gradient of kappa
+  gradKappa = np.concatenate((- DkappaDe, DkappaDe - DkappaDf, DkappaDf), axis=1)
+
+  ## Hessian of kappa
+  def outer(u, v):
+    return u[:, :, None] * v[:, None, :]
+
+  k = kappa[:, None, None]
+  c = chi[:, None, None]
+  ne2 = (norm_e**2)[:, None, None]
+  nf2 = (norm_f**2)[:, None, None]
+  nef = (norm_e * norm_f)[:, None, None]
+  Id2 = np.eye(2)
+
+  tt_o_tt = outer(tilde_t, tilde_t)
+  tf_c_d2t_o_tt = outer(tf_c_d2, tilde_t)
+  te_c_d2t_o_tt = outer(te_c_d2, tilde_t)
+  d2_cross = (2.0 / c) * np.array([[0.0, -1.0], [1.0, 0.0]])
+
+  D2kappaDe2 = (2 * k * tt_o_tt - tf_c_d2t_o_tt - tf_c_d2t_o_tt.transpose(0, 2, 1)) / ne2 - \
+               k / (c * ne2) * (Id2 - outer(te, te))
+  D2kappaDf2 = (2 * k * tt_o_tt + te_c_d2t_o_tt + te_c_d2t_o_tt.transpose(0, 2, 1)) / nf2 - \
+               k / (c * nf2) * (Id2 - outer(tf, tf))
+  D2kappaDeDf = - k / (c * nef) * (Id2 + outer(te, tf)) + \
+                (2 * k * tt_o_tt - tf_c_d2t_o_tt + te_c_d2t_o_tt.transpose(0, 2, 1) - d2_cross) / nef
+  D2kappaDfDe = D2kappaDeDf.transpose(0, 2, 1)
+
+  DDkappa = np.empty((nb,6,6))
+  DDkappa[:,0:2,0:2] = D2kappaDe2
+  DDkappa[:,0:2,2:4] = - D2kappaDe2 + D2kappaDeDf
+  DDkappa[:,0:2,4:6] = - D2kappaDeDf
+  DDkappa[:,2:4,0:2] = - D2kappaDe2 + D2kappaDfDe
+  DDkappa[:,2:4,2:4] = D2kappaDe2 - D2kappaDeDf - D2kappaDfDe + D2kappaDf2
+  DDkappa[:,2:4,4:6] = D2kappaDeDf - D2kappaDf2
+  DDkappa[:,4:6,0:2] = - D2kappaDfDe
+  DDkappa[:,4:6,2:4] = D2kappaDfDe - D2kappaDf2
+  DDkappa[:,4:6,4:6] = D2kappaDf2
+
+  ## Gradient and Hessian of Eb
+  dkappa = kappa - np.broadcast_to(kappaBar, nb + 2)[1:-1]
+  EI_l = EI / np.broadcast_to(voronoiRefLen, nb + 2)[1:-1]
+  dF = (EI_l * dkappa)[:, None] * gradKappa
+  dJ = EI_l[:, None, None] * (outer(gradKappa, gradKappa) + dkappa[:, None, None] * DDkappa)
+  return dF,dJ
+
+def getKappa_planar(q):
+  # Signed curvature at every node of a planar DOF vector (zero at the ends)
+  kappa = np.zeros(int(len(q) / 2))
+  kappa[1:-1] = bendingGeometry_planar(q)[5]
+  return kappa
+
+def getFs_planar(q, EA, refLen, computeJ = True):
+  # Stretching force and (if computeJ) its Jacobian; Js is None otherwise
+  if computeJ:
+    dF, dJ = gradEs_hessEs_planar_vec(q, refLen, EA)
+  else:
+    dF, dJ = gradEs_planar_vec(q, refLen, EA), None
+
+  return assembleStencil_planar(dF, dJ, len(q))
+
+def getFb_planar(q, kappaBar, EI, voronoiRefLen, computeJ = True):
+  # Bending force and (if computeJ) its Jacobian; Jb is None otherwise
+  if computeJ:
+    dF, dJ = gradEb_hessEb_planar_vec(q, kappaBar, voronoiRefLen, EI)
+  else:
+    dF, dJ = gradEb_planar_vec(q, kappaBar, voronoiRefLen, EI), None
+
+  return assembleStencil_planar(dF, dJ, len(q))
+
+def isPlanar(q, Fext, atol = 1e-12):
+  # True if the rod lies in the x-y plane, is loaded in that plane and has no twist
+  return (np.all(np.abs(q[2::4]) < atol) and np.all(np.abs(Fext[2::4]) < atol)
+          and np.all(np.abs(q[3::4]) < atol))
+
+def toPlanar(q):
+  # Planar DOF vector [x_0, y_0, x_1, y_1, ...] from the full DER DOF vector
+  nv = int((len(q) + 1) / 4)
+  q2 = np.zeros(2 * nv)
+  q2[0::2] = q[0::4]
+  q2[1::2] = q[1::4]
+  return q2
+
+def fromPlanar(q2, q):
+  # Copy the planar DOFs back into (a copy of) the full DER DOF vector q
+  q = q.copy()
+  q[0::4] = q2[0::2]
+  q[1::4] = q2[1::2]
+  return q
+
+def planarIndex(index, nv):
+  # Map DER DOF indices to planar DOF indices (z and twist DOFs are dropped)
+  index = np.asarray(index)
+  node, local = index // 4, index % 4
+  keep = local < 2
+  return 2 * node[keep] + local[keep]
+
 # Plot
 
 # Function to set equal aspect ratio for 3D plots
+# Plotting and notebook modules are imported by the rendering functions on
+# their first call: the solver functions (and the modules importing them)
+# start without matplotlib and IPython.
+
+def _pyplot():
+    import matplotlib.pyplot as plt
+    from mpl_toolkits.mplot3d import Axes3D # registers the '3d' projection
+    return plt
+
+def _clear_output():
+    # Clear the output cell in a notebook (no-op without IPython)
+    try:
+        from IPython.display import clear_output
+    except ImportError:
+        return
+    clear_output()
+
 def set_axes_equal(ax):
     """
     Set equal aspect ratio for a 3D plot in Matplotlib.
@@ -888,8 +1409,9 @@ def plotrod(q, a1, a2, m1, m2, ctime):
     m2 *= 0.1 * L
 
     # Create figure and set up 3D plotting
+    plt = _pyplot()
     fig = plt.figure(1)
-    clear_output()
+    _clear_output()
     plt.clf()  # Clear the figure
     ax = fig.add_subplot(111, projection='3d')
 
@@ -945,8 +1467,9 @@ def plotrod_simple(q, ctime):
     x2 = q[1::4]
     x3 = q[2::4]
 
+    plt = _pyplot()
     fig = plt.figure(1)
-    clear_output()
+    _clear_output()
     plt.clf()  # Clear the figure
     ax = fig.add_subplot(111, projection='3d')
 
@@ -980,227 +1503,379 @@ def objfun(qGuess, q0, u, a1, a2,
            freeIndex, # Boundary conditions
            dt, tol, # time stepping parameters
            refTwist, # We need a guess refTwist to compute the new refTwist
-           massVector, mMat, # Mass vector and mass matrix
+           massVector, mMat, # Mass vector and mass matrix (or the mass vector again)
            EA, refLen, # Stretching stiffness and reference length\
            EI, GJ, voronoiRefLen, kappaBar, twistBar, # bending and twisting
-           Fg):
+           Fg,
+           scheme = None, # time integration scheme (TimeIntegrators.py), backward Euler if None
+           solver = None, # linear solver solver(J, f), e.g. DomainDecomposition.DomainDecompositionSolver
+           stats = None): # Timing.SolverStats collecting per-phase times and Newton iterations
+
+  if scheme is None:
+    scheme = BackwardEuler()
+  if stats is None:
+    stats = NULL_STATS
+
+  def forces0():
+    # Total force at the start of the step (only needed by Newmark/HHT)
+    m1, m2 = computeMaterialFrame(a1, a2, q0[3::4])
+    return getForces(q0, m1, m2, refTwist, EA, refLen, EI, GJ,
+                     voronoiRefLen, kappaBar, twistBar) + Fg
+
+  scheme.start(q0, u, dt, massVector, forces0, freeIndex)
 
   q = qGuess # Guess
   iter = 0
   error = 10 * tol
 
   while error > tol:
-    a1Iterate, a2Iterate = computeTimeParallel(a1, q0, q) # Reference frame
-    tangent = computeTangent(q)
+    # Forces are evaluated where the scheme asks (q itself for backward Euler)
+    t = stats.tic()
+    qEval = scheme.evaluation_point(q)
+    a1Iterate, a2Iterate = computeTimeParallel(a1, q0, qEval) # Reference frame
+    t = stats.toc('computeTimeParallel', t)
+    tangent = computeTangent(qEval)
     refTwist_iterate = getRefTwist(a1Iterate, tangent, refTwist) # Reference twist
+    t = stats.toc('getRefTwist', t)
 
     # Material frame
-    theta = q[3::4] # twist angles
+    theta = qEval[3::4] # twist angles
     m1Iterate, m2Iterate = computeMaterialFrame(a1Iterate, a2Iterate, theta)
+    t = stats.toc('computeMaterialFrame', t)
 
     # Compute my elastic forces
     # Bending
-    Fb, Jb = getFb(q, m1Iterate, m2Iterate, kappaBar, EI, voronoiRefLen) # Need to write this
+    Fb, Jb = getFb(qEval, m1Iterate, m2Iterate, kappaBar, EI, voronoiRefLen) # Need to write this
+    t = stats.toc('getFb', t)
     # Twisting
-    Ft, Jt = getFt(q, refTwist_iterate, twistBar, GJ, voronoiRefLen) # Need to write this
+    Ft, Jt = getFt(qEval, refTwist_iterate, twistBar, GJ, voronoiRefLen) # Need to write this
+    t = stats.toc('getFt', t)
     # Stretching
-    Fs, Js = getFs(q, EA, refLen)
+    Fs, Js = getFs(qEval, EA, refLen)
+    t = stats.toc('getFs', t)
 
     # Set up EOMs
     Forces = Fb + Ft + Fs + Fg
     Jforces = Jb + Jt + Js
-    f = massVector/dt * ( (q-q0)/dt - u ) - Forces
-    J = mMat / dt**2 - Jforces
+    f = scheme.residual(q, massVector, Forces)
+    J = scheme.jacobian(mMat, Jforces)
     # Free components of f and J to impose BCs
     f_free = f[freeIndex]
     J_free = J[np.ix_(freeIndex, freeIndex)]
+    t = stats.toc('eom', t)
 
     # Update
-    dq_free = np.linalg.solve(J_free, f_free)
+    if solver is None:
+      dq_free = np.linalg.solve(J_free, f_free)
+    else:
+      dq_free = solver(J_free, f_free)
+    t = stats.toc('solve', t)
 
     q[freeIndex] = q[freeIndex] - dq_free # Update free DOFs
     error = np.sum(np.abs(f_free))
+    stats.toc('update', t)
 
-    print('Iter = %d' % iter)
-    print('Error = %f' % error)
+    telemetry.emit('newton_iteration', DEBUG, iteration = iter, residual = error)
 
     iter += 1
 
-  u = (q - q0) / dt # velocity vector
+  stats.end_step(iter)
+  telemetry.emit('newton_solve', DEBUG, iterations = iter, residual = error, dt = dt)
+  u = scheme.finish(q, Forces) # velocity vector
+  if scheme.s != 1:
+    a1Iterate, a2Iterate = computeTimeParallel(a1, q0, q) # Reference frame at the end of the step
 
   return q, u, a1Iterate, a2Iterate
 
 
-# Main DER
+def objfun_planar(qGuess, q0, u,
+           freeIndex, # Boundary conditions (planar DOF indices)
+           dt, tol, # time stepping parameters
+           massVector, mMat, # Mass vector and mass matrix (or the mass vector again), planar
+           EA, refLen, # Stretching stiffness and reference length
+           EI, voronoiRefLen, kappaBar, # bending
+           Fg,
+           scheme = None, # time integration scheme (TimeIntegrators.py), backward Euler if None
+           stats = None): # Timing.SolverStats collecting per-phase times and Newton iterations
+
+  # Same scheme as objfun on the planar DOF vector: no reference frame,
+  # material frame or twist updates are needed.
+  if scheme is None:
+    scheme = BackwardEuler()
+  if stats is None:
+    stats = NULL_STATS
+  scheme.start(q0, u, dt, massVector,
+               lambda: (getFb_planar(q0, kappaBar, EI, voronoiRefLen, computeJ = False)[0] +
+                        getFs_planar(q0, EA, refLen, computeJ = False)[0] + Fg),
+               freeIndex)
 
+  q = qGuess # Guess
+  iter = 0
+  error = 10 * tol
 
-nv = 20 # nodes
-ne = nv - 1 # edges
-ndof = 4 * nv - 1 # degrees of freedom: 3*nv + ne
+  while error > tol:
+    # Compute my elastic forces
+    t = stats.tic()
+    qEval = scheme.evaluation_point(q)
+    Fb, Jb = getFb_planar(qEval, kappaBar, EI, voronoiRefLen)
+    t = stats.toc('getFb', t)
+    Fs, Js = getFs_planar(qEval, EA, refLen)
+    t = stats.toc('getFs', t)
 
-RodLength = 0.2 # meter
-natR = 0.02 # natural radius
-r0 = 0.001 # cross-sectional radius
+    # Set up EOMs
+    Forces = Fb + Fs + Fg
+    Jforces = Jb + Js
+    f = scheme.residual(q, massVector, Forces)
+    J = scheme.jacobian(mMat, Jforces)
+    # Free components of f and J to impose BCs
+    f_free = f[freeIndex]
+    J_free = J[np.ix_(freeIndex, freeIndex)]
+    t = stats.toc('eom', t)
 
-# Matrix (numpy ndarray) for the nodes at t=0
-nodes = np.zeros((nv, 3))
-if natR == 0: # straight rod
-  for c in range(nv):
-    nodes[c, 0] = c * RodLength / (nv - 1) # x coordinate of c-th node
-    nodes[c, 1] = 0
-    nodes[c, 2] = 0
-else: # rod with circular shape (ring)
-  dTheta = (RodLength / natR) * (1.0 / ne)
-  for c in range(nv):
-    nodes[c, 0] = natR * np.cos(c * dTheta)
-    nodes[c, 1] = natR * np.sin(c * dTheta)
-    nodes[c, 2] = 0.0
+    # Update
+    dq_free = np.linalg.solve(J_free, f_free)
+    t = stats.toc('solve', t)
 
+    q[freeIndex] = q[freeIndex] - dq_free # Update free DOFs
+    error = np.sum(np.abs(f_free))
+    stats.toc('update', t)
 
-# Material parameters
-Y = 10e6 # Pascals
-nu = 0.5 # Poisson's raio
-G = Y / (2.0 * (1.0 + nu)) # shear modulus
+    telemetry.emit('newton_iteration', DEBUG, iteration = iter, residual = error)
 
-# Stiffness parameters
-EI = Y * np.pi * r0**4 / 4 # Bending stiffness
-GJ = G * np.pi * r0**4 / 2 # Twisting stiffness
-EA = Y * np.pi * r0**2 # Stretching stiffness
+    iter += 1
 
+  stats.end_step(iter)
+  telemetry.emit('newton_solve', DEBUG, iterations = iter, residual = error, dt = dt)
+  u = scheme.finish(q, Forces) # velocity vector
 
-totalTime = 5 # second
-dt = 0.01 # second (may need sensitivity analysis)
+  return q, u
 
-# Tolerance
-tol = EI / RodLength**2 * 1e-3
+def test_planarFastPath():
+  """
+  This function checks the planar fast path of the main loop: a clamped
+  arc in the x-y plane under gravity along -y is integrated for 10 steps
+  with objfun (4 DOFs per node) and with objfun_planar (2 DOFs per node),
+  and the planar result mapped back with fromPlanar must agree.
+  """
+  nv, RodLength, natR, r0, dt = 12, 0.2, 0.1, 1e-3, 1e-2
+  EI = 10e6 * np.pi * r0**4 / 4
+  GJ = 10e6 / 3 * np.pi * r0**4 / 2
+  EA = 10e6 * np.pi * r0**2
+  tol = EI / RodLength**2 * 1e-3
+  nodes = rodNodes(nv, RodLength, natR)
+  massVector = rodMass(nv, RodLength, r0, 1000)
+  Fg = derGravity(massVector, np.array([0, -9.81, 0]))
+  q0 = derDOF(nodes)
+  refLen, voronoiRefLen = referenceLengths(nodes)
+  freeIndex = np.arange(7, 4 * nv - 1)
+
+  tangent = computeTangent(q0)
+  a1_first = np.cross(tangent[0, :], np.array([0, 0, -1]))
+  a1, a2 = computeSpaceParallel(a1_first / np.linalg.norm(a1_first), q0)
+  m1, m2 = computeMaterialFrame(a1, a2, q0[3::4])
+  refTwist = getRefTwist(a1, tangent, np.zeros(nv))
+  kappaBar = getKappa(q0, m1, m2)
+
+  assert isPlanar(q0, Fg) and not isPlanar(q0, derGravity(massVector, np.array([0, 0, -9.81]))), "Test case 1 failed"
+  q0_planar = toPlanar(q0)
+  assert np.array_equal(fromPlanar(q0_planar, q0), q0), "Test case 2 failed"
+  assert np.array_equal(planarIndex(freeIndex, nv), np.arange(4, 2 * nv)), "Test case 3 failed"
+
+  q, u = q0.copy(), np.zeros_like(q0)
+  u_planar = np.zeros_like(q0_planar)
+  massVector_planar = toPlanar(massVector)
+  for step in range(10):
+    q, u, a1, a2 = objfun(q.copy(), q, u, a1, a2, freeIndex, dt, tol, refTwist, massVector, massVector,
+                          EA, refLen, EI, GJ, voronoiRefLen, kappaBar, np.zeros(nv), Fg)
+    q0_planar, u_planar = objfun_planar(q0_planar.copy(), q0_planar, u_planar, planarIndex(freeIndex, nv),
+                                        dt, tol, massVector_planar, massVector_planar, EA, refLen,
+                                        EI, voronoiRefLen, getKappa_planar(toPlanar(q0)), toPlanar(Fg))
+
+  deflection = np.max(np.abs(q - q0))
+  assert deflection > 1e-3 * RodLength, "Test case 4 failed"
+  assert np.allclose(fromPlanar(q0_planar, q), q, rtol=0, atol=1e-10 * deflection), "Test case 5 failed"
+  assert np.allclose(q[2::4], 0, atol=1e-14) and np.allclose(q[3::4], 0, atol=1e-14), "Test case 6 failed"
+  assert np.allclose(toPlanar(u), u_planar, rtol=0, atol=1e-10 * np.max(np.abs(u))), "Test case 7 failed"
+  print("All test cases passed")
 
+# Main DER
 
-rho = 1000 # Density (kg/m^3)
-totalM = (np.pi * r0**2 * RodLength) * rho # total mass in kg
-dm = totalM / ne # mass per edge
+if __name__ == "__main__":
+  test_signedAngle()
+  test_rotateAxisAngle()
+  test_parallel_transport()
+  test_getForces()
+  test_planarFastPath()
 
-massVector = np.zeros(ndof)
-for c in range(nv): # 0, 1, 2, ..., nv-1 MATLAB: for c=1:nv
-  ind = [4*c, 4*c+1, 4*c+2]
-  if c == 0: # first node
-    massVector[ind] = dm/2
-  elif c == nv-1: # last node
-    massVector[ind] = dm/2
-  else: # internal nodes
-    massVector[ind] = dm
 
-for c in range(ne):
-  massVector[4*c + 3] = 1/2 * dm * r0**2
+  nv = 20 # nodes
+  ne = nv - 1 # edges
+  ndof = 4 * nv - 1 # degrees of freedom: 3*nv + ne
 
-# Diagonal matrix rerpesentation of mass vector
-mMat = np.diag(massVector)
+  RodLength = 0.2 # meter
+  natR = 0.02 # natural radius
+  r0 = 0.001 # cross-sectional radius
 
+  # Matrix (numpy ndarray) for the nodes at t=0: straight rod if natR = 0,
+  # otherwise a ring of radius natR
+  nodes = rodNodes(nv, RodLength, natR)
 
-# Gravity
-g = np.array([0, 0, -9.81])
-Fg = np.zeros(ndof) # External force vector for gravity
-for c in range(nv):
-  ind = [4*c, 4*c+1, 4*c+2]
-  Fg[ind] = massVector[ind] * g
 
+  # Material parameters
+  Y = 10e6 # Pascals
+  nu = 0.5 # Poisson's raio
+  G = Y / (2.0 * (1.0 + nu)) # shear modulus
 
-# DOF vector at t = 0
-q0 = np.zeros(ndof)
-for c in range(nv):
-  ind = [4*c, 4*c+1, 4*c+2]
-  q0[ind] = nodes[c, :]
+  # Stiffness parameters
+  EI = Y * np.pi * r0**4 / 4 # Bending stiffness
+  GJ = G * np.pi * r0**4 / 2 # Twisting stiffness
+  EA = Y * np.pi * r0**2 # Stretching stiffness
 
-u = np.zeros_like(q0) # velocity vector
 
-plotrod_simple(q0, 0)
+  totalTime = 5 # second
+  dt = 0.01 # second (may need sensitivity analysis)
 
-# Reference (undeformed) length of each edge
-refLen = np.zeros(ne)
-for c in range(ne): # loop over each edge
-  dx = nodes[c+1, :] - nodes[c, :] # edge vector from one node to the next
-  refLen[c] = np.linalg.norm(dx)
+  # Time integration scheme: 'euler', 'bdf2', 'midpoint', 'newmark' or 'hht'
+  # (second-order schemes reach the same accuracy with larger dt)
+  scheme = make_scheme('euler')
 
-# Voronoi length of each node
-voronoiRefLen = np.zeros(nv)
-for c in range(nv): # loop over each node
-  if c==0:
-    voronoiRefLen[c] = 0.5 * refLen[c]
-  elif c==nv-1:
-    voronoiRefLen[c] = 0.5 * refLen[c-1]
-  else:
-    voronoiRefLen[c] = 0.5 * (refLen[c-1] + refLen[c])
+  # Per-phase timing of the Newton solver (summary every summaryEvery steps, 0: only at the end)
+  summaryEvery = 0
+  stats = SolverStats(summary_every = summaryEvery)
+
+  # Memory instrumentation instead of the timing (tracemalloc, slow: for short runs)
+  memoryProfile = False
+  if memoryProfile:
+    print(f"Predicted peak memory: {predictMemory(nv, 'der', round(totalTime / dt))['total'] / 1e6:.1f} MB")
+    stats = MemoryStats()
 
+  # Progress: one 'step' record every 10 steps (see Telemetry.configure for
+  # the sink, the level and the other limits)
+  telemetry.limit('step', every = 10)
 
-# Reference frame (Space parallel transport at t=0)
-a1 = np.zeros((ne,3)) # First reference director
-a2 = np.zeros((ne,3)) # Second reference director
-tangent = computeTangent(q0) # We need to create this function
+  # Tolerance
+  tol = EI / RodLength**2 * 1e-3
 
-t0 = tangent[0,:] # tangent on the first edge
-t1 = np.array([0, 0, -1]) # "arbitrary" vector
-a1_first = np.cross(t0, t1) # This is perpendicular to tangent t0
-# Check for null vector
-if np.linalg.norm(a1_first) < 1e-6:
-  t1 = np.array([0, 1, 0]) # new arbitrary vector
-  a1_first = np.cross(t0, t1)
-a1_first = a1_first / np.linalg.norm(a1_first) # Normalize
-a1, a2 = computeSpaceParallel(a1_first, q0) # We need to create this function
-# a1, a2, tangent all have size (ne,3)
 
-# Material frame
-theta = q0[3::4] # twist angles
-m1, m2 = computeMaterialFrame(a1, a2, theta) # Compute material frame
+  rho = 1000 # Density (kg/m^3)
 
+  # Lumped masses: dm = total mass / ne per internal node (dm/2 at the ends)
+  # and dm r0^2 / 2 per twist angle
+  massVector = rodMass(nv, RodLength, r0, rho)
 
-# Reference twist
-refTwist = np.zeros(nv)
-refTwist = getRefTwist(a1, tangent, refTwist) # We need to write this function
+  # The mass matrix is kept as its diagonal: the solvers take the vector
+  mMat = massVector
 
-# Natural curvature
-kappaBar = getKappa(q0, m1, m2) # We need to write this function
 
-# Natural twist
-twistBar = np.zeros(nv)
+  # Gravity
+  g = np.array([0, 0, -9.81])
+  Fg = derGravity(massVector, g) # External force vector for gravity
 
 
-# Fixed and Free DOFs
-fixedIndex = np.arange(0,7) # First seven (2 nodes and one edge) are fixed: clamped
-freeIndex = np.arange(7,ndof)
+  # DOF vector at t = 0
+  q0 = derDOF(nodes)
 
+  u = np.zeros_like(q0) # velocity vector
 
-Nsteps = round(totalTime / dt ) # Total number of steps
-ctime = 0 # current time
-endZ = np.zeros(Nsteps) # Store z-coordinate of the last node with time
+  plotrod_simple(q0, 0)
 
-for timeStep in range(Nsteps):
-  print('Current time = %f' % ctime)
+  # Reference (undeformed) length of each edge and Voronoi length of each node
+  refLen, voronoiRefLen = referenceLengths(nodes)
 
-  qGuess = q0.copy() # This should be fixed - I did not include this line in class
-  q, u, a1, a2 = objfun(qGuess,q0, u, a1, a2,freeIndex,dt, tol,refTwist,massVector, mMat,EA, refLen,EI, GJ, voronoiRefLen, kappaBar, twistBar, Fg)
 
-  ctime += dt # Update current time
+  # Reference frame (Space parallel transport at t=0)
+  a1 = np.zeros((ne,3)) # First reference director
+  a2 = np.zeros((ne,3)) # Second reference director
+  tangent = computeTangent(q0) # We need to create this function
 
-  # Update q0 with the new q
-  q0 = q.copy()
+  t0 = tangent[0,:] # tangent on the first edge
+  t1 = np.array([0, 0, -1]) # "arbitrary" vector
+  a1_first = np.cross(t0, t1) # This is perpendicular to tangent t0
+  # Check for null vector
+  if np.linalg.norm(a1_first) < 1e-6:
+    t1 = np.array([0, 1, 0]) # new arbitrary vector
+    a1_first = np.cross(t0, t1)
+  a1_first = a1_first / np.linalg.norm(a1_first) # Normalize
+  a1, a2 = computeSpaceParallel(a1_first, q0) # We need to create this function
+  # a1, a2, tangent all have size (ne,3)
 
-  # Store the z-coordinate of the last node
-  endZ[timeStep] = q[-1]
+  # Material frame
+  theta = q0[3::4] # twist angles
+  m1, m2 = computeMaterialFrame(a1, a2, theta) # Compute material frame
 
-  # Every 100 time steps, update material directors and plot the rod
-  if timeStep % 10 == 0:
-    plotrod_simple(q, ctime)
 
-# Visualization after the loop
-plt.figure(2)
-time_array = np.arange(1, Nsteps + 1) * dt
-plt.plot(time_array, endZ, 'ro-')
-plt.box(True)
-plt.xlabel('Time, t [sec]')
-plt.ylabel('z-coord of last node, $\\delta_z$ [m]')
-plt.show()
+  # Reference twist
+  refTwist = np.zeros(nv)
+  refTwist = getRefTwist(a1, tangent, refTwist) # We need to write this function
 
+  # Natural curvature
+  kappaBar = getKappa(q0, m1, m2) # We need to write this function
 
+  # Natural twist
+  twistBar = np.zeros(nv)
 
 
+  # Fixed and Free DOFs
+  fixedIndex = np.arange(0,7) # First seven (2 nodes and one edge) are fixed: clamped
+  freeIndex = np.arange(7,ndof)
 
+  # Planar fast path: a rod that lies and is loaded in the x-y plane (e.g.
+  # natR = 0 with g = [0, -9.81, 0]) and has no twist is solved with
+  # 2 DOFs per node and the planar kernels
+  planar = isPlanar(q0, Fg)
+  if planar:
+    q0_planar = toPlanar(q0)
+    u_planar = toPlanar(u)
+    freeIndex_planar = planarIndex(freeIndex, nv)
+    massVector_planar = toPlanar(massVector)
+    mMat_planar = massVector_planar
+    Fg_planar = toPlanar(Fg)
+    kappaBar_planar = getKappa_planar(q0_planar)
 
+
+  Nsteps = round(totalTime / dt ) # Total number of steps
+  ctime = 0 # current time
+  endZ = np.zeros(Nsteps) # Store z-coordinate of the last node with time
+
+  # Profiling of steps 1 to 20 with --profile (see Profiling.py)
+  profiler = from_argv('DER', window = (1, 21))
+  for timeStep in range(Nsteps):
+    profiler.step(timeStep)
+    if planar:
+      q_planar, u_planar = objfun_planar(q0_planar.copy(), q0_planar, u_planar, freeIndex_planar, dt, tol,
+                                         massVector_planar, mMat_planar, EA, refLen,
+                                         EI, voronoiRefLen, kappaBar_planar, Fg_planar, scheme,
+                                         stats = stats)
+      q0_planar = q_planar.copy()
+      q = fromPlanar(q_planar, q0)
+    else:
+      qGuess = q0.copy() # This should be fixed - I did not include this line in class
+      q, u, a1, a2 = objfun(qGuess,q0, u, a1, a2,freeIndex,dt, tol,refTwist,massVector, mMat,EA, refLen,EI, GJ, voronoiRefLen, kappaBar, twistBar, Fg, scheme,
+                          stats = stats)
+
+    ctime += dt # Update current time
+    telemetry.emit('step', INFO, step = timeStep, time = ctime,
+                   iterations = stats.newton_iterations[-1], dt = dt)
+
+    # Update q0 with the new q
+    q0 = q.copy()
+
+    # Store the z-coordinate of the last node
+    endZ[timeStep] = q[-1]
+
+    # Every 100 time steps, update material directors and plot the rod
+    if timeStep % 10 == 0:
+      plotrod_simple(q, ctime)
+  profiler.finish()
+
+  print(stats.summary())
+
+  # Visualization after the loop
+  plt = _pyplot()
+  plt.figure(2)
+  time_array = np.arange(1, Nsteps + 1) * dt
+  plt.plot(time_array, endZ, 'ro-')
+  plt.box(True)
+  plt.xlabel('Time, t [sec]')
+  plt.ylabel('z-coord of last node, $\\delta_z$ [m]')
+  plt.show()
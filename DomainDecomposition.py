@@ -0,0 +1,292 @@
+"""
+Domain-decomposed solve of the banded Newton systems of long rods.
+
+The DER Jacobian is banded: a bending/twisting stencil couples 11
+consecutive DOFs, so |i - j| <= 10 for every nonzero. A block of bw
+consecutive DOFs (bw = half-bandwidth) therefore cuts the rod in two
+independent parts. DomainDecompositionSolver splits the unknowns into nseg
+segments separated by nseg - 1 such interfaces and solves A x = b by static
+condensation:
+
+    for every segment k (in parallel):
+        factorize A_kk (sparse LU of the banded segment interior)
+        X_k = A_kk^-1 A_kG,  y_k = A_kk^-1 b_k
+        S_k = A_Gk X_k,      g_k = A_Gk y_k
+    S = A_GG - sum S_k,  x_G = S^-1 (b_G - sum g_k)   (interface system)
+    x_k = y_k - X_k x_G
+
+Only the rows of A_kG next to the two ends of the segment are nonzero, so
+every segment solves for 2 bw right-hand sides and the interface (Schur
+complement) system has (nseg - 1) bw unknowns. The segments run in worker
+processes. The banded matrix, the right-hand side and the per-segment
+results X_k, y_k live in shared memory blocks, so only the small S_k and
+g_k are sent back to the caller.
+
+Matrices use the banded storage of scipy.linalg.solve_banded with
+l = u = bw (ab[bw + i - j, j] = A[i, j]), as IMEX.stretching_banded.
+"""
+
+import numpy as np
+import scipy.linalg
+import scipy.sparse
+import scipy.sparse.linalg
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+def dense_to_banded(A, bw):
+    """Banded storage (l = u = bw) of the square matrix A."""
+    n = A.shape[0]
+    ab = np.zeros((2 * bw + 1, n))
+    for k in range(-bw, bw + 1):
+        if k >= 0:
+            ab[bw - k, k:] = np.diagonal(A, k)
+        else:
+            ab[bw - k, :n + k] = np.diagonal(A, k)
+    return ab
+
+def bandwidth(A):
+    """Half-bandwidth of the square matrix A (largest |i - j| of a nonzero)."""
+    i, j = np.nonzero(A)
+    return int(np.max(np.abs(i - j))) if len(i) else 0
+
+def _block(ab, bw, rows, cols):
+    # Dense block A[rows, cols] of a banded matrix
+    I, J = np.meshgrid(rows, cols, indexing='ij')
+    inside = np.abs(I - J) <= bw
+    block = np.zeros(I.shape)
+    block[inside] = ab[bw + I[inside] - J[inside], J[inside]]
+    return block
+
+def _sparse_block(ab, bw, start, end):
+    # A[start:end, start:end] as a sparse CSC matrix
+    m = end - start
+    diagonals, offsets = [], []
+    for k in range(-min(bw, m - 1), min(bw, m - 1) + 1):
+        if k >= 0:
+            diagonals.append(ab[bw - k, start + k:end])
+        else:
+            diagonals.append(ab[bw - k, start:end + k])
+        offsets.append(k)
+    return scipy.sparse.diags(diagonals, offsets, shape=(m, m), format='csc')
+
+def partition(n, nseg, bw):
+    """
+    Split n unknowns into nseg segments separated by interfaces of bw
+    unknowns.
+
+    Returns:
+    segments : list of (start, end)
+        Interior range of every segment.
+    interfaces : list of (start, end)
+        Range of every interface (interface k lies between segments k and k+1).
+    """
+    m = (n - (nseg - 1) * bw) // nseg
+    if nseg > 1 and m < 2 * bw:
+        raise ValueError(f'{nseg} segments are too many for {n} unknowns with bandwidth {bw}')
+    segments, interfaces = [], []
+    start = 0
+    for k in range(nseg):
+        end = n if k == nseg - 1 else start + m
+        segments.append((start, end))
+        if k < nseg - 1:
+            interfaces.append((end, end + bw))
+        start = end + bw
+    return segments, interfaces
+
+def _attach(name, shape):
+    # Numpy view of an existing shared memory block
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=float, buffer=shm.buf)
+
+def _solve_segment(task):
+    # Factorize one segment interior and condense it on its interfaces.
+    # X_k and y_k are written to shared memory, S_k and g_k are returned.
+    (ab_name, ab_shape, b_name, X_name, y_name, bw, start, end, left, right) = task
+    n = ab_shape[1]
+    shm_ab, ab = _attach(ab_name, ab_shape)
+    shm_b, b = _attach(b_name, (n,))
+    shm_X, X = _attach(X_name, (n, 2 * bw))
+    shm_y, y = _attach(y_name, (n,))
+    try:
+        m = end - start
+        lu = scipy.sparse.linalg.splu(_sparse_block(ab, bw, start, end))
+
+        # Coupling to the left and right interfaces (only bw rows at each end)
+        B = np.zeros((m, 2 * bw))
+        if left:
+            B[:bw, :bw] = _block(ab, bw, np.arange(start, start + bw), np.arange(start - bw, start))
+        if right:
+            B[m - bw:, bw:] = _block(ab, bw, np.arange(end - bw, end), np.arange(end, end + bw))
+        Xk = lu.solve(B)
+        yk = lu.solve(b[start:end].copy())
+        X[start:end] = Xk
+        y[start:end] = yk
+
+        # Condensed contributions A_Gk X_k and A_Gk y_k
+        S = np.zeros((2 * bw, 2 * bw))
+        g = np.zeros(2 * bw)
+        if left:
+            A_Lk = _block(ab, bw, np.arange(start - bw, start), np.arange(start, start + bw))
+            S[:bw] = A_Lk @ Xk[:bw]
+            g[:bw] = A_Lk @ yk[:bw]
+        if right:
+            A_Rk = _block(ab, bw, np.arange(end, end + bw), np.arange(end - bw, end))
+            S[bw:] = A_Rk @ Xk[m - bw:]
+            g[bw:] = A_Rk @ yk[m - bw:]
+        return S, g
+    finally:
+        del ab, b, X, y
+        for shm in (shm_ab, shm_b, shm_X, shm_y):
+            shm.close()
+
+class DomainDecompositionSolver:
+    """
+    Solver of banded systems by domain decomposition (see the module
+    docstring).
+
+    Parameters:
+    nseg : int
+        Number of segments.
+    processes : int
+        Number of worker processes (default nseg). With processes = 1 the
+        segments are solved one after the other in the calling process.
+    bw : int
+        Half-bandwidth used when a dense matrix is passed to __call__
+        (default: measured from the matrix; 10 for a DER Jacobian).
+
+    The worker pool is created on the first solve and kept until close().
+    An instance is also a linear solver for DER.objfun(solver = ...).
+    """
+
+    def __init__(self, nseg, processes=None, bw=None):
+        self.nseg = nseg
+        self.processes = nseg if processes is None else processes
+        self.bw = bw
+        self._pool = None
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __call__(self, A, b):
+        """Solve the dense system A x = b (A must be banded)."""
+        bw = bandwidth(A) if self.bw is None else self.bw
+        return self.solve(dense_to_banded(A, bw), b, bw)
+
+    def solve(self, ab, b, bw):
+        """Solve A x = b with A in banded storage (l = u = bw)."""
+        n = ab.shape[1]
+        nseg = max(1, min(self.nseg, (n + bw) // (3 * bw)))
+        if nseg == 1:
+            return scipy.linalg.solve_banded((bw, bw), ab, b)
+        segments, interfaces = partition(n, nseg, bw)
+
+        # Shared memory for the matrix, the right-hand side and X_k, y_k
+        blocks = []
+        def share(shape, data=None):
+            shm = shared_memory.SharedMemory(create=True, size=max(8, int(np.prod(shape)) * 8))
+            array = np.ndarray(shape, dtype=float, buffer=shm.buf)
+            if data is not None:
+                array[:] = data
+            blocks.append((shm, array))
+            return shm.name
+
+        try:
+            ab_name = share(ab.shape, ab)
+            b_name = share((n,), b)
+            X_name = share((n, 2 * bw))
+            y_name = share((n,))
+            tasks = [(ab_name, ab.shape, b_name, X_name, y_name, bw, start, end, k > 0, k < nseg - 1)
+                     for k, (start, end) in enumerate(segments)]
+
+            if self.processes > 1:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.processes)
+                results = list(self._pool.map(_solve_segment, tasks))
+            else:
+                results = [_solve_segment(task) for task in tasks]
+
+            # Interface (Schur complement) system
+            G = np.concatenate([np.arange(s, e) for s, e in interfaces])
+            S = _block(ab, bw, G, G)
+            rhs = np.asarray(b, dtype=float)[G].copy()
+            for k, (Sk, gk) in enumerate(results):
+                # Local interface DOFs of segment k: left = interface k-1, right = interface k
+                local = np.concatenate((np.arange((k - 1) * bw, k * bw) if k > 0 else np.arange(0),
+                                        np.arange(k * bw, (k + 1) * bw) if k < nseg - 1 else np.arange(0)))
+                rows = np.concatenate((np.arange(bw) if k > 0 else np.arange(0),
+                                       np.arange(bw, 2 * bw) if k < nseg - 1 else np.arange(0)))
+                S[np.ix_(local, local)] -= Sk[np.ix_(rows, rows)]
+                rhs[local] -= gk[rows]
+            xG = np.linalg.solve(S, rhs)
+
+            # Back substitution in the segment interiors
+            X = blocks[2][1]
+            y = blocks[3][1]
+            x = np.zeros(n)
+            x[G] = xG
+            for k, (start, end) in enumerate(segments):
+                xk = y[start:end].copy()
+                if k > 0:
+                    xk -= X[start:end, :bw] @ xG[(k - 1) * bw:k * bw]
+                if k < nseg - 1:
+                    xk -= X[start:end, bw:] @ xG[k * bw:(k + 1) * bw]
+                x[start:end] = xk
+            return x
+        finally:
+            for shm, array in blocks:
+                del array
+                shm.close()
+                shm.unlink()
+
+def test_domain_decomposition():
+    """
+    This function checks the domain-decomposed solve against a direct banded
+    solve, on a random banded matrix (in-process and with worker processes)
+    and on the Newton matrix of a DER rod.
+    """
+    rng = np.random.default_rng(6)
+    n, bw = 400, 10
+    A = rng.standard_normal((n, n))
+    A[np.abs(np.subtract.outer(np.arange(n), np.arange(n))) > bw] = 0
+    A += 25 * np.eye(n)
+    b = rng.standard_normal(n)
+    x_ref = np.linalg.solve(A, b)
+
+    solver = DomainDecompositionSolver(4, processes=1)
+    assert np.allclose(solver(A, b), x_ref, rtol=1e-10, atol=1e-12), "Test case 1 failed"
+
+    solver = DomainDecompositionSolver(5, processes=2)
+    try:
+        x = solver.solve(dense_to_banded(A, bw), b, bw)
+    finally:
+        solver.close()
+    assert np.allclose(x, x_ref, rtol=1e-10, atol=1e-12), "Test case 2 failed"
+
+    # Newton matrix M / dt^2 - dF/dq of a bent and twisted DER rod
+    from DER import getFs, getFb, getFt, computeTangent, computeSpaceParallel, computeMaterialFrame
+    nv = 60
+    ndof = 4 * nv - 1
+    q = np.zeros(ndof)
+    q[0::4] = np.arange(nv) * 0.01
+    q += 1e-3 * rng.standard_normal(ndof)
+    refLen = np.full(nv - 1, 0.01)
+    voronoiRefLen = np.full(nv, 0.01)
+    a1_first = np.cross(computeTangent(q)[0, :], np.array([0.0, 0.0, 1.0]))
+    a1, a2 = computeSpaceParallel(a1_first / np.linalg.norm(a1_first), q)
+    m1, m2 = computeMaterialFrame(a1, a2, q[3::4])
+    J = (getFs(q, 10.0, refLen)[1] + getFb(q, m1, m2, np.zeros((nv, 2)), 1e-3, voronoiRefLen)[1]
+         + getFt(q, np.zeros(nv), np.zeros(nv), 1e-3, voronoiRefLen)[1])
+    A = 1e-2 * np.eye(ndof) - J
+    freeIndex = np.arange(7, ndof)
+    A = A[np.ix_(freeIndex, freeIndex)]
+    b = rng.standard_normal(len(freeIndex))
+    assert bandwidth(A) <= 10, "Test case 3 failed"
+    x = DomainDecompositionSolver(3, processes=1)(A, b)
+    assert np.allclose(A @ x, b, rtol=1e-8, atol=1e-8 * np.max(np.abs(b))), "Test case 4 failed"
+
+    print("All test cases passed")
+
+if __name__ == "__main__":
+    test_domain_decomposition()
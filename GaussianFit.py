@@ -0,0 +1,383 @@
+"""
+Model evaluation of the Gaussian fits of HW3_JG_2.py and HW3_JG_nln.py.
+
+The scripts fit y = n * exp(-a * (m * x + b)**2) by gradient descent. Every
+epoch needs the loss and the four gradients; evaluate computes them in one
+pass over the data, with the inner term m x + b, the exponential and the
+residual computed once and shared by all of them (instead of one forward
+pass per gradient and another one for the loss):
+
+    loss, grad_n, grad_a, grad_m, grad_b = evaluate(x, y, n, a, m, b)
+    n += learning_rate * grad_n
+    ...
+
+The parameters may be scalars or columns (K, 1) of a batch of K starts;
+the means are taken over the last axis, so the outputs are then (K,).
+
+fit_lm solves the same least-squares problem with Levenberg-Marquardt
+(method 'lm') or Gauss-Newton with step halving (method 'gn'), using the
+analytic Jacobian of the model (model_jacobian). The data only determine n,
+sqrt(a) m and sqrt(a) b: scaling a by c^2 and m, b by 1/c gives the same
+model, so J^T J of (n, a, m, b) is singular and the iterations can drift
+along that direction (to a < 0 as well). fit_lm therefore fits
+(n, sqrt(a) m, sqrt(a) b) with a held at the magnitude of its starting
+value (1 if that is 0) and returns (n, a, m, b) in that gauge. The normal
+equations are a 3 x 3 system, so an iteration costs about one gradient
+descent epoch and a fit takes tens of iterations instead of tens of
+thousands of epochs:
+
+    result = fit_lm(x, y, [n, a, m, b])
+    n, a, m, b = result['params']
+    print(summary(result))
+
+The damping lam of 'lm' scales the diagonal of J^T J (Marquardt); it is
+divided by damping_down after a step that lowers the loss and multiplied
+by damping_up after a rejected one. result holds the convergence
+diagnostics: the reason of the stop, the iterations and model evaluations,
+the gradient norm, the condition number of J^T J and the history of the
+loss, damping and step size. A fit whose model vanishes at every data point
+(the Gaussian moved away from the data, or n = 0) sits on a plateau of the
+loss where the gradient is zero too: it stops with reason 'vanishing' and
+is not converged.
+"""
+
+import time
+
+import numpy as np
+
+from Telemetry import telemetry, DEBUG, INFO
+
+def _dot(u, v):
+    # Sum over the last axis of u * v (one value per set of parameters)
+    return np.einsum('...i,...i->...', u, v)
+
+def evaluate(x, y, n, a, m, b):
+    """
+    Mean Squared Error loss and gradients of y = n * exp(-a * (m * x + b)^2).
+
+    Parameters:
+    x : np.array
+        Input data points (x values).
+    y : np.array
+        Actual output data points (y values).
+    n, a, m, b : float or np.array
+        Parameters of the function (columns (K, 1) for K sets of parameters).
+
+    Returns:
+    loss, grad_n, grad_a, grad_m, grad_b
+        MSE loss and the descent directions of the scripts (minus the
+        gradients of the loss: parameters += learning_rate * grad).
+    """
+    # Forward pass: inner term, exponential and residual (in place, so
+    # that a large data set allocates five arrays per evaluation)
+    inner = m * x
+    inner += b
+    inner2 = inner * inner
+    e = np.multiply(inner2, -a)
+    np.exp(e, out=e)
+    residual = np.multiply(e, -n)
+    residual += y
+
+    # Loss and gradients, reduced with dot products over the data
+    N = np.shape(x)[-1]
+    w = residual * e
+    loss = _dot(residual, residual) / N
+    grad_n = 2 * np.sum(w, axis=-1) / N
+    w *= n
+    grad_a = -2 * _dot(w, inner2) / N
+    w *= inner
+    w *= -2 * a # r n e (-a) 2 (m x + b), common factor of the m and b gradients
+    grad_m = 2 * _dot(w, x) / N
+    grad_b = 2 * np.sum(w, axis=-1) / N
+    return loss, grad_n, grad_a, grad_m, grad_b
+
+def model_jacobian(x, y, n, a, m, b):
+    """
+    Residual and Jacobian of y = n * exp(-a * (m * x + b)^2).
+
+    Returns:
+    residual : np.array
+        y - model, shape (N,).
+    J : np.array
+        Derivatives of the model with respect to (n, a, m, b), shape (N, 4).
+    """
+    inner = m * x + b
+    inner2 = inner * inner
+    e = np.exp(-a * inner2)
+    ne = n * e
+    J = np.empty((np.size(x), 4))
+    J[:, 0] = e
+    J[:, 1] = -ne * inner2
+    J[:, 3] = (-2 * a) * ne * inner
+    J[:, 2] = J[:, 3] * x
+    return y - ne, J
+
+def _gauge_jacobian(x, y, n, s, t):
+    # Residual and Jacobian with respect to (n, s, t) of n exp(-(s x + t)^2),
+    # i.e. model_jacobian at a = 1 without the a column
+    residual, J = model_jacobian(x, y, n, 1.0, s, t)
+    return residual, J[:, [0, 2, 3]]
+
+def fit_lm(x, y, p0, method='lm', damping=1e-3, damping_up=10.0, damping_down=10.0,
+           max_iter=200, ftol=1e-12, xtol=1e-12, gtol=1e-12, max_damping=1e12):
+    """
+    Least-squares fit of (n, a, m, b) by Levenberg-Marquardt or Gauss-Newton.
+    The iterations run on (n, sqrt(a) m, sqrt(a) b) with a fixed at |a| of
+    p0 (1 if it is 0), see the module docstring.
+
+    Parameters:
+    x, y : np.array
+        Data points.
+    p0 : sequence
+        Initial parameters (n, a, m, b).
+    method : str
+        'lm' (Levenberg-Marquardt) or 'gn' (Gauss-Newton, the step is halved
+        until the loss decreases).
+    damping : float
+        Initial damping of 'lm'.
+    damping_up, damping_down : float
+        Factors of the damping after a rejected and an accepted step.
+    max_iter : int
+        Maximum number of iterations (accepted steps).
+    ftol : float
+        Stop when an accepted step lowers the loss by less than ftol * loss.
+    xtol : float
+        Stop when the step is shorter than xtol * (|p| + xtol), with p the
+        fitted (n, sqrt(a) m, sqrt(a) b).
+    gtol : float
+        Stop when the largest component of the gradient of the loss with
+        respect to (n, sqrt(a) m, sqrt(a) b) is below gtol.
+    max_damping : float
+        Stop 'lm' when no step is accepted with this damping (30 halvings for 'gn').
+
+    Returns:
+    dict with params (n, a, m, b), loss, converged, reason ('loss', 'step',
+    'gradient', 'vanishing', 'max_iter' or 'no_decrease'; converged for the
+    first three), iterations, evaluations, damping, gradient (largest
+    component at the end), condition (of J^T J at the end) and history
+    (loss, damping, step of every iteration).
+    """
+    if method not in ('lm', 'gn'):
+        raise ValueError(f"Unknown method '{method}' (use 'lm' or 'gn')")
+    N = np.size(x)
+    n0, a, m0, b0 = np.array(p0, dtype=float)
+    a = abs(a) or 1.0 # a <= 0 is no Gaussian; keep m and b
+    root_a = np.sqrt(a)
+    p = np.array([n0, root_a * m0, root_a * b0])
+    residual, J = _gauge_jacobian(x, y, *p)
+    loss = residual @ residual / N
+    lam = damping if method == 'lm' else 0.0
+    evaluations = 1
+    history = []
+    reason = 'max_iter'
+
+    for iteration in range(1, max_iter + 1):
+        A = J.T @ J
+        g = J.T @ residual # -N/2 times the gradient of the loss
+        if np.max(np.abs(g)) * 2 / N <= gtol:
+            reason = 'gradient'
+            break
+
+        # Damped normal equations, solved again with more damping (or a
+        # shorter step) until the loss decreases
+        scale = np.maximum(np.diag(A), np.finfo(float).tiny)
+        if method == 'gn':
+            # Minimum-norm Gauss-Newton step: J^T J is still singular where
+            # the model vanishes (n = 0 leaves s and t undetermined)
+            gauss_newton = np.linalg.lstsq(J, residual, rcond=None)[0]
+        step = 1.0
+        while True:
+            if method == 'gn':
+                delta = step * gauss_newton
+            else:
+                try:
+                    delta = np.linalg.solve(A + lam * np.diag(scale), g)
+                except np.linalg.LinAlgError:
+                    delta = np.full(3, np.nan)
+            p_new = p + delta
+            with np.errstate(over='ignore', invalid='ignore'): # rejected below
+                residual_new, J_new = _gauge_jacobian(x, y, *p_new)
+                loss_new = residual_new @ residual_new / N
+            evaluations += 1
+            if np.isfinite(loss_new) and loss_new < loss:
+                break
+            if method == 'lm':
+                lam = max(lam, damping) * damping_up
+                if lam > max_damping:
+                    break
+            else:
+                step *= 0.5
+                if step < 2.0**-30:
+                    break
+        if not (np.isfinite(loss_new) and loss_new < loss):
+            reason = 'no_decrease'
+            break
+
+        decrease = loss - loss_new
+        p, residual, J, loss = p_new, residual_new, J_new, loss_new
+        history.append({'iteration': iteration, 'loss': loss, 'damping': lam,
+                        'step': float(np.linalg.norm(delta))})
+        telemetry.emit('lm_iteration', DEBUG, iteration = iteration, loss = loss,
+                       damping = lam, step = history[-1]['step'])
+        if method == 'lm':
+            lam /= damping_down
+
+        if decrease <= ftol * loss:
+            reason = 'loss'
+            break
+        if np.linalg.norm(delta) <= xtol * (np.linalg.norm(p) + xtol):
+            reason = 'step'
+            break
+
+    # A zero model has a zero gradient as well: a plateau, not a fit
+    model = y - residual
+    if reason in ('loss', 'step', 'gradient') and \
+            np.max(np.abs(model)) <= np.sqrt(np.finfo(float).eps) * np.max(np.abs(y)):
+        reason = 'vanishing'
+
+    A = J.T @ J
+    result = {'params': np.array([p[0], a, p[1] / root_a, p[2] / root_a]), 'loss': loss,
+              'method': method, 'converged': reason in ('loss', 'step', 'gradient'), 'reason': reason,
+              'iterations': len(history), 'evaluations': evaluations, 'damping': lam,
+              'gradient': float(np.max(np.abs(J.T @ residual)) * 2 / N),
+              'condition': float(np.linalg.cond(A)), 'history': history}
+    telemetry.emit('lm_fit', INFO, **{k: result[k] for k in ('method', 'reason', 'iterations',
+                                                              'evaluations', 'loss', 'gradient')})
+    return result
+
+def summary(result):
+    """One line per diagnostic of a fit_lm result."""
+    n, a, m, b = result['params']
+    return '\n'.join([
+        f"{result['method'].upper()}: {'converged' if result['converged'] else 'stopped'} "
+        f"({result['reason']}) after {result['iterations']} iterations, "
+        f"{result['evaluations']} model evaluations",
+        f"loss {result['loss']:.6e}, gradient {result['gradient']:.2e}, "
+        f"damping {result['damping']:.2e}, cond(J^T J) {result['condition']:.2e}",
+        f"n = {n:.6g}, a = {a:.6g}, m = {m:.6g}, b = {b:.6g}"])
+
+def test_evaluate():
+    """
+    This function checks evaluate against the separate forward pass, loss and
+    gradients of the scripts, for scalar and batched parameters, and times
+    both on 10**6 points.
+    """
+    def unfused(x, y, n, a, m, b):
+        # Expressions of the epoch loop of HW3_JG_nln.py
+        y_int_fit = (m * x + b) ** 2
+        y_pred_fit = n * np.exp(-a * y_int_fit)
+        grad_n = 2 * np.mean((y - y_pred_fit) * np.exp(-a * y_int_fit), axis=-1)
+        grad_a = 2 * np.mean((y - y_pred_fit) * n * np.exp(-a * y_int_fit) * (-y_int_fit), axis=-1)
+        grad_m = 2 * np.mean((y - y_pred_fit) * n * np.exp(-a * y_int_fit) * (-a) * (2 * (m * x + b) * x), axis=-1)
+        grad_b = 2 * np.mean((y - y_pred_fit) * n * np.exp(-a * y_int_fit) * (-a) * (2 * (m * x + b)), axis=-1)
+        loss = np.mean((y - n * np.exp(-a * (m * x + b) ** 2)) ** 2, axis=-1)
+        return loss, grad_n, grad_a, grad_m, grad_b
+
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 5, 10)
+    y = 0.06 * np.exp(-0.25 * (0.57 * x + 0.11) ** 2) + 0.01 * rng.normal(size=x.shape)
+    params = rng.random((5, 4))
+
+    for k in range(5):
+        assert np.allclose(evaluate(x, y, *params[k]), unfused(x, y, *params[k]),
+                           rtol=1e-12, atol=1e-15), "Test case 1 failed"
+    batch = evaluate(x, y, *(params[:, k:k+1] for k in range(4)))
+    assert all(out.shape == (5,) for out in batch), "Test case 2 failed"
+    single = np.array([evaluate(x, y, *p) for p in params]).T
+    assert np.allclose(batch, single, rtol=1e-12, atol=1e-15), "Test case 3 failed"
+
+    # The descent directions are minus the gradient of the loss
+    h = 1e-7
+    loss, *grad = evaluate(x, y, *params[0])
+    for k in range(4):
+        p = params[0].copy()
+        p[k] += h
+        assert abs((evaluate(x, y, *p)[0] - loss) / h + grad[k]) < 1e-5 * max(1, abs(grad[k])), "Test case 4 failed"
+
+    x = np.linspace(0, 5, 10**6)
+    y = 0.06 * np.exp(-0.25 * (0.57 * x + 0.11) ** 2)
+    t0 = time.perf_counter()
+    unfused(x, y, *params[0])
+    t1 = time.perf_counter()
+    evaluate(x, y, *params[0])
+    t2 = time.perf_counter()
+    print(f"10**6 points: {1e3 * (t1 - t0):.1f} ms unfused, {1e3 * (t2 - t1):.1f} ms fused")
+
+    print("All test cases passed")
+
+def test_fit_lm():
+    """
+    This function checks the Jacobian against finite differences, the
+    recovery of the identifiable parameter combinations from exact data by
+    both methods, that LM reaches a lower loss than the 10000 gradient
+    descent epochs of HW3_JG_nln.py in a few tens of iterations, that LM
+    converges with a > 0 from random starts on the noisier data of
+    HW3_JG_2.py, and that a vanishing model is not reported as converged.
+    """
+    import Telemetry
+
+    Telemetry.configure(level = Telemetry.OFF)
+    try:
+        x = np.linspace(0, 5, 10)
+        p_true = np.array([0.06, 0.25, 0.57, 0.11])
+        y = p_true[0] * np.exp(-p_true[1] * (p_true[2] * x + p_true[3]) ** 2)
+
+        h = 1e-7
+        p = np.array([0.3, 0.7, 0.4, 0.2])
+        residual, J = model_jacobian(x, y, *p)
+        for k in range(4):
+            dp = np.zeros(4)
+            dp[k] = h
+            fd = (residual - model_jacobian(x, y, *(p + dp))[0]) / h
+            assert np.allclose(fd, J[:, k], rtol=1e-5, atol=1e-8), "Test case 1 failed"
+
+        # Only n, sqrt(a) m and sqrt(a) b enter the model
+        identifiable = lambda q: np.array([q[0], np.sqrt(q[1]) * q[2], np.sqrt(q[1]) * q[3]])
+        for method in ('lm', 'gn'):
+            result = fit_lm(x, y, [0.1, 0.5, 0.5, 0.5], method=method)
+            assert result['converged'] and result['loss'] < 1e-20, "Test case 2 failed"
+            assert np.allclose(identifiable(result['params']), identifiable(p_true), rtol=1e-6), "Test case 3 failed"
+
+        # Data and start drawn as in HW3_JG_nln.py (noise 0.001 * N(0, 0.1), start U(0, 1))
+        rng = np.random.default_rng(42)
+        y = p_true[0] * np.exp(-p_true[1] * (p_true[2] * x + p_true[3]) ** 2) + 0.001 * rng.normal(0, 0.1, size=x.shape)
+        p0 = rng.random(4)
+        p = p0.copy()
+        loss, *grad = evaluate(x, y, *p)
+        for epoch in range(10000):
+            p += 1.0 * np.array(grad)
+            loss, *grad = evaluate(x, y, *p)
+        result = fit_lm(x, y, p0)
+        print(summary(result))
+        assert result['converged'] and result['iterations'] < 50, "Test case 4 failed"
+        assert result['loss'] < loss, "Test case 5 failed"
+
+        try:
+            fit_lm(x, y, p0, method='newton')
+            assert False, "Test case 6 failed"
+        except ValueError:
+            pass
+
+        # Data of HW3_JG_2.py: no start drifts to max_iter or a <= 0, and the
+        # converged ones reach the same fit (the others stop in local minima)
+        y = p_true[0] * np.exp(-p_true[1] * (p_true[2] * x + p_true[3]) ** 2) + 0.1 * rng.normal(0, 0.1, size=x.shape)
+        results = [fit_lm(x, y, p0) for p0 in rng.random((50, 4))]
+        assert all(r['reason'] != 'max_iter' and r['params'][1] > 0 for r in results), "Test case 7 failed"
+        losses = [r['loss'] for r in results if r['converged']]
+        assert len(losses) >= 45 and max(losses) <= min(losses) * (1 + 1e-6), "Test case 8 failed"
+        result = fit_lm(x, y, [0.1, -0.5, 0.5, 0.5])
+        assert result['converged'] and result['params'][1] == 0.5, "Test case 9 failed"
+        assert abs(result['loss'] - min(losses)) <= 1e-6 * min(losses), "Test case 10 failed"
+
+        # Gaussian far from the data: zero model and zero gradient
+        for method in ('lm', 'gn'):
+            result = fit_lm(x, y, [0.1, 1.0, 1.0, 50.0], method=method)
+            assert result['reason'] == 'vanishing' and not result['converged'], "Test case 11 failed"
+    finally:
+        Telemetry.configure()
+
+    print("All test cases passed")
+
+if __name__ == "__main__":
+    test_evaluate()
+    test_fit_lm()
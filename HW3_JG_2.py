@@ -1,6 +1,14 @@
 import numpy as np
 import matplotlib.pyplot as plt
 
+from GaussianFit import evaluate, fit_lm, summary
+from Telemetry import telemetry, INFO
+from Profiling import from_argv
+
+# Progress: one record every 1000 epochs (see Telemetry.configure)
+telemetry.limit('init_epoch', every = 1000)
+telemetry.limit('epoch', every = 1000)
+
 # Seed for reproducibility
 np.random.seed()
 
@@ -25,124 +33,119 @@ y_generated = n_true * np.exp(-a_true * (m_true * x_generated + b_true) ** 2) +
 # Display the generated x and y arrays
 x_generated, y_generated
 
-def compute_loss(x, y, n, a, m, b):
-    """
-    Compute the Mean Squared Error (MSE) loss.
-
-    Parameters:
-    x : np.array
-        Input data points (x values).
-    y : np.array
-        Actual output data points (y values).
-    n, a, m, b : float
-        Parameters of the function y = n * exp(-a * (m * x + b)^2).
-
-    Returns:
-    float
-        Mean Squared Error (MSE) loss.
-    """
-    y_int = (m * x + b) ** 2
-    y_pred = n * np.exp(-a * y_int)
-    return np.mean((y - y_pred) ** 2)
-
-
 # Generate data points directly as NumPy arrays (without pandas)
 x_data = x_generated
 y_data = y_generated
 
-def initguess(epochs,learning_rate,eps):
-	previous_loss = 0
-	# Reinitialize parameters (n, a, m, b)
-	n_fit = np.random.rand()
-	a_fit = np.random.rand()
-	m_fit = np.random.rand()
-	b_fit = np.random.rand()
+def initguess_batch(K,epochs,learning_rate,eps):
+	"""
+	Gradient descent from K random starts at once.
+
+	The parameters are the rows (n, a, m, b) of a (K,4) array broadcast
+	against the data (K x N arrays), so all the starts of a restart take one
+	pass. A start stops when its loss changes by less than eps,
+	or grows by more than eps since the previous epoch (the first
+	epoch is compared with the loss at the start). Growing and non-finite
+	losses are diverging starts: they are dropped at once and never chosen.
+	The batch ends as soon as one start is below eps (the acceptance test of
+	the restart loop) or no start is running.
+
+	Returns:
+	n, a, m, b, loss of the start with the lowest loss (loss = inf if all diverged).
+	"""
+	params = np.random.rand(K, 4)
+	# Loss and gradients of every start, one row each (columns of evaluate)
+	result = evaluate(x_data, y_data, *(params[:, k:k+1] for k in range(4)))
+	previous_loss = result[0]
+	grad = np.column_stack(result[1:])
+	loss = previous_loss.copy()
+	dropped = np.zeros(K, dtype=bool)
+	active = np.arange(K)
 
-	# Perform gradient descent for the generated data
 	for epoch in range(epochs):
-		# Forward pass: compute intermediate and final outputs
-		y_int_fit = (m_fit * x_data + b_fit) ** 2
-		y_pred_fit = n_fit * np.exp(-a_fit * y_int_fit)
-		
-		# Compute gradients
-		# Gradients for n and a (output layer)
-		grad_n_fit = 2 * np.mean((y_data - y_pred_fit) * np.exp(-a_fit * y_int_fit))
-		grad_a_fit = 2 * np.mean((y_data - y_pred_fit) * n_fit * np.exp(-a_fit * y_int_fit) * (-y_int_fit))
-		
-		# Gradients for m and b (inner layer)
-		grad_m_fit = 2 * np.mean((y_data - y_pred_fit) * n_fit * np.exp(-a_fit * y_int_fit) * (-a_fit) * (2 * (m_fit * x_data + b_fit) * x_data))
-		grad_b_fit = 2 * np.mean((y_data - y_pred_fit) * n_fit * np.exp(-a_fit * y_int_fit) * (-a_fit) * (2 * (m_fit * x_data + b_fit)))
-		
-		# Update parameters
-		n_fit += learning_rate * grad_n_fit
-		a_fit += learning_rate * grad_a_fit
-		m_fit += learning_rate * grad_m_fit
-		b_fit += learning_rate * grad_b_fit
-		
-		# Compute loss for monitoring
-		loss_fit = compute_loss(x_data, y_data, n_fit, a_fit, m_fit, b_fit)
-		
-		# Print loss every 100 epochs
-		if epoch % 1000 == 0:
-		    print(f"Epoch {epoch}: Init Loss = {loss_fit:.6f}")
-		if (loss_fit - previous_loss) > eps*1:
-			break
-		elif abs(loss_fit - previous_loss) < eps: 
+		# Update the running starts; loss and gradients of the next epoch in one pass
+		params[active] += learning_rate * grad[active]
+		result = evaluate(x_data, y_data, *(params[active, k:k+1] for k in range(4)))
+		loss_fit = result[0]
+		grad[active] = np.column_stack(result[1:])
+		loss[active] = loss_fit
+
+		# Drop the diverging starts, stop the converged ones
+		change = loss_fit - previous_loss[active]
+		diverged = ~np.isfinite(loss_fit) | (change > eps)
+		stopped = diverged | (np.abs(change) < eps)
+		dropped[active[diverged]] = True
+		previous_loss[active] = loss_fit
+		active = active[~stopped]
+
+		telemetry.emit('init_epoch', INFO, epoch = epoch, loss = float(np.min(loss_fit)),
+		               running = int(active.size), dropped = int(dropped.sum()))
+		if active.size == 0 or np.min(loss_fit[~diverged], initial=np.inf) < eps:
 			break
-		previous_loss = loss_fit
-	return n_fit, a_fit, m_fit, b_fit
+
+	loss[dropped] = np.inf
+	best = np.argmin(loss)
+	n_fit, a_fit, m_fit, b_fit = params[best]
+	return n_fit, a_fit, m_fit, b_fit, loss[best]
 
 
 epochs_init = 10000
 learning_rate_init = 0.001
+starts_init = 2048 # random starts evaluated together by every restart
 
 eps = 1e-4
 init_loss = 2*eps
+restarts = 0
 while init_loss > eps:
-	n_fit, a_fit, m_fit, b_fit = initguess(epochs_init,learning_rate_init,eps)
-	init_loss = compute_loss(x_data, y_data, n_fit, a_fit, m_fit, b_fit)
+	n_fit, a_fit, m_fit, b_fit, init_loss = initguess_batch(starts_init,epochs_init,learning_rate_init,eps)
+	restarts += 1
+telemetry.emit('init', INFO, restarts = restarts, starts = restarts * starts_init, loss = init_loss,
+               n = n_fit, a = a_fit, m = m_fit, b = b_fit)
 previous_loss = init_loss
 
 epochs = 10000
 learning_rate = 0.0001
 
-for epoch in range(epochs):
-	# Forward pass: compute intermediate and final outputs
-	y_int_fit = (m_fit * x_data + b_fit) ** 2
-	y_pred_fit = n_fit * np.exp(-a_fit * y_int_fit)
-	
-	# Compute gradients
-	# Gradients for n and a (output layer)
-	grad_n_fit = 2 * np.mean((y_data - y_pred_fit) * np.exp(-a_fit * y_int_fit))
-	grad_a_fit = 2 * np.mean((y_data - y_pred_fit) * n_fit * np.exp(-a_fit * y_int_fit) * (-y_int_fit))
-	
-	# Gradients for m and b (inner layer)
-	grad_m_fit = 2 * np.mean((y_data - y_pred_fit) * n_fit * np.exp(-a_fit * y_int_fit) * (-a_fit) * (2 * (m_fit * x_data + b_fit) * x_data))
-	grad_b_fit = 2 * np.mean((y_data - y_pred_fit) * n_fit * np.exp(-a_fit * y_int_fit) * (-a_fit) * (2 * (m_fit * x_data + b_fit)))
-	
-	# Update parameters
-	n_fit += learning_rate * grad_n_fit
-	a_fit += learning_rate * grad_a_fit
-	m_fit += learning_rate * grad_m_fit
-	b_fit += learning_rate * grad_b_fit
+# Solver refining the initial guess: 'gd' (gradient descent below), 'lm'
+# (Levenberg-Marquardt) or 'gn' (Gauss-Newton), see GaussianFit.fit_lm
+solver = 'gd'
+
+if solver == 'gd':
+	# Forward pass and gradients at the initial guess (GaussianFit.evaluate)
+	loss_fit, grad_n_fit, grad_a_fit, grad_m_fit, grad_b_fit = evaluate(x_data, y_data, n_fit, a_fit, m_fit, b_fit)
+
+	# Profiling of epochs 0 to 1999 with --profile (see Profiling.py)
+	profiler = from_argv('HW3_JG_2', window = (0, 2000))
+	for epoch in range(epochs):
+		profiler.step(epoch)
+		# Update parameters
+		n_fit += learning_rate * grad_n_fit
+		a_fit += learning_rate * grad_a_fit
+		m_fit += learning_rate * grad_m_fit
+		b_fit += learning_rate * grad_b_fit
 	
-	# Compute loss for monitoring
-	loss_fit = compute_loss(x_data, y_data, n_fit, a_fit, m_fit, b_fit)
+		# Loss for monitoring and gradients of the next epoch, in one pass
+		loss_fit, grad_n_fit, grad_a_fit, grad_m_fit, grad_b_fit = evaluate(x_data, y_data, n_fit, a_fit, m_fit, b_fit)
 	
-	# Print loss every 100 epochs
-	if epoch % 1000 == 0:
-	    print(f"Epoch {epoch}: Loss = {loss_fit:.6f}; nfit = {n_fit}, afit = {a_fit}, mfit = {m_fit}, bfit = {b_fit}")
+		telemetry.emit('epoch', INFO, epoch = epoch, loss = loss_fit, learning_rate = learning_rate,
+		               n = n_fit, a = a_fit, m = m_fit, b = b_fit)
 
-	if loss_fit > previous_loss:  # If the loss increases, reduce the learning rate
-		learning_rate *= 0.5
-	elif abs(loss_fit - previous_loss) < 1e-4:  # If the improvement is small, increase slightly
-		learning_rate *= 1.1
-	previous_loss = loss_fit
+		if loss_fit > previous_loss:  # If the loss increases, reduce the learning rate
+			learning_rate *= 0.5
+		elif abs(loss_fit - previous_loss) < 1e-4:  # If the improvement is small, increase slightly
+			learning_rate *= 1.1
+		previous_loss = loss_fit
+	profiler.finish()
+else:
+	result = fit_lm(x_data, y_data, [n_fit, a_fit, m_fit, b_fit], method = solver)
+	print(summary(result))
+	n_fit, a_fit, m_fit, b_fit = result['params']
+	loss_fit = result['loss']
 
 
 # Final fitted parameter values
 n_fit, a_fit, m_fit, b_fit
-print(f'nfit = {n_fit}, afit = {a_fit}, mfit = {m_fit}, bfit = {b_fit}')
+telemetry.emit('fit', INFO, loss = loss_fit, n = n_fit, a = a_fit, m = m_fit, b = b_fit)
 
 # Predicted y values using the fitted parameters
 y_predicted = n_fit * np.exp(-a_fit * (m_fit * x_generated + b_fit) ** 2)
@@ -1,6 +1,13 @@
 import numpy as np
 import matplotlib.pyplot as plt
 
+from GaussianFit import evaluate, fit_lm, summary
+from Telemetry import telemetry, INFO
+from Profiling import from_argv
+
+# Progress: one record every 1000 epochs (see Telemetry.configure)
+telemetry.limit('epoch', every = 1000)
+
 # Seed for reproducibility
 np.random.seed(42)
 
@@ -20,26 +27,6 @@ y_generated = n_true * np.exp(-a_true * (m_true * x_generated + b_true) ** 2) +
 # Display the generated x and y arrays
 x_generated, y_generated
 
-def compute_loss(x, y, n, a, m, b):
-    """
-    Compute the Mean Squared Error (MSE) loss.
-
-    Parameters:
-    x : np.array
-        Input data points (x values).
-    y : np.array
-        Actual output data points (y values).
-    n, a, m, b : float
-        Parameters of the function y = n * exp(-a * (m * x + b)^2).
-
-    Returns:
-    float
-        Mean Squared Error (MSE) loss.
-    """
-    y_int = (m * x + b) ** 2
-    y_pred = n * np.exp(-a * y_int)
-    return np.mean((y - y_pred) ** 2)
-
 # Generate data points directly as NumPy arrays (without pandas)
 x_data = x_generated
 y_data = y_generated
@@ -53,33 +40,38 @@ b_fit = np.random.rand()
 epochs = 10000
 learning_rate = 1.e0
 
-# Perform gradient descent for the generated data
-for epoch in range(epochs):
-    # Forward pass: compute intermediate and final outputs
-    y_int_fit = (m_fit * x_data + b_fit) ** 2
-    y_pred_fit = n_fit * np.exp(-a_fit * y_int_fit)
-
-    # Compute gradients
-    # Gradients for n and a (output layer)
-    grad_n_fit = 2 * np.mean((y_data - y_pred_fit) * np.exp(-a_fit * y_int_fit))
-    grad_a_fit = 2 * np.mean((y_data - y_pred_fit) * n_fit * np.exp(-a_fit * y_int_fit) * (-y_int_fit))
-
-    # Gradients for m and b (inner layer)
-    grad_m_fit = 2 * np.mean((y_data - y_pred_fit) * n_fit * np.exp(-a_fit * y_int_fit) * (-a_fit) * (2 * (m_fit * x_data + b_fit) * x_data))
-    grad_b_fit = 2 * np.mean((y_data - y_pred_fit) * n_fit * np.exp(-a_fit * y_int_fit) * (-a_fit) * (2 * (m_fit * x_data + b_fit)))
-
-    # Update parameters
-    n_fit += learning_rate * grad_n_fit
-    a_fit += learning_rate * grad_a_fit
-    m_fit += learning_rate * grad_m_fit
-    b_fit += learning_rate * grad_b_fit
-
-    # Compute loss for monitoring
-    loss_fit = compute_loss(x_data, y_data, n_fit, a_fit, m_fit, b_fit)
-
-    # Print loss every 100 epochs
-    if epoch % 1000 == 0:
-        print(f"Epoch {epoch}: Loss = {loss_fit:.6f}")
+# Solver: 'gd' (gradient descent below), 'lm' (Levenberg-Marquardt) or
+# 'gn' (Gauss-Newton), see GaussianFit.fit_lm
+solver = 'gd'
+
+if solver == 'gd':
+    # Perform gradient descent for the generated data
+    # Forward pass and gradients at the initial parameters (GaussianFit.evaluate)
+    loss_fit, grad_n_fit, grad_a_fit, grad_m_fit, grad_b_fit = evaluate(x_data, y_data, n_fit, a_fit, m_fit, b_fit)
+
+    # Profiling of epochs 0 to 1999 with --profile (see Profiling.py)
+    profiler = from_argv('HW3_JG_nln', window = (0, 2000))
+    for epoch in range(epochs):
+        profiler.step(epoch)
+        # Update parameters
+        n_fit += learning_rate * grad_n_fit
+        a_fit += learning_rate * grad_a_fit
+        m_fit += learning_rate * grad_m_fit
+        b_fit += learning_rate * grad_b_fit
+
+        # Loss for monitoring and gradients of the next epoch, in one pass
+        loss_fit, grad_n_fit, grad_a_fit, grad_m_fit, grad_b_fit = evaluate(x_data, y_data, n_fit, a_fit, m_fit, b_fit)
+
+        telemetry.emit('epoch', INFO, epoch = epoch, loss = loss_fit)
+    profiler.finish()
+    fit_label = f'LR = {learning_rate}, Ep = {epochs}'
+else:
+    # Least-squares fit from the same initial parameters
+    result = fit_lm(x_data, y_data, [n_fit, a_fit, m_fit, b_fit], method = solver)
+    print(summary(result))
+    n_fit, a_fit, m_fit, b_fit = result['params']
+    loss_fit = result['loss']
+    fit_label = f"{solver.upper()}, {result['iterations']} iterations"
 
 # Final fitted parameter values
 n_fit, a_fit, m_fit, b_fit
@@ -91,7 +83,7 @@ y_predicted = n_fit * np.exp(-a_fit * (m_fit * x_generated + b_fit) ** 2)
 plt.scatter(x_generated, y_generated, color='blue', label='Training Data (Noisy)', marker='o')
 
 # Plot the predicted data
-plt.plot(x_generated, y_predicted, color='red', label=f'Predicted Data (Model, LR = {learning_rate}, Ep = {epochs})', linestyle='--')
+plt.plot(x_generated, y_predicted, color='red', label=f'Predicted Data (Model, {fit_label})', linestyle='--')
 
 # Add labels, title, and legend
 plt.xlabel("x")
@@ -0,0 +1,251 @@
+"""
+Implicit-explicit (IMEX) time integration of the 2D beam and the DER rod.
+
+The stretching stiffness EA is orders of magnitude above EI and GJ, so the
+stretching modes are the ones that limit an explicit step. Here stretching
+(and the diagonal viscous damping) is integrated implicitly and bending,
+twisting and the external load explicitly:
+
+    M (q1 - q0 - dt u0) / dt^2 = Fs(q1) - C (q1 - q0) / dt + G(q0),
+
+with G = Fb + Ft + Fext and u1 = (q1 - q0) / dt. Stretching only couples
+neighbouring nodes, so the Newton matrix M / dt^2 + C / dt - dFs/dq of the
+node positions is banded (bandwidth 2 * dim - 1) and each iteration is a
+banded solve that costs O(nv). Twist angles have no stretching and are
+advanced with the explicit (symplectic Euler) update. The step is limited
+only by the bending/twisting frequencies, see critical_time_step_imex.
+"""
+
+import numpy as np
+import scipy.linalg
+
+from Explicit import critical_time_step, sub_steps, is_unstable
+
+def critical_time_step_imex(m_node, EI, refLen, voronoiRefLen,
+                            GJ=0.0, twistInertia=None, safety=0.9):
+    """
+    Stable step of the IMEX scheme: the explicit estimate of
+    Explicit.critical_time_step without the (implicit) stretching.
+    """
+    return critical_time_step(m_node, 0.0, EI, refLen, voronoiRefLen,
+                              GJ, twistInertia, safety)
+
+def positionIndex(ndof, stride):
+    """Indices of the node positions in a planar (stride 2) or DER (stride 4) DOF vector."""
+    if stride == 2:
+        return np.arange(ndof)
+    return np.delete(np.arange(ndof), np.arange(3, ndof, 4))
+
+def stretching_banded(x, refLen, EA):
+    """
+    Stretching force and Hessian of the node positions x (nv, dim).
+
+    Returns:
+    Fs : np.ndarray
+        Stretching force (minus the gradient), shape (nv*dim,).
+    ab : np.ndarray
+        Hessian of the stretching energy in the banded storage of
+        scipy.linalg.solve_banded with l = u = 2*dim - 1, i.e.
+        ab[u + i - j, j] = H[i, j].
+    """
+    nv, dim = x.shape
+    edge = np.diff(x, axis=0) # (ne,dim)
+    edgeLen = np.sqrt(np.sum(edge**2, axis=1))
+
+    ## Force
+    dF_unit = (EA * (edgeLen / refLen - 1) / edgeLen)[:, None] * edge
+    Fs = np.zeros((nv, dim))
+    Fs[:-1] += dF_unit
+    Fs[1:] -= dF_unit
+
+    ## Hessian: blocks [[M, -M], [-M, M]] of every edge
+    M = (EA / edgeLen**3)[:, None, None] * edge[:, :, None] * edge[:, None, :]
+    M[:, range(dim), range(dim)] += (EA * (1 / refLen - 1 / edgeLen))[:, None]
+
+    u = 2 * dim - 1
+    ab = np.zeros((2 * u + 1, nv * dim))
+    col = dim * np.arange(nv - 1) # first DOF of node k
+    for i in range(dim):
+        for j in range(dim):
+            ab[u + i - j, col + j] += M[:, i, j] # (k, k)
+            ab[u + i - j, col + dim + j] += M[:, i, j] # (k+1, k+1)
+            ab[u + i - j - dim, col + dim + j] -= M[:, i, j] # (k, k+1)
+            ab[u + i - j + dim, col + j] -= M[:, i, j] # (k+1, k)
+
+    return Fs.ravel(), ab
+
+def _fix_banded(ab, fixed):
+    # Replace the rows and columns of the fixed DOFs by those of the identity
+    u = (ab.shape[0] - 1) // 2
+    n = ab.shape[1]
+    ab[:, fixed] = 0
+    for r in range(-u, u + 1):
+        c = fixed + r
+        c = c[(c >= 0) & (c < n)]
+        ab[u - r, c] = 0
+    ab[u, fixed] = 1
+    return ab
+
+def imex_step(q, u, dt, force, m, c, EA, refLen, free_index,
+              tol, maximum_iter, stride=2):
+    """
+    One IMEX step (implicit stretching and damping, explicit bending/twisting).
+
+    Parameters:
+    q, u : np.ndarray
+        DOFs and velocities at the start of the step.
+    dt : float
+        Step size, below critical_time_step_imex.
+    force : callable
+        force(q) returns every force except stretching and damping (bending,
+        twisting, external load), e.g. Explicit.PlanarForce or
+        Explicit.DERForce built with EA = 0.
+    m : np.ndarray
+        Mass of every DOF.
+    c : np.ndarray or float
+        Viscous damping coefficient of every DOF.
+    EA : float
+        Stretching stiffness.
+    refLen : np.ndarray or float
+        Reference length of every edge.
+    free_index : np.ndarray
+        Free DOFs; the others keep their values.
+    tol : float
+        Tolerance on the norm of the implicit (position) residual.
+    maximum_iter : int
+        Maximum number of Newton iterations.
+    stride : int
+        2 for planar DOF vectors, 4 for DER DOF vectors.
+
+    Returns:
+    q_new, u_new : np.ndarray
+        DOFs and velocities at the end of the step.
+    flag : int
+        1 on success, -1 if maximum_iter was exceeded.
+    iter_count : int
+        Number of Newton iterations.
+    """
+    ndof = len(q)
+    c = np.broadcast_to(c, q.shape)
+    free = np.zeros(ndof, dtype=bool)
+    free[free_index] = True
+    G = force(q)
+
+    q_new = q.copy()
+    u_new = np.zeros_like(u)
+
+    # Twist angles (DER): explicit update, damping taken at the new velocity
+    if stride == 4:
+        t = np.arange(3, ndof, 4)
+        t = t[free[t]]
+        u_new[t] = (u[t] + dt * G[t] / m[t]) / (1 + dt * c[t] / m[t])
+        q_new[t] = q[t] + dt * u_new[t]
+
+    # Node positions: Newton on the banded stretching system
+    pos = positionIndex(ndof, stride)
+    dim = 2 if stride == 2 else 3
+    fixed = np.flatnonzero(~free[pos])
+    qp, up, mp, cp, Gp = q[pos], u[pos], m[pos], c[pos], G[pos]
+
+    x = qp + dt * up * free[pos] # predictor
+    bw = 2 * dim - 1
+    iter_count = 0
+    flag = 1
+    while True:
+        Fs, ab = stretching_banded(x.reshape(-1, dim), refLen, EA)
+        f = mp * (x - qp - dt * up) / dt**2 + cp * (x - qp) / dt - Fs - Gp
+        f[fixed] = 0
+        if np.linalg.norm(f) <= tol:
+            break
+        if iter_count >= maximum_iter:
+            flag = -1
+            break
+
+        ab[bw] += mp / dt**2 + cp / dt
+        x = x - scipy.linalg.solve_banded((bw, bw), _fix_banded(ab, fixed), f,
+                                          overwrite_ab=True, check_finite=False)
+        iter_count += 1
+
+    q_new[pos] = x
+    u_new[pos] = (x - qp) / dt
+    return q_new, u_new, flag, iter_count
+
+def simulate_imex(q0, u0, dt, Nsteps, force, m, c, EA, refLen, free_index,
+                  tol, maximum_iter, stride=2, dt_crit=None, monitor_dof=None):
+    """
+    IMEX time integration over Nsteps output steps of size dt.
+
+    If dt_crit is given (see critical_time_step_imex) every output step is
+    split into sub_steps(dt, dt_crit) IMEX steps. The run stops when Newton
+    fails or the state blows up (Explicit.is_unstable).
+
+    Returns:
+    q, u : np.ndarray
+        Final DOFs and velocities.
+    history : np.ndarray
+        Value of monitor_dof at every output step, shape (Nsteps,).
+    flag : int
+        1 on success, -1 on failure.
+    """
+    nsub = 1 if dt_crit is None else sub_steps(dt, dt_crit)
+    h = dt / nsub
+    q = q0.copy()
+    u = u0.copy()
+    history = np.zeros(Nsteps)
+    flag = 1
+
+    for timeStep in range(Nsteps):
+        for sub in range(nsub):
+            q_new, u_new, flag, iter_count = imex_step(q, u, h, force, m, c, EA, refLen,
+                                                       free_index, tol, maximum_iter, stride)
+            if flag < 0 or is_unstable(q_new, refLen, stride):
+                print(f'IMEX integration failed at t={timeStep * dt + (sub + 1) * h:.6f}. Sorry')
+                return q, u, history, -1
+            q, u = q_new, u_new
+
+        if monitor_dof is not None:
+            history[timeStep] = q[monitor_dof]
+
+    return q, u, history, flag
+
+def test_stretching_banded():
+    """
+    This function checks the banded stretching Hessian against the dense
+    Jacobian of DER.getFs_planar (2D) and DER.getFs (3D).
+    """
+    from DER import getFs, getFs_planar
+
+    rng = np.random.default_rng(2)
+    nv = 6
+    refLen = rng.uniform(0.08, 0.12, nv - 1)
+
+    # Planar
+    q = np.zeros(2 * nv)
+    q[0::2] = np.arange(nv) * 0.1
+    q += 0.01 * rng.standard_normal(2 * nv)
+    Fs, ab = stretching_banded(q.reshape(-1, 2), refLen, 7.0)
+    F_ref, J_ref = getFs_planar(q, 7.0, refLen)
+    H = np.zeros((2 * nv, 2 * nv))
+    for j in range(2 * nv):
+        for i in range(max(0, j - 3), min(2 * nv, j + 4)):
+            H[i, j] = ab[3 + i - j, j]
+    assert np.allclose(Fs, F_ref) and np.allclose(H, -J_ref), "Test case 1 failed"
+
+    # DER (twist DOFs carry no stretching)
+    q3 = np.zeros(4 * nv - 1)
+    q3[positionIndex(4 * nv - 1, 4)] = np.column_stack((q.reshape(-1, 2),
+                                                        0.01 * rng.standard_normal(nv))).ravel()
+    Fs, ab = stretching_banded(q3[positionIndex(4 * nv - 1, 4)].reshape(-1, 3), refLen, 7.0)
+    F_ref, J_ref = getFs(q3, 7.0, refLen)
+    pos = positionIndex(4 * nv - 1, 4)
+    H = np.zeros((3 * nv, 3 * nv))
+    for j in range(3 * nv):
+        for i in range(max(0, j - 5), min(3 * nv, j + 6)):
+            H[i, j] = ab[5 + i - j, j]
+    assert np.allclose(Fs, F_ref[pos]) and np.allclose(H, -J_ref[np.ix_(pos, pos)]), \
+        "Test case 2 failed"
+
+    print("All test cases passed")
+
+if __name__ == "__main__":
+    test_stretching_banded()
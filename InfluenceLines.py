@@ -0,0 +1,256 @@
+"""
+Factor-once, solve-many analysis of the 2D beam in the linear regime.
+
+For small deflections the response of the beam in SimplySupportLoaded.py to a
+point load is linear, so the stiffness of the reference configuration is
+assembled and factorized once and every load case (load position and
+magnitude) becomes one column of a block right-hand side that is solved with
+a single batched triangular solve. Cases whose linear solution rotates the
+edges too much for the small-rotation assumption are flagged and can be
+corrected with the nonlinear static solver of Continuation.py.
+"""
+
+import numpy as np
+import scipy.linalg
+
+from Continuation import static_residual, solve_static
+
+def factorize_stiffness(q_ref, EI, EA, deltaL, free_index):
+    """
+    Assemble and factorize the free-free stiffness at the reference configuration.
+
+    Parameters:
+    q_ref : np.ndarray
+        Reference (undeformed) DOF vector.
+    EI, EA, deltaL : float
+        Stiffness and discretization parameters.
+    free_index : np.ndarray
+        Free DOFs.
+
+    Returns:
+    factor : tuple
+        ('cho', c_and_lower) if the stiffness is positive definite, otherwise
+        ('lu', lu_and_piv). Pass it to solve_factorized.
+    """
+    zero = np.zeros_like(q_ref)
+    f, K = static_residual(q_ref, 0.0, zero, zero, EI, EA, deltaL)
+    return factorize(K[np.ix_(free_index, free_index)])
+
+def factorize(K):
+    """
+    Factorize a square matrix for repeated solves with solve_factorized.
+    Cholesky is used when K is positive definite, LU otherwise.
+    """
+    try:
+        return 'cho', scipy.linalg.cho_factor(K)
+    except np.linalg.LinAlgError:
+        return 'lu', scipy.linalg.lu_factor(K)
+
+def solve_factorized(factor, B):
+    """
+    Solve K X = B for a block of right-hand sides using the factors of K.
+    """
+    kind, data = factor
+    if kind == 'cho':
+        return scipy.linalg.cho_solve(data, B)
+    return scipy.linalg.lu_solve(data, B)
+
+def point_load_cases(ndof, load_index, magnitudes, direction=1):
+    """
+    Build the block of load vectors, one column per load case.
+
+    Parameters:
+    ndof : int
+        Number of DOFs.
+    load_index : array-like
+        Node index of the point load for every case.
+    magnitudes : array-like or float
+        Load magnitude [N] for every case (broadcast against load_index).
+    direction : int
+        0 for a load along x, 1 for a load along y.
+
+    Returns:
+    B : np.ndarray
+        Load vectors, shape (ndof, ncases).
+    """
+    load_index, magnitudes = np.broadcast_arrays(np.asarray(load_index),
+                                                 np.asarray(magnitudes, dtype=float))
+    ncases = load_index.size
+    B = np.zeros((ndof, ncases))
+    B[2 * load_index.ravel() + direction, np.arange(ncases)] = magnitudes.ravel()
+    return B
+
+def edge_rotations(q_ref, Q):
+    """
+    Rotation of every edge between the reference configuration and each column of Q.
+
+    Parameters:
+    q_ref : np.ndarray
+        Reference DOF vector, shape (ndof,).
+    Q : np.ndarray
+        Deformed DOF vectors, shape (ndof, ncases).
+
+    Returns:
+    rot : np.ndarray
+        Signed edge rotations [rad], shape (ne, ncases).
+    """
+    e0 = np.diff(q_ref.reshape(-1, 2), axis=0) # (ne, 2)
+    e = np.diff(Q.reshape(-1, 2, Q.shape[1]), axis=0) # (ne, 2, ncases)
+    cross = e0[:, 0, None] * e[:, 1, :] - e0[:, 1, None] * e[:, 0, :]
+    dot = e0[:, 0, None] * e[:, 0, :] + e0[:, 1, None] * e[:, 1, :]
+    return np.arctan2(cross, dot)
+
+def solve_load_cases(q_ref, B, F0, EI, EA, deltaL, free_index,
+                     factor=None, rot_tol=0.05):
+    """
+    Linear response of the beam to a block of load cases.
+
+    Parameters:
+    q_ref : np.ndarray
+        Reference (undeformed) DOF vector.
+    B : np.ndarray
+        Load vectors, shape (ndof, ncases).
+    F0 : np.ndarray
+        Load common to all cases (e.g. gravity), shape (ndof,).
+    EI, EA, deltaL : float
+        Stiffness and discretization parameters.
+    free_index : np.ndarray
+        Free DOFs.
+    factor : tuple
+        Factors from factorize_stiffness. Computed here if not given, so a
+        caller solving several blocks should factorize once and pass it in.
+    rot_tol : float
+        Largest edge rotation [rad] for which the small-rotation (linear)
+        solution is trusted.
+
+    Returns:
+    Q : np.ndarray
+        Linear DOF vectors q_ref + U for every case, shape (ndof, ncases).
+    needs_nonlinear : np.ndarray
+        Boolean flag per case; True if the linear solution exceeds rot_tol.
+    """
+    if factor is None:
+        factor = factorize_stiffness(q_ref, EI, EA, deltaL, free_index)
+
+    # Out-of-balance force of the reference configuration shared by all cases
+    f_ref, K = static_residual(q_ref, 0.0, np.zeros_like(q_ref), F0, EI, EA, deltaL)
+
+    # K U = -(f_ref - B) for all columns at once
+    rhs = B[free_index, :] - f_ref[free_index, None]
+    Q = np.repeat(q_ref[:, None], B.shape[1], axis=1)
+    Q[free_index, :] += solve_factorized(factor, rhs)
+
+    needs_nonlinear = np.max(np.abs(edge_rotations(q_ref, Q)), axis=0) > rot_tol
+
+    return Q, needs_nonlinear
+
+def nonlinear_correction(Q, needs_nonlinear, B, F0, EI, EA, deltaL, free_index,
+                         tol=None, maximum_iter=25):
+    """
+    Replace the flagged linear solutions by the nonlinear static equilibrium.
+
+    Each flagged case is solved with Newton's method warm started from its
+    linear solution. Cases that do not converge are marked in the returned
+    flag array and left at their linear solution.
+
+    Returns:
+    Q : np.ndarray
+        Corrected DOF vectors, shape (ndof, ncases).
+    converged : np.ndarray
+        Boolean flag per case (always True for cases that were not flagged).
+    """
+    Q = Q.copy()
+    converged = np.ones(Q.shape[1], dtype=bool)
+    for i in np.flatnonzero(needs_nonlinear):
+        P_i = B[:, i]
+        tol_i = tol
+        if tol_i is None:
+            tol_i = 1e-8 * max(np.linalg.norm((F0 + P_i)[free_index]), 1.0)
+        q_i, iter_count, converged[i] = solve_static(Q[:, i], 1.0, P_i, F0, EI, EA, deltaL,
+                                                     free_index, tol_i, maximum_iter)
+        if converged[i]:
+            Q[:, i] = q_i
+
+    return Q, converged
+
+def test_influence_lines():
+    """
+    This function checks the batched solve against one np.linalg.solve per
+    load case, the LU fallback of factorize on an indefinite matrix, the
+    rot_tol flag (small loads pass, large ones are flagged) and that the
+    corrected cases are the equilibria of solve_static.
+    """
+    from SimplySupportLoaded import q0, EI, EA, deltaL, free_index, ndof
+
+    F0 = np.zeros(ndof)
+    B = point_load_cases(ndof, [10, 25, 40, 10, 25, 40], [-1.0, -1.0, -10.0, -1000.0, -1000.0, -20000.0])
+    small = np.array([True, True, True, False, False, False])
+
+    # Batched triangular solves against one dense solve per case
+    zero = np.zeros(ndof)
+    K = static_residual(q0, 0.0, zero, zero, EI, EA, deltaL)[1][np.ix_(free_index, free_index)]
+    factor = factorize_stiffness(q0, EI, EA, deltaL, free_index)
+    assert factor[0] == 'cho', "Test case 1 failed"
+    X = solve_factorized(factor, B[free_index, :])
+    for i in range(B.shape[1]):
+        assert np.allclose(X[:, i], np.linalg.solve(K, B[free_index, i]), rtol=1e-9, atol=0), "Test case 2 failed"
+
+    # Indefinite matrix (one negative diagonal entry): Cholesky fails, LU solves
+    A = K.copy()
+    A[0, 0] = -A[0, 0]
+    factor_lu = factorize(A)
+    assert factor_lu[0] == 'lu', "Test case 3 failed"
+    X = solve_factorized(factor_lu, B[free_index, :])
+    assert np.allclose(X, np.linalg.solve(A, B[free_index, :]), rtol=1e-9, atol=0), "Test case 4 failed"
+
+    Q, needs_nonlinear = solve_load_cases(q0, B, F0, EI, EA, deltaL, free_index, factor=factor)
+    assert np.array_equal(needs_nonlinear, ~small), "Test case 5 failed"
+    Q_default, flags_default = solve_load_cases(q0, B, F0, EI, EA, deltaL, free_index)
+    assert np.allclose(Q_default, Q) and np.array_equal(flags_default, needs_nonlinear), "Test case 6 failed"
+    assert np.all(solve_load_cases(q0, B, F0, EI, EA, deltaL, free_index, factor=factor, rot_tol=np.pi)[1] == False), \
+        "Test case 7 failed"
+
+    Q_corrected, converged = nonlinear_correction(Q, needs_nonlinear, B, F0, EI, EA, deltaL, free_index)
+    assert np.all(converged), "Test case 8 failed"
+    assert np.array_equal(Q_corrected[:, small], Q[:, small]), "Test case 9 failed"
+    for i in range(B.shape[1]):
+        tol = 1e-8 * max(np.linalg.norm(B[free_index, i]), 1.0)
+        q_ref, iterations, ok = solve_static(q0, 1.0, B[:, i], F0, EI, EA, deltaL, free_index, tol, 100)
+        deflection = np.max(np.abs(q_ref - q0))
+        if small[i]: # linear solution, error of the order of the rotation
+            assert np.max(np.abs(Q[:, i] - q_ref)) < 1e-2 * deflection, "Test case 10 failed"
+        else:
+            assert ok and np.max(np.abs(Q_corrected[:, i] - q_ref)) < 1e-6 * deflection, "Test case 11 failed"
+    print("All test cases passed")
+
+if __name__ == "__main__":
+    test_influence_lines()
+
+    import matplotlib.pyplot as plt
+
+    from SimplySupportLoaded import q0, EI, EA, deltaL, free_index, ndof, nv, midNode
+
+    F0 = np.zeros(ndof) # Influence lines are for the point load alone
+    dof = 2 * midNode - 1 # Vertical DOF of the mid node
+
+    # Unit and design loads at every interior node
+    load_nodes = np.arange(1, nv - 1)
+    magnitudes = np.array([-1.0, -1000.0, -20000.0])
+    nodes_grid, mag_grid = np.meshgrid(load_nodes, magnitudes)
+    B = point_load_cases(ndof, nodes_grid.ravel(), mag_grid.ravel())
+
+    factor = factorize_stiffness(q0, EI, EA, deltaL, free_index)
+    Q, needs_nonlinear = solve_load_cases(q0, B, F0, EI, EA, deltaL, free_index, factor=factor)
+    print(f'{B.shape[1]} load cases, {np.sum(needs_nonlinear)} need a nonlinear correction')
+
+    Q, converged = nonlinear_correction(Q, needs_nonlinear, B, F0, EI, EA, deltaL, free_index)
+
+    deflection = (Q[dof, :] - q0[dof]).reshape(mag_grid.shape)
+
+    plt.figure(1)
+    x_load = load_nodes * deltaL
+    plt.plot(x_load, deflection[0, :], 'ko-')
+    plt.xlabel('Load position, x [m]')
+    plt.ylabel('Mid-node deflection per unit load [m/N]')
+    plt.savefig('influenceLine.png')
+    plt.show()
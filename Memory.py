@@ -0,0 +1,261 @@
+"""
+Memory instrumentation of the Newton solvers and memory prediction of runs.
+
+The Jacobians of the solvers are dense ndof x ndof arrays, so the memory of a
+run grows with nv**2. MemoryStats is a drop-in replacement of
+Timing.SolverStats (objfun(..., stats = MemoryStats()) in DER.py and
+Beam2D.py) that records, with tracemalloc, the allocation high-water of every
+phase of the Newton loop above the memory at its start, the high-water and
+the peak RSS of the process after every step, and a snapshot of the live
+allocations at the end of one phase (by default 'eom', where all the Jacobians
+of an iteration are alive) whose biggest sites are listed by top_allocations:
+
+    stats = MemoryStats()
+    for timeStep in range(Nsteps):
+        q, u, a1, a2 = objfun(..., stats = stats)
+    print(stats.summary())
+    stats.stop()
+
+tracemalloc slows the allocations down, so use it for a few steps, not for
+production runs. predictMemory gives the memory of a run before it starts,
+e.g. to size a job:
+
+    python Memory.py --predict 1000 --engine der
+"""
+
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+
+try:
+    import resource
+except ImportError: # not on Windows
+    resource = None
+
+# Dense ndof x ndof float64 arrays alive at the peak of a Newton iteration.
+# Measured with tracemalloc on one objfun call, (peak - base) / (8 ndof^2) at
+# nv = 60, 120, 240: der 7.28, 7.06, 7.01; beam 6.24, 6.06, 6.03; spheres
+# 5.06, 4.14, 4.07 (the rest is O(ndof)). The mass and damping are vectors
+# (ModelSetup.py) and add no dense array:
+#   der      DER.objfun: Jb, Jt, Js, their partial sums, the scaled term and
+#            the result of scheme.jacobian, and J_free
+#   beam     Beam2D.objfun (SimplySupportLoaded.py): Jb, Js, their sum, the
+#            terms of scheme.jacobian, and J_free
+#   spheres  objfun of FallingSpheres3.py / FallingSpheres_General.py: Jb, Js,
+#            their sum and J
+DENSE_MATRICES = {'der': 7, 'beam': 6, 'spheres': 4}
+
+def numberOfDOF(nv, engine='der'):
+    """Degrees of freedom of a rod with nv nodes: 4 nv - 1 for DER, 2 nv for the 2D engines."""
+    return 4 * nv - 1 if engine == 'der' else 2 * nv
+
+def peakRSS():
+    """Peak resident set size of the process [bytes] (0 if unknown)."""
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else 1024 * rss # kilobytes on Linux
+
+def physicalMemory():
+    """Physical memory of the machine [bytes] (0 if unknown)."""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+def predictMemory(nv, engine='der', Nsteps=0, base=None):
+    """
+    Predicted peak memory [bytes] of a run with nv nodes.
+
+    Parameters:
+    nv : int
+        Number of nodes.
+    engine : str
+        'der', 'beam' or 'spheres' (see DENSE_MATRICES).
+    Nsteps : int
+        Number of time steps (history arrays of the scripts, a few floats per step).
+    base : float
+        Memory of the process before the model is built (the current peak RSS
+        by default, i.e. the interpreter with numpy and the other imports).
+
+    Returns:
+    dict with ndof, dense (the Jacobians), vectors (O(ndof) arrays and the
+    history), base and total, all in bytes.
+    """
+    ndof = numberOfDOF(nv, engine)
+    dense = 8 * DENSE_MATRICES[engine] * ndof**2
+    vectors = 8 * (50 * ndof + 4 * Nsteps)
+    base = peakRSS() if base is None else base
+    return {'nv': nv, 'engine': engine, 'ndof': ndof, 'dense': dense, 'vectors': vectors,
+            'base': base, 'total': dense + vectors + base}
+
+class MemoryStats:
+    """
+    Allocation high-water of the solver phases, per-step memory and the
+    biggest allocation sites, with the interface of Timing.SolverStats.
+
+    Parameters:
+    top : int
+        Number of allocation sites listed by summary().
+    snapshot_phase : str
+        Phase at whose end the snapshot of the live allocations is taken.
+    snapshot_every : int
+        Take the snapshot every snapshot_every steps (0: only in the first step).
+
+    Attributes:
+    peak : dict
+        Largest allocation high-water [bytes] of every phase above the memory
+        at its start.
+    calls : dict
+        Number of calls of every phase.
+    step_peak : list
+        Traced memory high-water [bytes] of every step.
+    rss : list
+        Peak RSS of the process [bytes] after every step.
+    newton_iterations : list
+        Newton iterations of every step.
+    """
+
+    def __init__(self, top=10, snapshot_phase='eom', snapshot_every=0):
+        self.top = top
+        self.snapshot_phase = snapshot_phase
+        self.snapshot_every = snapshot_every
+        self.started = not tracemalloc.is_tracing()
+        if self.started:
+            tracemalloc.start()
+        self.reset()
+
+    def reset(self):
+        self.peak = {}
+        self.calls = {}
+        self.step_peak = []
+        self.rss = []
+        self.newton_iterations = []
+        self.snapshot = None
+        self._step_peak = 0
+
+    def stop(self):
+        """Stop tracemalloc (if this object started it)."""
+        if self.started and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.started = False
+
+    def tic(self):
+        tracemalloc.reset_peak()
+        return tracemalloc.get_traced_memory()[0]
+
+    def toc(self, phase, t0):
+        """Record the high-water of phase above t0 (from tic) and return the current traced memory."""
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak[phase] = max(self.peak.get(phase, 0), peak - t0)
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+        self._step_peak = max(self._step_peak, peak)
+        if phase == self.snapshot_phase and self._snapshot_due():
+            self.snapshot = tracemalloc.take_snapshot()
+            self._snapshot_step = self.steps
+        tracemalloc.reset_peak()
+        return current
+
+    def _snapshot_due(self):
+        if self.snapshot is None:
+            return True
+        return (self.snapshot_every > 0 and self.steps != self._snapshot_step
+                and self.steps % self.snapshot_every == 0)
+
+    def end_step(self, iterations):
+        """Record the Newton iterations, the traced high-water and the peak RSS of a step."""
+        self.newton_iterations.append(iterations)
+        self.step_peak.append(self._step_peak)
+        self.rss.append(peakRSS())
+        self._step_peak = 0
+
+    @property
+    def steps(self):
+        return len(self.newton_iterations)
+
+    def top_allocations(self, n=None):
+        """Biggest allocation sites of the snapshot: list of dicts with site, size [bytes] and count."""
+        if self.snapshot is None:
+            return []
+        statistics = self.snapshot.statistics('lineno')[:n or self.top]
+        return [{'site': f'{s.traceback[0].filename}:{s.traceback[0].lineno}',
+                 'size': s.size, 'count': s.count} for s in statistics]
+
+    def as_dict(self):
+        """Phases (high-water, calls), per-step memory, peak RSS and allocation sites."""
+        return {
+            'phases': {phase: {'peak': p, 'calls': self.calls[phase]} for phase, p in self.peak.items()},
+            'steps': self.steps,
+            'step_peak': list(self.step_peak),
+            'max_step_peak': max(self.step_peak, default=0),
+            'peak_rss': max(self.rss, default=peakRSS()),
+            'top_allocations': self.top_allocations(),
+        }
+
+    def summary(self):
+        """Table of the phases sorted by high-water and the biggest allocation sites."""
+        d = self.as_dict()
+        lines = [f"{d['steps']} steps, traced high-water {d['max_step_peak'] / 1e6:.2f} MB, "
+                 f"peak RSS {d['peak_rss'] / 1e6:.1f} MB",
+                 f"{'phase':<22}{'high-water [MB]':>16}{'calls':>9}"]
+        for phase, p in sorted(d['phases'].items(), key=lambda item: -item[1]['peak']):
+            lines.append(f"{phase:<22}{p['peak'] / 1e6:>16.3f}{p['calls']:>9d}")
+        if d['top_allocations']:
+            lines.append(f"live allocations at the end of '{self.snapshot_phase}':")
+            for a in d['top_allocations']:
+                site = os.path.relpath(a['site']) if a['site'].startswith(os.sep) else a['site']
+                lines.append(f"{a['size'] / 1e6:>10.3f} MB {a['count']:>7d} blocks  {site}")
+        return '\n'.join(lines)
+
+def test_memory_stats():
+    """
+    This function checks MemoryStats on DER.objfun: the bending assembly
+    allocates a dense Jacobian, the step high-water agrees with the DER count
+    of DENSE_MATRICES and the snapshot lists getFb among the biggest
+    allocation sites.
+    """
+    import Benchmark
+
+    nv = 60
+    ndof = numberOfDOF(nv)
+    model = Benchmark.helixRod(nv)
+    stats = MemoryStats()
+    base = tracemalloc.get_traced_memory()[0]
+    try:
+        q, u, a1, a2 = Benchmark._objfun(model, model['q0'], model['u'], model['a1'], model['a2'], stats)
+        Benchmark._objfun(model, q, u, a1, a2, stats)
+    finally:
+        stats.stop()
+
+    d = stats.as_dict()
+    dense = 8 * ndof**2
+    assert d['steps'] == 2 and d['phases']['getFb']['peak'] >= dense, "Test case 1 failed"
+    transient = d['max_step_peak'] - base
+    predicted = predictMemory(nv, 'der', base=0)['dense']
+    assert abs(transient - predicted) < 0.15 * predicted, "Test case 2 failed"
+    assert any('DER.py' in a['site'] for a in stats.top_allocations(3)), "Test case 3 failed"
+    assert d['peak_rss'] > 0 or resource is None, "Test case 4 failed"
+
+    print("All test cases passed")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Memory prediction of a simulation')
+    parser.add_argument('--predict', type=int, nargs='+', metavar='NV', help='number of nodes')
+    parser.add_argument('--engine', choices=sorted(DENSE_MATRICES), default='der')
+    parser.add_argument('--steps', type=int, default=0, help='number of time steps')
+    args = parser.parse_args(argv)
+
+    if not args.predict:
+        test_memory_stats()
+        return 0
+    memory = physicalMemory()
+    for nv in args.predict:
+        prediction = predictMemory(nv, args.engine, args.steps)
+        prediction['fits'] = bool(memory == 0 or prediction['total'] < memory)
+        print(json.dumps(prediction))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Vectorized construction of the rod models.
+
+The setup blocks of DER.py and of the 2D scripts build the nodes, the DOF
+vector, the reference and Voronoi lengths, the masses, the weights and the
+damping. The functions below build the same arrays with slicing and
+broadcasting, so the setup costs O(nv) and works for nv = 10**6.
+
+The mass and damping are kept as vectors (the diagonals of the mass and
+damping matrices): the solvers (TimeIntegrators.jacobian, Beam2D.objfun,
+DER.objfun) accept a vector wherever they accept a matrix, through
+diagonalProduct and addDiagonal. A dense ndof x ndof mMat or C is only
+needed by code that has a non-diagonal damping matrix.
+
+DER layout (4 nv - 1 DOFs): [x_0, y_0, z_0, theta_0, x_1, ...];
+planar layout (2 nv DOFs): [x_0, y_0, x_1, y_1, ...].
+"""
+
+import time
+
+import numpy as np
+
+def rodNodes(nv, RodLength, natR=0.0):
+    """Nodes (nv x 3) of a straight rod along x (natR = 0) or of a ring of radius natR."""
+    if natR == 0:
+        x = np.arange(nv) * RodLength / (nv - 1)
+        return np.column_stack((x, np.zeros(nv), np.zeros(nv)))
+    angle = np.arange(nv) * ((RodLength / natR) * (1.0 / (nv - 1)))
+    return np.column_stack((natR * np.cos(angle), natR * np.sin(angle), np.zeros(nv)))
+
+def derDOF(nodes, theta=0.0):
+    """DOF vector of DER.py: node coordinates and twist angles theta of the edges."""
+    nv = len(nodes)
+    q = np.zeros(4 * nv - 1)
+    for k in range(3):
+        q[k::4] = nodes[:, k]
+    q[3::4] = theta
+    return q
+
+def planarDOF(nodes):
+    """DOF vector of the 2D engine: x and y of every node."""
+    return np.ascontiguousarray(nodes[:, :2]).ravel()
+
+def referenceLengths(nodes):
+    """Edge lengths (nv - 1) and Voronoi lengths (nv) of the nodes."""
+    refLen = np.sqrt(np.sum(np.diff(nodes, axis=0)**2, axis=1))
+    voronoiRefLen = np.zeros(len(nodes))
+    voronoiRefLen[:-1] += 0.5 * refLen
+    voronoiRefLen[1:] += 0.5 * refLen
+    return refLen, voronoiRefLen
+
+def rodMass(nv, RodLength, r0, rho):
+    """
+    Lumped mass vector of DER.py: dm = rho * pi r0**2 * RodLength / (nv - 1)
+    per internal node (dm / 2 at the ends) on x, y, z, and dm r0**2 / 2 on
+    every twist angle.
+    """
+    dm = (np.pi * r0**2 * RodLength) * rho / (nv - 1)
+    m_node = np.full(nv, dm)
+    m_node[[0, -1]] = dm / 2
+    massVector = np.zeros(4 * nv - 1)
+    for k in range(3):
+        massVector[k::4] = m_node
+    massVector[3::4] = 1 / 2 * dm * r0**2
+    return massVector
+
+def derGravity(massVector, g):
+    """Weight of the nodes of a DER mass vector under gravity g (3 components)."""
+    Fg = np.zeros_like(massVector)
+    for k in range(3):
+        Fg[k::4] = massVector[k::4] * g[k]
+    return Fg
+
+def sphereMass(R, rho_metal):
+    """Mass of every DOF of the spheres of radius R (one per node) in the planar layout."""
+    return np.repeat(4 / 3 * np.pi * np.asarray(R)**3 * rho_metal, 2)
+
+def sphereWeight(R, rho, g):
+    """Weight (buoyancy included through rho = rho_metal - rho_fluid) of the spheres, planar layout."""
+    return ((4 / 3 * np.pi * np.asarray(R)**3 * rho)[:, None] * np.asarray(g)).ravel()
+
+def sphereDamping(R, visc):
+    """Stokes drag coefficient 6 pi visc R of every DOF of the spheres, planar layout."""
+    return np.repeat(6 * np.pi * visc * np.asarray(R), 2)
+
+def diagonalProduct(M, v):
+    """M @ v for a matrix M, or M * v for a vector M (the diagonal of the matrix)."""
+    return M * v if np.ndim(M) == 1 else M @ v
+
+def addDiagonal(J, factor, M):
+    """J += factor * M in place, with M a matrix or the vector of its diagonal."""
+    if np.ndim(M) == 1:
+        J[np.diag_indices_from(J)] += factor * M
+    else:
+        J += factor * M
+    return J
+
+def test_model_setup():
+    """
+    This function checks the vectorized arrays against the loops of DER.py
+    and FallingSpheres_General.py, the matrix-free helpers against dense
+    matrices, and times the setup of a rod with 10**6 nodes.
+    """
+    nv, RodLength, natR, r0, rho = 7, 0.2, 0.02, 1e-3, 1000
+    ne, ndof = nv - 1, 4 * nv - 1
+
+    # Loops of DER.py
+    nodes = np.zeros((nv, 3))
+    dTheta = (RodLength / natR) * (1.0 / ne)
+    for c in range(nv):
+        nodes[c, 0] = natR * np.cos(c * dTheta)
+        nodes[c, 1] = natR * np.sin(c * dTheta)
+    dm = (np.pi * r0**2 * RodLength) * rho / ne
+    massVector = np.zeros(ndof)
+    for c in range(nv):
+        massVector[[4*c, 4*c+1, 4*c+2]] = dm / 2 if c in (0, nv - 1) else dm
+    for c in range(ne):
+        massVector[4*c + 3] = 1/2 * dm * r0**2
+    g = np.array([0, 0, -9.81])
+    Fg = np.zeros(ndof)
+    q0 = np.zeros(ndof)
+    for c in range(nv):
+        ind = [4*c, 4*c+1, 4*c+2]
+        Fg[ind] = massVector[ind] * g
+        q0[ind] = nodes[c, :]
+    refLen = np.array([np.linalg.norm(nodes[c+1] - nodes[c]) for c in range(ne)])
+    voronoiRefLen = np.array([0.5 * refLen[0]] + [0.5 * (refLen[c-1] + refLen[c]) for c in range(1, ne)]
+                             + [0.5 * refLen[-1]])
+
+    assert np.array_equal(rodNodes(nv, RodLength, natR), nodes), "Test case 1 failed"
+    assert np.array_equal(rodMass(nv, RodLength, r0, rho), massVector), "Test case 2 failed"
+    assert np.array_equal(derGravity(massVector, g), Fg), "Test case 3 failed"
+    assert np.array_equal(derDOF(nodes), q0), "Test case 4 failed"
+    assert np.allclose(referenceLengths(nodes)[0], refLen, rtol=1e-14), "Test case 5 failed"
+    assert np.allclose(referenceLengths(nodes)[1], voronoiRefLen, rtol=1e-14), "Test case 6 failed"
+
+    # Loops of FallingSpheres_General.py
+    R = np.linspace(0.001, 0.003, nv)
+    m = np.zeros(2 * nv)
+    W = np.zeros(2 * nv)
+    C = np.zeros((2 * nv, 2 * nv))
+    for k in range(nv):
+        m[2*k] = m[2*k+1] = 4 / 3 * np.pi * R[k]**3 * 7000
+        W[2*k], W[2*k+1] = m[2*k] * 0.0, m[2*k] * -9.8
+        C[2*k, 2*k] = C[2*k+1, 2*k+1] = 6 * np.pi * 1000 * R[k]
+    c = sphereDamping(R, 1000)
+    assert np.array_equal(sphereMass(R, 7000), m), "Test case 7 failed"
+    assert np.array_equal(sphereWeight(R, 7000, [0.0, -9.8]), W), "Test case 8 failed"
+    assert np.array_equal(np.diag(c), C), "Test case 9 failed"
+
+    v = np.arange(2.0 * nv)
+    J = np.ones((2 * nv, 2 * nv))
+    assert np.array_equal(diagonalProduct(c, v), C @ v), "Test case 10 failed"
+    assert np.array_equal(addDiagonal(J.copy(), 2.0, c), J + 2.0 * C), "Test case 11 failed"
+
+    t0 = time.perf_counter()
+    nv = 10**6
+    nodes = rodNodes(nv, 1.0)
+    massVector = rodMass(nv, 1.0, r0, rho)
+    derGravity(massVector, g)
+    derDOF(nodes)
+    referenceLengths(nodes)
+    print(f"Setup of nv = {nv}: {time.perf_counter() - t0:.2f} s")
+
+    print("All test cases passed")
+
+if __name__ == "__main__":
+    test_model_setup()
@@ -0,0 +1,284 @@
+"""
+Profiling of a window of steps of the simulation and fitting loops.
+
+The entry points (DER.py, FallingSpheres3.py, FallingSpheres_General.py,
+FallingSpheres3_Exp_02.py, HW3_JG_2.py, HW3_JG_nln.py) accept
+
+    python DER.py --profile                  # default window of the script
+    python DER.py --profile 50:70            # steps 50 to 69
+    python DER.py --profile --profile-mode sample --profile-top 40
+
+Only the steps of the window are profiled, so the overhead of a long run is
+the overhead of those steps. At the end of the window two files are written
+next to the outputs of the script (--profile-dir, the working directory by
+default):
+
+    <script>_profile.txt        top-N functions (cumulative time for cProfile,
+                                inclusive samples for the sampling profiler)
+    <script>_profile.collapsed  collapsed stacks ('a;b;c value' lines, one per
+                                stack) for flamegraph.pl / speedscope
+
+Mode 'cprofile' (default) is deterministic; its collapsed stacks are
+rebuilt from the caller/callee graph (time in microseconds, split between the
+callers of a function in proportion to the time they spent in it). Mode 'sample' reads the
+stack of the profiled thread every --profile-interval seconds from a
+background thread; its stacks are exact and its overhead does not depend on
+the number of calls, but the sampler needs the GIL, so long calls that hold
+it are seen at the interpreter switch interval.
+
+In a loop:
+
+    profiler = from_argv('DER', window = (1, 21))
+    for timeStep in range(Nsteps):
+        profiler.step(timeStep)
+        ...
+    profiler.finish()
+
+Without --profile from_argv returns NULL_PROFILER, whose step and finish do
+nothing.
+"""
+
+import argparse
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+
+from Telemetry import telemetry, INFO
+
+def _label(filename, funcname):
+    # Frame label in the stacks: file:function ('~' is the file of built-ins)
+    if filename == '~':
+        return funcname
+    return f'{os.path.basename(filename)}:{funcname}'
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread every interval seconds from a daemon
+    thread; counts maps the collapsed stacks (root first) to their samples.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.counts = {}
+        self._thread = None
+
+    def enable(self):
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def disable(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                stack.append(_label(frame.f_code.co_filename, frame.f_code.co_name))
+                frame = frame.f_back
+            if stack:
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def collapsed(self):
+        return dict(self.counts)
+
+    def summary(self, top):
+        """Functions with the most inclusive samples (and their self samples)."""
+        total = max(sum(self.counts.values()), 1)
+        inclusive, own = {}, {}
+        for stack, n in self.counts.items():
+            frames = stack.split(';')
+            for label in set(frames):
+                inclusive[label] = inclusive.get(label, 0) + n
+            own[frames[-1]] = own.get(frames[-1], 0) + n
+        lines = [f'{total} samples every {1e3 * self.interval:g} ms',
+                 f"{'inclusive':>10}{'self':>8}  function"]
+        for label, n in sorted(inclusive.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f'{100 * n / total:>9.1f}%{100 * own.get(label, 0) / total:>7.1f}%  {label}')
+        return '\n'.join(lines)
+
+def collapsedFromStats(stats, max_depth=64):
+    """
+    Collapsed stacks {stack: microseconds} of a pstats.Stats. The time of a
+    function is split between its callers in proportion to the cumulative
+    time they spent in it.
+    """
+    callees = {}
+    roots = []
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        if not callers:
+            roots.append(func)
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    stacks = {}
+    def walk(func, path, time):
+        label = _label(func[0], func[2])
+        key = f'{path};{label}' if path else label
+        cc, nc, tt, ct, callers = stats.stats[func]
+        scale = time / ct if ct > 0 else 0.0
+        own = tt * scale
+        if len(key.split(';')) < max_depth:
+            for callee, edge_time in callees.get(func, []):
+                if callee != func and edge_time * scale > 0:
+                    walk(callee, key, edge_time * scale)
+        else:
+            own = time
+        value = int(round(1e6 * own))
+        if value > 0:
+            stacks[key] = stacks.get(key, 0) + value
+
+    for func in roots:
+        walk(func, '', stats.stats[func][3])
+    return stacks
+
+class StepProfiler:
+    """
+    Profiles the steps start, ..., stop - 1 of a loop that calls step(k) at
+    the start of step k, and writes the reports when the window closes.
+
+    Parameters:
+    name : str
+        Prefix of the report files (the script name).
+    start, stop : int
+        Window of profiled steps.
+    mode : str
+        'cprofile' or 'sample'.
+    top : int
+        Number of functions in the summary.
+    directory : str
+        Directory of the report files.
+    interval : float
+        Sampling interval [s] of mode 'sample'.
+    """
+
+    def __init__(self, name, start=1, stop=21, mode='cprofile', top=25, directory='.', interval=0.005):
+        if mode not in ('cprofile', 'sample'):
+            raise ValueError(f"Unknown profiler mode '{mode}' (use 'cprofile' or 'sample')")
+        self.name = name
+        self.start = start
+        self.stop = stop
+        self.mode = mode
+        self.top = top
+        self.directory = directory
+        self.interval = interval
+        self.active = False
+        self.done = False
+        self.files = None
+
+    def step(self, k):
+        if self.done:
+            return
+        if not self.active and self.start <= k < self.stop:
+            self._profiler = cProfile.Profile() if self.mode == 'cprofile' else SamplingProfiler(self.interval)
+            self._first = k
+            self.active = True
+            self._profiler.enable()
+        elif self.active and k >= self.stop:
+            self._close(k)
+
+    def finish(self):
+        """Close the window if the loop ended inside it."""
+        if self.active:
+            self._close(None)
+
+    def _close(self, k):
+        self._profiler.disable()
+        self.active = False
+        self.done = True
+        window = f'{self._first}:{k}' if k is not None else f'{self._first}:end'
+
+        if self.mode == 'cprofile':
+            stream = io.StringIO()
+            stats = pstats.Stats(self._profiler, stream=stream)
+            stats.sort_stats('cumulative').print_stats(self.top)
+            summary = stream.getvalue()
+            stacks = collapsedFromStats(stats)
+        else:
+            summary = self._profiler.summary(self.top)
+            stacks = self._profiler.collapsed()
+
+        os.makedirs(self.directory, exist_ok=True)
+        prefix = os.path.join(self.directory, f'{self.name}_profile')
+        with open(prefix + '.txt', 'w') as f:
+            f.write(f'{self.name}: steps {window} ({self.mode})\n{summary}\n')
+        with open(prefix + '.collapsed', 'w') as f:
+            for stack, value in sorted(stacks.items()):
+                f.write(f'{stack} {value}\n')
+        self.files = (prefix + '.txt', prefix + '.collapsed')
+        telemetry.emit('profile', INFO, steps = window, mode = self.mode,
+                       summary = self.files[0], collapsed = self.files[1])
+
+class NullProfiler:
+    """Stand-in for StepProfiler that profiles nothing."""
+
+    def step(self, k):
+        pass
+
+    def finish(self):
+        pass
+
+NULL_PROFILER = NullProfiler()
+
+def from_argv(name, window=(1, 21), argv=None):
+    """
+    StepProfiler configured by the --profile options of the command line
+    (sys.argv, other arguments are ignored), NULL_PROFILER without --profile.
+    """
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument('--profile', nargs='?', const=f'{window[0]}:{window[1]}', default=None)
+    parser.add_argument('--profile-mode', choices=('cprofile', 'sample'), default='cprofile')
+    parser.add_argument('--profile-top', type=int, default=25)
+    parser.add_argument('--profile-dir', default='.')
+    parser.add_argument('--profile-interval', type=float, default=0.005)
+    args, unknown = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    if args.profile is None:
+        return NULL_PROFILER
+    start, stop = (int(k) for k in args.profile.split(':'))
+    return StepProfiler(name, start, stop, args.profile_mode, args.profile_top,
+                        args.profile_dir, args.profile_interval)
+
+def test_profiler():
+    """
+    This function checks both modes on a toy loop: the window is respected,
+    both files are written, the collapsed stacks have the hot function under
+    the loop and the summary lists it.
+    """
+    import tempfile
+
+    def hot(n):
+        return sum(k * k for k in range(n))
+
+    assert from_argv('toy', argv=['--other', '1']) is NULL_PROFILER, "Test case 1 failed"
+    for mode in ('cprofile', 'sample'):
+        with tempfile.TemporaryDirectory() as directory:
+            profiler = from_argv('toy', argv=['--profile', '2:5', '--profile-mode', mode,
+                                              '--profile-dir', directory, '--profile-interval', '0.001'])
+            calls = []
+            for k in range(8):
+                profiler.step(k)
+                calls.append(profiler.active)
+                hot(200000)
+            profiler.finish()
+            assert calls == [False, False, True, True, True, False, False, False], "Test case 2 failed"
+
+            with open(profiler.files[1]) as f:
+                lines = f.read().splitlines()
+            assert lines and all(line.rsplit(' ', 1)[1].isdigit() for line in lines), "Test case 3 failed"
+            assert any('hot' in line.rsplit(' ', 1)[0] for line in lines), "Test case 4 failed"
+            with open(profiler.files[0]) as f:
+                assert 'hot' in f.read(), "Test case 5 failed"
+
+    print("All test cases passed")
+
+if __name__ == "__main__":
+    test_profiler()
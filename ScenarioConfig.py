@@ -0,0 +1,514 @@
+"""
+Declarative scenario files for the 2D bead-spring / beam engine and the DER
+engine.
+
+A scenario is a TOML or JSON file with the parameters of a run, e.g.
+
+    engine = "beam2d"
+    name = "falling3"
+    nv = 3
+    dt = 1e-2
+    totalTime = 10.02
+    RodLength = 0.10
+    R = [0.005, 0.025, 0.005]
+    rho_metal = 7000
+    rho_gl = 1000
+    r0 = 1e-3
+    Y = 1e9
+    visc = 1000.0
+
+loadScenario validates it against the schema of its engine (BEAM2D_FIELDS or
+DER_FIELDS: unknown fields, missing required fields, wrong types and
+out-of-range values are all reported in one ValueError) and builds the model:
+the derived quantities (EI, EA, GJ, masses, weights, damping, reference
+lengths, initial DOFs) are computed with array operations at load time, in
+the same expressions as the scripts. run(scenario) is the entry point of
+every engine and returns the time histories of the run.
+
+The 'beam2d' engine covers FallingSpheres3.py, FallingSpheres_General.py,
+FallingSpheres3_Exp_02.py and SimplySupportLoaded.py: solid (r0) or hollow
+(ro, ri) cross-section, sphere radii R (one value, or one per node, with an
+optional R_mid for the middle node), weight with buoyancy
+(rho_metal - rho_gl), viscous damping, fixed DOFs, an optional point load
+and the integrator ('euler', 'bdf2', 'midpoint', 'newmark', 'hht' with
+Beam2D.objfun, or 'explicit' / 'imex' with sub-stepping). The 'der' engine is
+the rod of DER.py (helix of radius natR, or straight for natR = 0).
+
+    python ScenarioConfig.py scenarios/falling3.toml
+    python ScenarioConfig.py scenarios/beam.toml --set nv=51 --set Load_x=0.5 --out beam.npz
+
+--set overrides a field (the value is parsed as JSON, so lists work too),
+which lets a scheduler sweep parameters without copies of the scripts.
+The files in scenarios/ reproduce the scripts (see test_scenarios).
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+try:
+    import tomllib
+except ImportError: # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+import Beam2D
+import DER
+from Explicit import PlanarForce, critical_time_step, sub_steps, velocity_verlet, is_unstable
+from IMEX import critical_time_step_imex, imex_step
+from ModelSetup import (rodNodes, derDOF, planarDOF, referenceLengths, rodMass, derGravity,
+                        sphereMass, sphereWeight, sphereDamping)
+from TimeIntegrators import make_scheme
+from Timing import SolverStats
+from Telemetry import telemetry, INFO
+
+REQUIRED = object()
+
+# Fields of every engine: name -> (kind, default, lower bound)
+COMMON_FIELDS = {
+    'engine': ('str', REQUIRED, None),
+    'name': ('str', None, None),
+    'nv': ('int', REQUIRED, 3),
+    'dt': ('float', REQUIRED, 0.0),
+    'totalTime': ('float', REQUIRED, 0.0),
+    'RodLength': ('float', REQUIRED, 0.0),
+    'Y': ('float', REQUIRED, 0.0),
+    'integrator': ('str', 'euler', None),
+    'tol': ('float', None, 0.0), # EI / RodLength**2 * 1e-3 if not given
+    'maximum_iter': ('int', 100, 1),
+}
+
+BEAM2D_FIELDS = dict(COMMON_FIELDS, **{
+    'r0': ('float', None, 0.0), # solid cross-section ...
+    'ro': ('float', None, 0.0), # ... or hollow: outer and inner radius
+    'ri': ('float', 0.0, None),
+    'R': ('floats', REQUIRED, 0.0), # sphere radius, one value or one per node
+    'R_mid': ('float', None, 0.0), # radius of the middle node (nv + 1) // 2 - 1
+    'rho_metal': ('float', REQUIRED, 0.0),
+    'rho_gl': ('float', 0.0, None), # density of the fluid (buoyancy)
+    'visc': ('float', 0.0, None),
+    'g': ('floats', [0.0, -9.8], None),
+    'fixed_index': ('ints', [], None), # fixed DOFs, negative values count from the end
+    'Load_x': ('float', None, None), # point load Load_F at the node closest to Load_x
+    'Load_F': ('floats', [0.0, 0.0], None),
+    'monitor_node': ('int', None, None), # node of all_pos, all_v and midAngle (middle node by default)
+})
+
+DER_FIELDS = dict(COMMON_FIELDS, **{
+    'natR': ('float', 0.0, None), # natural radius, 0 for a straight rod
+    'r0': ('float', REQUIRED, 0.0),
+    'nu': ('float', 0.5, None),
+    'rho': ('float', 1000.0, 0.0),
+    'g': ('floats', [0.0, 0.0, -9.81], None),
+    'fixedIndex': ('ints', list(range(7)), None), # clamped: first two nodes and the first edge
+})
+
+SCHEMAS = {'beam2d': BEAM2D_FIELDS, 'der': DER_FIELDS}
+
+INTEGRATORS = {'beam2d': ('euler', 'bdf2', 'midpoint', 'newmark', 'hht', 'explicit', 'imex'),
+               'der': ('euler', 'bdf2', 'midpoint', 'newmark', 'hht')}
+
+def _check(name, kind, value, bound, errors):
+    # Value of a field converted to its kind, or None with a message in errors
+    try:
+        if kind == 'str':
+            if not isinstance(value, str):
+                raise TypeError
+            return value
+        if kind in ('int', 'ints'):
+            array = np.asarray(value)
+            if array.dtype.kind not in 'iu' and not (array.dtype.kind == 'f' and np.all(array == np.round(array))):
+                raise TypeError
+            value = array.astype(int)
+        else:
+            if isinstance(value, bool) or np.asarray(value).dtype.kind not in 'iuf':
+                raise TypeError
+            value = np.asarray(value, dtype=float)
+    except (TypeError, ValueError):
+        errors.append(f"{name} must be of type {kind}, got {value!r}")
+        return None
+    if kind in ('int', 'float') and value.ndim != 0:
+        errors.append(f"{name} must be a single {kind}, got {value.tolist()!r}")
+        return None
+    if bound is not None and np.any(value < bound if kind == 'int' else value <= bound):
+        errors.append(f"{name} must be {'>=' if kind == 'int' else '>'} {bound}, got {value.tolist()!r}")
+        return None
+    if kind == 'int':
+        return int(value)
+    if kind == 'float':
+        return float(value)
+    return value
+
+def validate(config, source='scenario'):
+    """
+    Parameters of a scenario dict with the defaults of its engine filled in.
+    Raises ValueError listing every problem.
+    """
+    engine = config.get('engine')
+    if engine not in SCHEMAS:
+        raise ValueError(f"{source}: engine must be one of {sorted(SCHEMAS)}, got {engine!r}")
+    schema = SCHEMAS[engine]
+
+    errors = [f"unknown field '{key}'" for key in config if key not in schema]
+    params = {}
+    for key, (kind, default, bound) in schema.items():
+        if key not in config:
+            if default is REQUIRED:
+                errors.append(f"missing field '{key}'")
+                default = None # reported; skipped by the checks below
+            params[key] = default if not isinstance(default, list) else np.asarray(default)
+            continue
+        params[key] = _check(key, kind, config[key], bound, errors)
+
+    if params['integrator'] not in INTEGRATORS[engine]:
+        errors.append(f"integrator must be one of {INTEGRATORS[engine]}, got {params['integrator']!r}")
+    nv = params['nv'] if isinstance(params['nv'], int) else 0
+    if engine == 'beam2d':
+        if (params['r0'] is None) == (params['ro'] is None):
+            errors.append("give either r0 (solid) or ro, ri (hollow cross-section)")
+        elif params['ro'] is not None and params['ri'] is not None and params['ri'] >= params['ro']:
+            errors.append(f"ri must be < ro, got ri = {params['ri']}, ro = {params['ro']}")
+        if params['R'] is not None and params['R'].ndim > 0 and nv and params['R'].shape != (nv,):
+            errors.append(f"R must be one value or {nv} values, got {params['R'].size}")
+        for key, size in (('g', 2), ('Load_F', 2)):
+            if params[key] is not None and params[key].shape != (size,):
+                errors.append(f"{key} must have {size} values")
+        if (params['Load_x'] is not None and params['RodLength'] is not None
+                and not 0 <= params['Load_x'] <= params['RodLength']):
+            errors.append(f"Load_x must be in [0, RodLength], got {params['Load_x']}")
+        if params['monitor_node'] is not None and nv and not 1 <= params['monitor_node'] <= nv - 2:
+            errors.append(f"monitor_node must be an interior node (1 to {nv - 2})")
+        ndof = 2 * nv
+        index = params['fixed_index']
+    else:
+        if params['g'] is not None and params['g'].shape != (3,):
+            errors.append("g must have 3 values")
+        ndof = 4 * nv - 1
+        index = params['fixedIndex']
+    if index is not None and nv and index.size and not np.all((-ndof <= index) & (index < ndof)):
+        errors.append(f"fixed DOFs must be in [-{ndof}, {ndof}), got {index.tolist()}")
+
+    if errors:
+        raise ValueError(f"{source}: " + '; '.join(errors))
+    if params['name'] is None:
+        params['name'] = os.path.splitext(os.path.basename(source))[0]
+    return params
+
+def readScenario(path):
+    """Raw dict of a .toml or .json scenario file."""
+    if path.endswith('.toml'):
+        if tomllib is None:
+            raise ImportError('Reading TOML scenarios needs Python 3.11 (tomllib) or tomli')
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    with open(path) as f:
+        return json.load(f)
+
+def loadScenario(path_or_dict, overrides=None):
+    """
+    Validated parameters and model of a scenario (file path or dict), with
+    overrides {field: value} applied first. Returns a dict with 'params' and
+    'model'.
+    """
+    if isinstance(path_or_dict, dict):
+        config, source = dict(path_or_dict), 'scenario'
+    else:
+        config, source = readScenario(path_or_dict), path_or_dict
+    config.update(overrides or {})
+    params = validate(config, source)
+    model = buildBeam2D(params) if params['engine'] == 'beam2d' else buildDER(params)
+    return {'params': params, 'model': model}
+
+def buildBeam2D(p):
+    """Model of a 'beam2d' scenario (the quantities of FallingSpheres*.py and SimplySupportLoaded.py)."""
+    nv = p['nv']
+    ne = nv - 1
+    ndof = 2 * nv
+    deltaL = p['RodLength'] / ne
+
+    if p['r0'] is not None:
+        EI = p['Y'] * np.pi * p['r0']**4 / 4
+        EA = p['Y'] * np.pi * p['r0']**2
+    else:
+        EI = p['Y'] * np.pi * (p['ro']**4 - p['ri']**4) / 4
+        EA = p['Y'] * np.pi * (p['ro']**2 - p['ri']**2)
+    tol = p['tol'] if p['tol'] is not None else EI / p['RodLength']**2 * 1e-3
+
+    midNode = (nv + 1) // 2 - 1
+    R = np.broadcast_to(p['R'], (nv,)).astype(float)
+    if p['R_mid'] is not None:
+        R[midNode] = p['R_mid']
+
+    # Masses, weights (with buoyancy) and damping of the spheres, two DOFs each
+    m = sphereMass(R, p['rho_metal'])
+    W = sphereWeight(R, p['rho_metal'] - p['rho_gl'], p['g'])
+    c = sphereDamping(R, p['visc'])
+
+    loadNode = None
+    if p['Load_x'] is not None:
+        loadNode = int(np.round(p['Load_x'] / deltaL))
+        W[2 * loadNode:2 * loadNode + 2] += p['Load_F']
+
+    q0 = planarDOF(rodNodes(nv, p['RodLength']))
+
+    fixed_index = np.unique(np.asarray(p['fixed_index'], dtype=int) % ndof)
+    free_index = np.setdiff1d(np.arange(ndof), fixed_index)
+    monitor = p['monitor_node'] if p['monitor_node'] is not None else midNode
+
+    return dict(nv=nv, ndof=ndof, deltaL=deltaL, EI=EI, EA=EA, tol=tol, R=R, m=m,
+                mMat=m, W=W, c=c, C=c, q0=q0, free_index=free_index,
+                loadNode=loadNode, monitor=monitor, Nsteps=round(p['totalTime'] / p['dt']))
+
+def buildDER(p):
+    """Model of a 'der' scenario (the quantities of the main block of DER.py)."""
+    nv = p['nv']
+    ndof = 4 * nv - 1
+    RodLength, natR, r0 = p['RodLength'], p['natR'], p['r0']
+
+    nodes = rodNodes(nv, RodLength, natR) # straight rod (natR = 0) or ring of radius natR
+
+    G = p['Y'] / (2.0 * (1.0 + p['nu']))
+    EI = p['Y'] * np.pi * r0**4 / 4
+    GJ = G * np.pi * r0**4 / 2
+    EA = p['Y'] * np.pi * r0**2
+    tol = p['tol'] if p['tol'] is not None else EI / RodLength**2 * 1e-3
+
+    massVector = rodMass(nv, RodLength, r0, p['rho'])
+    Fg = derGravity(massVector, p['g'])
+    q0 = derDOF(nodes)
+    refLen, voronoiRefLen = referenceLengths(nodes)
+
+    tangent = DER.computeTangent(q0)
+    a1_first = np.cross(tangent[0, :], np.array([0, 0, -1]))
+    if np.linalg.norm(a1_first) < 1e-6:
+        a1_first = np.cross(tangent[0, :], np.array([0, 1, 0]))
+    a1, a2 = DER.computeSpaceParallel(a1_first / np.linalg.norm(a1_first), q0)
+    m1, m2 = DER.computeMaterialFrame(a1, a2, q0[3::4])
+    refTwist = DER.getRefTwist(a1, tangent, np.zeros(nv))
+
+    fixedIndex = np.unique(np.asarray(p['fixedIndex'], dtype=int) % ndof)
+    freeIndex = np.setdiff1d(np.arange(ndof), fixedIndex)
+
+    return dict(nv=nv, ndof=ndof, EI=EI, GJ=GJ, EA=EA, tol=tol, massVector=massVector,
+                mMat=massVector, Fg=Fg, q0=q0, refLen=refLen, voronoiRefLen=voronoiRefLen,
+                a1=a1, a2=a2, refTwist=refTwist, kappaBar=DER.getKappa(q0, m1, m2),
+                twistBar=np.zeros(nv), freeIndex=freeIndex, Nsteps=round(p['totalTime'] / p['dt']))
+
+def _monitor(q, u, k):
+    # y-position and y-velocity of node k and the turning angle [deg] at node k
+    vec1 = np.array([q[2*k] - q[2*k-2], q[2*k+1] - q[2*k-1], 0])
+    vec2 = np.array([q[2*k+2] - q[2*k], q[2*k+3] - q[2*k+1], 0])
+    angle = np.degrees(np.arctan2(np.linalg.norm(np.cross(vec1, vec2)), np.dot(vec1, vec2)))
+    return q[2*k+1], u[2*k+1], angle
+
+def runBeam2D(p, model):
+    """
+    Time loop of a 'beam2d' scenario. Returns t, all_pos, all_v and midAngle
+    (as in the scripts, index 0 is the initial state), the final q and u,
+    the number of substeps (explicit / imex) and the Newton iterations.
+    """
+    dt, Nsteps = p['dt'], model['Nsteps']
+    m, W, free_index, deltaL = model['m'], model['W'], model['free_index'], model['deltaL']
+    q0 = model['q0'].copy()
+    u = np.zeros_like(q0)
+    all_pos, all_v, midAngle = np.zeros(Nsteps), np.zeros(Nsteps), np.zeros(Nsteps)
+    stats = SolverStats()
+    nsub = 1
+
+    if p['integrator'] in ('explicit', 'imex'):
+        if p['integrator'] == 'imex':
+            dt_crit = critical_time_step_imex(m[0::2], model['EI'], deltaL, deltaL)
+            force = PlanarForce(0.0, model['EI'], deltaL, deltaL, 0.0, W) # stretching is implicit
+        else:
+            dt_crit = critical_time_step(m[0::2], model['EA'], model['EI'], deltaL, deltaL)
+            force = PlanarForce(model['EA'], model['EI'], deltaL, deltaL, 0.0, W)
+        nsub = sub_steps(dt, dt_crit)
+        F = force(q0)
+    else:
+        scheme = make_scheme(p['integrator'])
+
+    ctime = 0
+    flag = 1
+    for timeStep in range(1, Nsteps):
+        if p['integrator'] == 'imex':
+            q, u_sub = q0, u
+            for sub in range(nsub):
+                q_new, u_new, flag, iterations = imex_step(q, u_sub, dt / nsub, force, m, model['c'],
+                                                           model['EA'], deltaL, free_index, model['tol'],
+                                                           p['maximum_iter'])
+                stats.end_step(iterations)
+                if flag < 0:
+                    break
+                q, u_sub = q_new, u_new
+            if flag > 0:
+                u = u_sub
+        elif p['integrator'] == 'explicit':
+            q, u, F = velocity_verlet(q0, u, F, dt / nsub, nsub, force, m, model['c'], free_index)
+        else:
+            q, flag = Beam2D.objfun(q0, q0, u, dt, model['tol'], p['maximum_iter'], m, model['mMat'],
+                                    model['EI'], model['EA'], W, model['C'], deltaL, free_index, scheme,
+                                    stats = stats)
+            if flag < 0:
+                telemetry.emit('diverged', INFO, step = timeStep, time = ctime)
+                break
+            u = scheme.u
+        if p['integrator'] in ('explicit', 'imex') and (flag < 0 or is_unstable(q, deltaL)):
+            telemetry.emit('diverged', INFO, step = timeStep, time = ctime)
+            break
+
+        ctime += dt
+        telemetry.emit('step', INFO, step = timeStep, time = ctime, dt = dt)
+        q0 = q
+        all_pos[timeStep], all_v[timeStep], midAngle[timeStep] = _monitor(q, u, model['monitor'])
+
+    return {'t': np.linspace(0, p['totalTime'], Nsteps), 'all_pos': all_pos, 'all_v': all_v,
+            'midAngle': midAngle, 'q': q0, 'u': u, 'nsub': nsub,
+            'newton_iterations': int(np.sum(stats.newton_iterations))}
+
+def runDER(p, model):
+    """
+    Time loop of a 'der' scenario (the main loop of DER.py, planar fast path
+    included). Returns time, endZ (z of the last node), the final q and the
+    Newton iterations.
+    """
+    dt, Nsteps = p['dt'], model['Nsteps']
+    scheme = make_scheme(p['integrator'])
+    stats = SolverStats()
+    q0, u = model['q0'].copy(), np.zeros(model['ndof'])
+    a1, a2 = model['a1'], model['a2']
+    endZ = np.zeros(Nsteps)
+
+    planar = DER.isPlanar(q0, model['Fg'])
+    if planar:
+        q0_planar, u_planar = DER.toPlanar(q0), DER.toPlanar(u)
+        freeIndex_planar = DER.planarIndex(model['freeIndex'], model['nv'])
+        massVector_planar = DER.toPlanar(model['massVector'])
+        mMat_planar = massVector_planar
+        Fg_planar = DER.toPlanar(model['Fg'])
+        kappaBar_planar = DER.getKappa_planar(q0_planar)
+
+    ctime = 0
+    for timeStep in range(Nsteps):
+        if planar:
+            q_planar, u_planar = DER.objfun_planar(q0_planar.copy(), q0_planar, u_planar, freeIndex_planar,
+                                                   dt, model['tol'], massVector_planar, mMat_planar,
+                                                   model['EA'], model['refLen'], model['EI'],
+                                                   model['voronoiRefLen'], kappaBar_planar, Fg_planar,
+                                                   scheme, stats = stats)
+            q0_planar = q_planar.copy()
+            q = DER.fromPlanar(q_planar, q0)
+        else:
+            q, u, a1, a2 = DER.objfun(q0.copy(), q0, u, a1, a2, model['freeIndex'], dt, model['tol'],
+                                      model['refTwist'], model['massVector'], model['mMat'], model['EA'],
+                                      model['refLen'], model['EI'], model['GJ'], model['voronoiRefLen'],
+                                      model['kappaBar'], model['twistBar'], model['Fg'], scheme,
+                                      stats = stats)
+        ctime += dt
+        telemetry.emit('step', INFO, step = timeStep, time = ctime,
+                       iterations = stats.newton_iterations[-1], dt = dt)
+        q0 = q.copy()
+        endZ[timeStep] = q[-1]
+
+    return {'t': np.arange(1, Nsteps + 1) * dt, 'endZ': endZ, 'q': q0,
+            'newton_iterations': int(np.sum(stats.newton_iterations))}
+
+def run(scenario):
+    """Run a loaded scenario (from loadScenario) on its engine and return the results."""
+    p, model = scenario['params'], scenario['model']
+    if p['engine'] == 'beam2d':
+        return runBeam2D(p, model)
+    return runDER(p, model)
+
+def parseOverride(text):
+    """Field and value of a --set argument 'field=value' (value parsed as JSON when possible)."""
+    key, sep, value = text.partition('=')
+    if not sep:
+        raise ValueError(f"--set needs field=value, got {text!r}")
+    try:
+        return key.strip(), json.loads(value)
+    except json.JSONDecodeError:
+        return key.strip(), value
+
+def test_scenarios():
+    """
+    This function checks that the files in scenarios/ reproduce the end of
+    the runs of the scripts (scenario_reference.json, written by
+    Scenarios.py) and that the validation reports bad fields.
+    """
+    import Telemetry
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(here, 'scenario_reference.json')) as f:
+        reference = json.load(f)
+    Telemetry.configure(level = Telemetry.OFF)
+
+    for name in ('falling3', 'fallingN', 'falling3_exp', 'beam'):
+        scenario = loadScenario(os.path.join(here, 'scenarios', name + '.toml'))
+        result = run(scenario)
+        ref = reference[name]
+        for key, value in (('v_end', result['all_v'][-1]), ('deflection_end', result['all_pos'][-1]),
+                           ('midAngle_end', result['midAngle'][-1])):
+            assert np.isclose(value, ref[key], rtol=1e-6, atol=1e-9), f"Test case {name} failed ({key})"
+
+    helix = run(loadScenario(os.path.join(here, 'scenarios', 'helix.json'), {'totalTime': 0.2}))
+    assert np.isclose(helix['endZ'][-1], -0.059095105067607595, rtol=1e-8), "Test case helix failed"
+
+    try:
+        loadScenario({'engine': 'beam2d', 'nv': 2, 'dt': -1, 'RodLength': 1, 'Y': 1,
+                      'R': [1, 2], 'rho_metal': 1, 'r0': 1, 'color': 'red'})
+        raise AssertionError("Test case validation failed")
+    except ValueError as error:
+        message = str(error)
+        for part in ("unknown field 'color'", "missing field 'totalTime'", 'nv must be >= 3', 'dt must be > 0'):
+            assert part in message, f"Test case validation failed ({part})"
+
+    # Missing required fields are reported with the other problems
+    for config, parts in (({'engine': 'beam2d', 'nv': 5, 'dt': 1, 'totalTime': 1, 'RodLength': 1, 'Y': 1,
+                            'rho_metal': 1, 'r0': 1}, ("missing field 'R'",)),
+                          ({'engine': 'beam2d', 'nv': 5, 'dt': 1, 'totalTime': 1, 'Y': 1, 'R': 1,
+                            'rho_metal': 1, 'r0': 1, 'Load_x': 0.5}, ("missing field 'RodLength'",))):
+        try:
+            loadScenario(config)
+            raise AssertionError("Test case missing field failed")
+        except ValueError as error:
+            for part in parts:
+                assert part in str(error), f"Test case missing field failed ({part})"
+
+    Telemetry.configure()
+    print("All test cases passed")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a scenario file (TOML or JSON)')
+    parser.add_argument('scenario', nargs='?', help='scenario file; runs the tests without one')
+    parser.add_argument('--set', action='append', default=[], metavar='FIELD=VALUE',
+                        help='override a field of the scenario (repeatable)')
+    parser.add_argument('--out', help='write the results to this .npz file')
+    parser.add_argument('--check', action='store_true', help='only validate the scenario')
+    args = parser.parse_args(argv)
+
+    if args.scenario is None:
+        test_scenarios()
+        return 0
+    scenario = loadScenario(args.scenario, dict(parseOverride(text) for text in args.set))
+    p = scenario['params']
+    if args.check:
+        print(f"{p['name']}: valid {p['engine']} scenario, ndof = {scenario['model']['ndof']}, "
+              f"{scenario['model']['Nsteps']} steps")
+        return 0
+    telemetry.limit('step', every = 100)
+    result = run(scenario)
+    summary = {key: float(value[-1]) for key, value in result.items()
+               if key in ('all_pos', 'all_v', 'midAngle', 'endZ')}
+    print(json.dumps(dict(name = p['name'], engine = p['engine'], newton_iterations = result['newton_iterations'],
+                          **summary)))
+    if args.out:
+        np.savez(args.out, **{key: value for key, value in result.items() if isinstance(value, np.ndarray)})
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
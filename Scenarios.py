@@ -0,0 +1,171 @@
+"""
+Headless benchmark and accuracy harness for the 2D bead-spring scenarios.
+
+Each script below encodes a reference scenario:
+
+    falling3      FallingSpheres3.py           three spheres falling in a viscous fluid
+    fallingN      FallingSpheres_General.py    N spheres falling in a viscous fluid
+    falling3_exp  FallingSpheres3_Exp_02.py    three spheres, explicit integration
+    beam          SimplySupportLoaded.py       simply supported beam under a point load
+
+runScenario executes a script as __main__ in a scratch directory, with the
+Agg backend, plt.show and plt.savefig disabled and the per-step plots off
+(plotStep = 10**9, so the time is the time of the solver), and records the wall time, the steps per
+second and the Newton iterations (counted from the 'newton_iteration'
+telemetry records). It also records the key outputs at the end of the run:
+v_end = all_v[-1] (terminal velocity), deflection_end = all_pos[-1]
+(mid-node position) and midAngle_end = midAngle[-1].
+
+    python Scenarios.py                                   # all scenarios
+    python Scenarios.py --scenario beam falling3
+    python Scenarios.py --save scenario_reference.json    # store references
+    python Scenarios.py --reference scenario_reference.json
+
+With --reference the run fails (exit status 1) if an output is outside
+rtol / atol of the stored value (per scenario in the reference file), if
+a scenario needs more Newton iterations, or if it is more than --tolerance
+slower in steps per second (timings are machine dependent; pass
+--tolerance -1 to check only the outputs).
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import Telemetry
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SCENARIOS = {
+    'falling3': 'FallingSpheres3.py',
+    'fallingN': 'FallingSpheres_General.py',
+    'falling3_exp': 'FallingSpheres3_Exp_02.py',
+    'beam': 'SimplySupportLoaded.py',
+}
+
+OUTPUTS = ('v_end', 'deflection_end', 'midAngle_end')
+
+# Overrides of every run: no plots inside the time-stepping loop
+DEFAULT_OVERRIDES = {'plotStep': 10**9}
+
+def _override(source, name, value):
+    # Replace the first assignment "name = ..." of the script by name = value
+    pattern = r'^(\s*)' + re.escape(name) + r'\s*=.*$'
+    if not re.search(pattern, source, flags=re.M):
+        raise ValueError(f'{name} is not assigned in the script')
+    return re.sub(pattern, lambda m: f'{m.group(1)}{name} = {value!r}', source, count=1, flags=re.M)
+
+def runScenario(name, overrides=None):
+    """
+    Run one scenario headless and return its record. overrides maps
+    variables of the script (e.g. totalTime) to the values to use instead,
+    on top of DEFAULT_OVERRIDES.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    path = os.path.join(HERE, SCENARIOS[name])
+    with open(path) as f:
+        source = f.read()
+    for variable, value in dict(DEFAULT_OVERRIDES, **(overrides or {})).items():
+        source = _override(source, variable, value)
+    code = compile(source, path, 'exec')
+
+    sink = Telemetry.MemorySink()
+    Telemetry.configure(sink = sink, level = Telemetry.DEBUG)
+    show, savefig = plt.show, plt.savefig
+    plt.show = plt.savefig = lambda *args, **kwargs: None
+    cwd = os.getcwd()
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    g = {'__name__': '__main__', '__file__': path}
+    try:
+        with tempfile.TemporaryDirectory() as scratch: # files of the script go to a scratch directory
+            os.chdir(scratch)
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()): # prints of the script
+                exec(code, g)
+            wall = time.perf_counter() - t0
+    finally:
+        os.chdir(cwd)
+        plt.show, plt.savefig = show, savefig
+        plt.close('all')
+        Telemetry.configure()
+
+    steps = int(g['Nsteps']) - 1 # the scripts step from 1 to Nsteps - 1
+    events = [record['event'] for record in sink.records]
+    return {'scenario': name, 'wall_time': wall, 'steps': steps,
+            'steps_per_second': steps / wall,
+            'newton_iterations': events.count('newton_iteration'),
+            'v_end': float(g['all_v'][-1]),
+            'deflection_end': float(g['all_pos'][-1]),
+            'midAngle_end': float(g['midAngle'][-1])}
+
+def compareReference(records, reference, tolerance=0.5):
+    """
+    Failures of records against reference {scenario: record with optional
+    'rtol' and 'atol'}: outputs outside the tolerances, more Newton iterations
+    and (if tolerance >= 0) steps per second below reference / (1 + tolerance).
+    """
+    failures = []
+    for r in records:
+        ref = reference.get(r['scenario'])
+        if ref is None:
+            continue
+        rtol = ref.get('rtol', 1e-6)
+        atol = ref.get('atol', 1e-12)
+        for key in OUTPUTS:
+            if not np.isclose(r[key], ref[key], rtol=rtol, atol=atol):
+                failures.append(f"{r['scenario']}: {key} = {r[key]:.12e}, reference {ref[key]:.12e}")
+        if r['newton_iterations'] > ref['newton_iterations']:
+            failures.append(f"{r['scenario']}: {r['newton_iterations']} Newton iterations, "
+                            f"reference {ref['newton_iterations']}")
+        if tolerance >= 0 and r['steps_per_second'] < ref['steps_per_second'] / (1 + tolerance):
+            failures.append(f"{r['scenario']}: {r['steps_per_second']:.1f} steps/s, "
+                            f"reference {ref['steps_per_second']:.1f}")
+    return failures
+
+def report(records):
+    lines = [f"{'scenario':<14}{'wall [s]':>10}{'steps':>8}{'steps/s':>10}{'Newton':>8}"
+             f"{'v_end':>15}{'deflection_end':>16}{'midAngle_end':>14}"]
+    for r in records:
+        lines.append(f"{r['scenario']:<14}{r['wall_time']:>10.3f}{r['steps']:>8d}{r['steps_per_second']:>10.1f}"
+                     f"{r['newton_iterations']:>8d}{r['v_end']:>15.6e}{r['deflection_end']:>16.6e}"
+                     f"{r['midAngle_end']:>14.6f}")
+    return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark and accuracy harness of the 2D scenarios')
+    parser.add_argument('--scenario', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--save', help='write the records (as references) to this JSON file')
+    parser.add_argument('--reference', help='compare with the references of this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed relative slowdown in steps per second (< 0: outputs only)')
+    args = parser.parse_args(argv)
+
+    records = [runScenario(name) for name in args.scenario]
+    print(report(records))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({r['scenario']: dict(r, rtol=1e-6, atol=1e-12) for r in records}, f, indent=1)
+    if args.reference:
+        with open(args.reference) as f:
+            failures = compareReference(records, json.load(f), args.tolerance)
+        for line in failures:
+            print('FAILED ' + line)
+        if failures:
+            return 1
+        print('All scenarios match ' + args.reference)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""
+Leveled, rate-limited structured telemetry for the solvers and scripts.
+
+The Newton solvers, the time-stepping loops and the gradient-descent scripts
+do not print progress themselves. They emit records to the module channel
+`telemetry`:
+
+    telemetry.emit('newton_iteration', DEBUG, iteration = 3, residual = 1e-9)
+    telemetry.emit('step', INFO, step = 10, time = 0.1, iterations = 4, dt = 0.01)
+
+A record is a dict with the event name, the level name, the wall time since
+the channel was configured and the fields. A record reaches the sink only if
+its level is at least the channel level and the rate limits of its event
+allow it: at most one record out of `every`, and at least `min_interval`
+seconds after the last record of the same event. The default channel prints
+INFO records to the console, so per-iteration DEBUG records cost one level
+comparison. Scripts pick the sink and the limits with configure():
+
+    configure(sink = JSONLSink('run.jsonl'), level = DEBUG)    # everything to a file
+    configure(sink = MemorySink(), limits = {'step': {'every': 100}})
+    configure(level = OFF)                                      # silence
+
+Sinks: ConsoleSink (text on stdout), MemorySink (records in a list),
+JSONLSink (one JSON object per line) and NullSink (drops everything).
+"""
+
+import json
+import math
+import sys
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+OFF = 100
+
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING'}
+
+class NullSink:
+    """Drops every record."""
+
+    def write(self, record):
+        pass
+
+    def close(self):
+        pass
+
+class MemorySink(NullSink):
+    """Keeps the records in self.records (a list of dicts)."""
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+class JSONLSink(NullSink):
+    """Appends every record as one JSON line to path (or to an open text file)."""
+
+    def __init__(self, path, flush_every=100):
+        self.owned = isinstance(path, str)
+        self.file = open(path, 'a') if self.owned else path
+        self.flush_every = flush_every
+        self.count = 0
+
+    def write(self, record):
+        self.file.write(json.dumps(record, default=_jsonable) + '\n')
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self.file.flush()
+
+    def close(self):
+        self.file.flush()
+        if self.owned:
+            self.file.close()
+
+class ConsoleSink(NullSink):
+    """Prints every record as 'event: key=value, ...'."""
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, record):
+        fields = ', '.join(f'{key}={_format(value)}' for key, value in record.items()
+                           if key not in ('event', 'level', 'wall'))
+        print(f"{record['event']}: {fields}", file=self.stream or sys.stdout)
+
+def _jsonable(value):
+    # numpy scalars and arrays in JSON records
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+def _format(value):
+    if isinstance(value, float) and math.isfinite(value) and value != 0 \
+            and not 1e-3 <= abs(value) < 1e6:
+        return f'{value:.6e}'
+    if isinstance(value, float):
+        return f'{value:.6g}'
+    return str(value)
+
+class Telemetry:
+    """
+    Telemetry channel with a level, per-event rate limits and a sink.
+
+    Parameters:
+    sink : object with write(record) and close()
+        Destination of the records (ConsoleSink by default).
+    level : int
+        Lowest level that is emitted (DEBUG, INFO, WARNING or OFF).
+    every : int
+        Default rate limit: emit one record out of every `every` of an event.
+    min_interval : float
+        Default rate limit: seconds between two records of an event.
+    limits : dict
+        Per-event rate limits {event: {'every': ..., 'min_interval': ...}}.
+    """
+
+    def __init__(self, sink=None, level=INFO, every=1, min_interval=0.0, limits=None):
+        self.configure(sink, level, every, min_interval, limits)
+
+    def configure(self, sink=None, level=INFO, every=1, min_interval=0.0, limits=None):
+        self.sink = ConsoleSink() if sink is None else sink
+        self.level = level
+        self.every = every
+        self.min_interval = min_interval
+        self.limits = dict(limits or {})
+        self.counts = {}
+        self.last = {}
+        self.start = time.perf_counter()
+
+    def enabled(self, level):
+        """True if records of this level can reach the sink (use it to skip building costly fields)."""
+        return level >= self.level
+
+    def limit(self, event, every=None, min_interval=None):
+        """Set the rate limits of one event."""
+        limits = self.limits.setdefault(event, {})
+        if every is not None:
+            limits['every'] = every
+        if min_interval is not None:
+            limits['min_interval'] = min_interval
+
+    def emit(self, event, level=INFO, **fields):
+        """Send a record to the sink if the level and the rate limits of event allow it."""
+        if level < self.level:
+            return False
+        limits = self.limits.get(event, {})
+        count = self.counts.get(event, 0)
+        self.counts[event] = count + 1
+        if count % limits.get('every', self.every):
+            return False
+        now = time.perf_counter()
+        min_interval = limits.get('min_interval', self.min_interval)
+        if min_interval > 0 and now - self.last.get(event, -math.inf) < min_interval:
+            return False
+        self.last[event] = now
+
+        record = {'event': event, 'level': LEVEL_NAMES.get(level, str(level)),
+                  'wall': now - self.start}
+        record.update(fields)
+        self.sink.write(record)
+        return True
+
+    def close(self):
+        self.sink.close()
+
+# Module channel used by the solvers and scripts
+telemetry = Telemetry()
+
+def configure(sink=None, level=INFO, every=1, min_interval=0.0, limits=None):
+    """Reconfigure the module channel (closes the previous sink)."""
+    telemetry.sink.close()
+    telemetry.configure(sink, level, every, min_interval, limits)
+    return telemetry
+
+def test_telemetry():
+    """
+    This function checks the level filter, the per-event rate limit and the
+    JSONL sink.
+    """
+    import io
+
+    sink = MemorySink()
+    channel = Telemetry(sink, level=INFO, limits={'step': {'every': 10}})
+    for k in range(100):
+        channel.emit('newton_iteration', DEBUG, iteration=k, residual=1.0 / (k + 1))
+        channel.emit('step', INFO, step=k, time=0.01 * k, iterations=3, dt=0.01)
+    assert [r['step'] for r in sink.records] == list(range(0, 100, 10)), "Test case 1 failed"
+    assert not channel.enabled(DEBUG) and channel.enabled(WARNING), "Test case 2 failed"
+
+    stream = io.StringIO()
+    channel = Telemetry(JSONLSink(stream), level=DEBUG)
+    channel.emit('newton_iteration', DEBUG, iteration=2, residual=1.5e-7)
+    channel.close()
+    record = json.loads(stream.getvalue())
+    assert record['event'] == 'newton_iteration' and record['residual'] == 1.5e-7, "Test case 3 failed"
+
+    print("All test cases passed")
+
+if __name__ == "__main__":
+    test_telemetry()
@@ -0,0 +1,285 @@
+"""
+Implicit time integration schemes for the Newton solvers (Beam2D.objfun,
+DER.objfun and DER.objfun_planar).
+
+Every scheme writes the equations of motion of one step as
+
+    f(q1) = m * a(q1) - wF * G(q_e, v(q1)) - (1 - wF) * G0 = 0,
+
+where G(q, v) = F(q) - C v is the total (elastic + external + viscous)
+force, a(q1) = ca * q1 + acc0 and v(q1) = cv * q1 + vel0 are affine in the
+unknown positions q1, q_e = s * q1 + (1 - s) * q0 is the point where the
+forces are evaluated and G0 is the total force at the start of the step.
+The Jacobian is therefore
+
+    J = ca * M - wF * (s * dF/dq - cv * C),
+
+and a solver only needs the force and its Jacobian at q_e, whichever scheme
+is used. M and C can be matrices or the vectors of their diagonals (see
+ModelSetup.py). Schemes that need history (BDF2, Newmark, HHT) keep it in the
+object, so create one object per simulation and pass it to every step; after
+each step the velocity at the end of the step is in scheme.u.
+
+    'euler'    backward Euler (first order, strong numerical damping)
+    'bdf2'     second-order backward differentiation (first step is Euler)
+    'midpoint' implicit midpoint (second order, no numerical damping)
+    'newmark'  Newmark-beta, average acceleration by default (second order)
+    'hht'      Hilber-Hughes-Taylor alpha (second order, tunable damping of
+               the high frequencies)
+"""
+
+import numpy as np
+
+from ModelSetup import addDiagonal
+
+class BackwardEuler:
+    """
+    Backward Euler: a = (q1 - q0 - dt u0) / dt^2, forces at q1.
+    """
+    order = 1
+
+    def __init__(self):
+        self.s = 1.0
+        self.wF = 1.0
+        self.G0 = 0.0
+        self.u = None
+
+    def start(self, q0, u0, dt, m, force0, free_index):
+        """
+        Set up the coefficients of one step from the state (q0, u0).
+
+        force0 is a function returning G(q0, u0); it is only called by the
+        schemes that need it. m is the mass of every DOF; the DOFs that are
+        not in free_index are held fixed.
+        """
+        self.q0 = q0.copy()
+        self.u0 = u0.copy()
+        self.dt = dt
+        self.free = np.zeros(len(q0), dtype=bool)
+        self.free[free_index] = True
+
+        self.ca = 1 / dt**2
+        self.acc0 = - (q0 + dt * u0) / dt**2
+        self.cv = 1 / dt
+        self.vel0 = - q0 / dt
+
+    def acceleration(self, q1):
+        return self.ca * q1 + self.acc0
+
+    def velocity(self, q1):
+        """Velocity seen by the damping force."""
+        return self.cv * q1 + self.vel0
+
+    def evaluation_point(self, q1):
+        return self.s * q1 + (1 - self.s) * self.q0
+
+    def residual(self, q1, m, G):
+        """Equations of motion given the total force G at the evaluation point."""
+        return m * self.acceleration(q1) - self.wF * G - (1 - self.wF) * self.G0
+
+    def jacobian(self, mMat, JF, C=None):
+        """Jacobian of residual given dF/dq at the evaluation point and the damping matrix (or vectors)."""
+        J = -self.wF * self.s * JF
+        addDiagonal(J, self.ca, mMat)
+        if C is not None:
+            addDiagonal(J, self.wF * self.cv, C)
+        return J
+
+    def finish(self, q1, G):
+        """
+        Close the step at the converged q1 (G is the last total force) and
+        return the velocity at the end of the step.
+        """
+        self.u = (q1 - self.q0) / self.dt
+        self.u[~self.free] = 0
+        return self.u
+
+class BDF2(BackwardEuler):
+    """
+    Second-order backward differentiation on positions and velocities:
+    v1 = (3 q1 - 4 q0 + q_-1) / (2 dt), a1 = (3 v1 - 4 u0 + u_-1) / (2 dt).
+    The first step (or a step with a new dt) is backward Euler.
+    """
+    order = 2
+
+    def __init__(self):
+        super().__init__()
+        self.q_prev = None
+        self.u_prev = None
+        self.dt_prev = None
+
+    def start(self, q0, u0, dt, m, force0, free_index):
+        super().start(q0, u0, dt, m, force0, free_index)
+        self.bdf2 = self.q_prev is not None and self.dt_prev == dt
+        if self.bdf2:
+            self.cv = 3 / (2 * dt)
+            self.vel0 = (- 4 * q0 + self.q_prev) / (2 * dt)
+            self.ca = 3 / (2 * dt) * self.cv
+            self.acc0 = (3 * self.vel0 - 4 * u0 + self.u_prev) / (2 * dt)
+
+    def finish(self, q1, G):
+        if self.bdf2:
+            self.u = self.velocity(q1)
+            self.u[~self.free] = 0
+        else:
+            super().finish(q1, G)
+        self.q_prev, self.u_prev, self.dt_prev = self.q0, self.u0, self.dt
+        return self.u
+
+class ImplicitMidpoint(BackwardEuler):
+    """
+    Implicit midpoint: q1 = q0 + dt (u0 + u1) / 2 and
+    m (u1 - u0) / dt = G((q0 + q1) / 2, (u0 + u1) / 2).
+    """
+    order = 2
+
+    def __init__(self):
+        super().__init__()
+        self.s = 0.5
+
+    def start(self, q0, u0, dt, m, force0, free_index):
+        super().start(q0, u0, dt, m, force0, free_index)
+        self.ca = 2 / dt**2
+        self.acc0 = - 2 * q0 / dt**2 - 2 * u0 / dt
+
+    def finish(self, q1, G):
+        self.u = 2 * (q1 - self.q0) / self.dt - self.u0
+        self.u[~self.free] = 0
+        return self.u
+
+class Newmark(BackwardEuler):
+    """
+    Newmark-beta with the Hilber-Hughes-Taylor alpha modification:
+
+        q1 = q0 + dt u0 + dt^2 ((1/2 - beta) a0 + beta a1)
+        u1 = u0 + dt ((1 - gamma) a0 + gamma a1)
+        m a1 = (1 + alpha) G(q1, u1) - alpha G0
+
+    alpha = 0 is plain Newmark (beta = 1/4, gamma = 1/2 is the average
+    acceleration rule, unconditionally stable and without numerical damping).
+    """
+    order = 2
+
+    def __init__(self, beta=0.25, gamma=0.5, alpha=0.0):
+        super().__init__()
+        self.beta = beta
+        self.gamma = gamma
+        self.alpha = alpha
+        self.wF = 1 + alpha
+        self.a = None
+        self.G0 = None
+
+    def start(self, q0, u0, dt, m, force0, free_index):
+        super().start(q0, u0, dt, m, force0, free_index)
+        if self.a is None or self.G0 is None:
+            G0 = force0()
+            self.G0 = G0
+            self.a = np.zeros_like(q0)
+            self.a[self.free] = G0[self.free] / m[self.free]
+
+        beta, gamma = self.beta, self.gamma
+        self.ca = 1 / (beta * dt**2)
+        self.acc0 = - (q0 + dt * u0 + dt**2 * (0.5 - beta) * self.a) / (beta * dt**2)
+        self.cv = gamma * dt * self.ca
+        self.vel0 = u0 + dt * (1 - gamma) * self.a + gamma * dt * self.acc0
+
+    def finish(self, q1, G):
+        a1 = self.acceleration(q1)
+        a1[~self.free] = 0
+        self.u = self.u0 + self.dt * ((1 - self.gamma) * self.a + self.gamma * a1)
+        self.u[~self.free] = 0
+        self.a = a1
+        # Total force at the end of the step (the last Newton evaluation)
+        self.G0 = G
+        return self.u
+
+class HHT(Newmark):
+    """
+    HHT-alpha with alpha in [-1/3, 0], beta = (1 - alpha)^2 / 4 and
+    gamma = 1/2 - alpha (second order, damps the highest frequencies).
+    """
+
+    def __init__(self, alpha=-0.1):
+        if not -1/3 <= alpha <= 0:
+            raise ValueError('alpha must be in [-1/3, 0]')
+        super().__init__((1 - alpha)**2 / 4, 0.5 - alpha, alpha)
+
+def make_scheme(name='euler', **kwargs):
+    """
+    Time integration scheme by name: 'euler', 'bdf2', 'midpoint', 'newmark'
+    or 'hht'. Keyword arguments go to the constructor (beta, gamma for
+    'newmark', alpha for 'hht').
+    """
+    schemes = {'euler': BackwardEuler, 'bdf2': BDF2, 'midpoint': ImplicitMidpoint,
+               'newmark': Newmark, 'hht': HHT}
+    if name not in schemes:
+        raise ValueError(f'Unknown time integration scheme: {name}')
+    return schemes[name](**kwargs)
+
+def test_schemes():
+    """
+    This function integrates a damped two-DOF linear oscillator with every
+    scheme at dt and dt/2 and checks the observed order of accuracy against
+    the exact solution (1 for euler, 2 for the others), and that midpoint
+    and newmark keep the energy of the undamped oscillator while euler
+    loses it.
+    """
+    import scipy.linalg
+
+    m = np.array([1.0, 2.0])
+    K = np.array([[3.0, -1.0], [-1.0, 2.0]])
+    free_index = np.arange(2)
+    q_start, u_start = np.array([1.0, -0.5]), np.array([0.0, 0.3])
+
+    def simulate(scheme, C, dt, Nsteps):
+        # Newton loop of Beam2D.objfun on the linear forces F(q) = -K q
+        q0, u0 = q_start.copy(), u_start.copy()
+        for step in range(Nsteps):
+            scheme.start(q0, u0, dt, m, lambda: -K @ q0 - C * u0, free_index)
+            q1 = q0.copy()
+            for iteration in range(10):
+                G = -K @ scheme.evaluation_point(q1) - C * scheme.velocity(q1)
+                f = scheme.residual(q1, m, G)
+                if np.linalg.norm(f) < 1e-8:
+                    break
+                q1 = q1 - np.linalg.solve(scheme.jacobian(m, -K, C), f)
+            else:
+                raise AssertionError(f"Newton did not converge ({type(scheme).__name__})")
+            q0, u0 = q1, scheme.finish(q1, G).copy()
+        return q0, u0
+
+    def exact(C, T):
+        A = np.block([[np.zeros((2, 2)), np.eye(2)], [-K / m[:, None], -np.diag(C / m)]])
+        z = scipy.linalg.expm(A * T) @ np.concatenate([q_start, u_start])
+        return z[:2], z[2:]
+
+    C, T, dt = np.array([0.2, 0.1]), 2.0, 0.02
+    q_exact, u_exact = exact(C, T)
+    for k, name in enumerate(['euler', 'bdf2', 'midpoint', 'newmark', 'hht']):
+        errors = []
+        for h in (dt, dt / 2):
+            q, u = simulate(make_scheme(name), C, h, round(T / h))
+            errors.append(np.linalg.norm(np.concatenate([q - q_exact, u - u_exact])))
+        order = np.log2(errors[0] / errors[1])
+        expected = make_scheme(name).order
+        assert abs(order - expected) < 0.1, f"Test case {k + 1} failed ({name}: order {order:.3f})"
+
+    # Undamped oscillator over about 30 periods of the faster mode
+    energy = lambda q, u: 0.5 * u @ (m * u) + 0.5 * q @ K @ q
+    E0 = energy(q_start, u_start)
+    for k, name in enumerate(['midpoint', 'newmark']):
+        q, u = simulate(make_scheme(name), np.zeros(2), 0.1, 1000)
+        assert abs(energy(q, u) - E0) < 1e-10 * E0, f"Test case {k + 6} failed ({name})"
+    q, u = simulate(make_scheme('euler'), np.zeros(2), 0.1, 1000)
+    assert energy(q, u) < 0.5 * E0, "Test case 8 failed"
+
+    for name, kwargs in (('rk4', {}), ('hht', {'alpha': -0.5})):
+        try:
+            make_scheme(name, **kwargs)
+            assert False, "Test case 9 failed"
+        except ValueError:
+            pass
+    print("All test cases passed")
+
+if __name__ == "__main__":
+    test_schemes()
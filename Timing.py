@@ -0,0 +1,151 @@
+"""
+Per-phase timing of the Newton solvers (DER.objfun and DER.objfun_planar).
+
+Pass a SolverStats object as objfun(..., stats = stats) and it accumulates
+the wall time and the number of calls of every phase of the Newton loop
+(frame update: computeTimeParallel, getRefTwist, computeMaterialFrame;
+assembly: getFb, getFt, getFs; equations of motion; linear solve; update)
+and the number of Newton iterations of every step:
+
+    stats = SolverStats(summary_every = 100)  # print a summary every 100 steps
+    for timeStep in range(Nsteps):
+        q, u, a1, a2 = objfun(..., stats = stats)
+    print(stats.summary())
+    stats.as_dict()  # structured result, e.g. for a regression check
+
+Every phase costs two time.perf_counter() calls. Without a stats object the
+solvers use NULL_STATS, which does nothing.
+"""
+
+import time
+
+import numpy as np
+
+class SolverStats:
+    """
+    Accumulated wall time and calls of the solver phases and Newton
+    iterations per step.
+
+    Attributes:
+    time : dict
+        Total wall time [s] of every phase.
+    calls : dict
+        Number of calls of every phase.
+    newton_iterations : list
+        Newton iterations of every step.
+    """
+
+    def __init__(self, summary_every=0, printer=print):
+        self.summary_every = summary_every
+        self.printer = printer
+        self.reset()
+
+    def reset(self):
+        self.time = {}
+        self.calls = {}
+        self.newton_iterations = []
+
+    def tic(self):
+        return time.perf_counter()
+
+    def toc(self, phase, t0):
+        """Add the time since t0 (from tic) to phase and return the current time."""
+        t1 = time.perf_counter()
+        self.time[phase] = self.time.get(phase, 0.0) + t1 - t0
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+        return t1
+
+    def end_step(self, iterations):
+        """Record the Newton iterations of a step; print a summary every summary_every steps."""
+        self.newton_iterations.append(iterations)
+        if self.summary_every and len(self.newton_iterations) % self.summary_every == 0:
+            self.printer(self.summary())
+
+    @property
+    def steps(self):
+        return len(self.newton_iterations)
+
+    def as_dict(self):
+        """Phases (time, calls, time per call), step count and Newton iteration statistics."""
+        iterations = np.asarray(self.newton_iterations)
+        return {
+            'phases': {phase: {'time': t, 'calls': self.calls[phase],
+                               'time_per_call': t / self.calls[phase]}
+                       for phase, t in self.time.items()},
+            'total_time': sum(self.time.values()),
+            'steps': self.steps,
+            'newton_iterations': {
+                'total': int(iterations.sum()) if self.steps else 0,
+                'mean': float(iterations.mean()) if self.steps else 0.0,
+                'max': int(iterations.max()) if self.steps else 0,
+            },
+        }
+
+    def summary(self):
+        """Table of the phases sorted by total time."""
+        d = self.as_dict()
+        total = max(d['total_time'], 1e-300)
+        lines = [f"{d['steps']} steps, {d['newton_iterations']['total']} Newton iterations "
+                 f"(mean {d['newton_iterations']['mean']:.2f}, max {d['newton_iterations']['max']}), "
+                 f"{d['total_time']:.3f} s",
+                 f"{'phase':<22}{'time [s]':>10}{'share':>8}{'calls':>9}{'per call [ms]':>15}"]
+        for phase, p in sorted(d['phases'].items(), key=lambda item: -item[1]['time']):
+            lines.append(f"{phase:<22}{p['time']:>10.4f}{100 * p['time'] / total:>7.1f}%"
+                         f"{p['calls']:>9d}{1e3 * p['time_per_call']:>15.4f}")
+        return '\n'.join(lines)
+
+class NullStats:
+    """Stand-in for SolverStats that records nothing."""
+
+    def tic(self):
+        return 0.0
+
+    def toc(self, phase, t0):
+        return 0.0
+
+    def end_step(self, iterations):
+        pass
+
+NULL_STATS = NullStats()
+
+def test_solver_stats():
+    """
+    This function checks the accumulation of SolverStats on DER.objfun: the
+    expected phases are recorded once per Newton iteration and the Newton
+    iterations of every step are counted.
+    """
+    from DER import objfun, computeSpaceParallel
+
+    nv = 6
+    ndof = 4 * nv - 1
+    dl = 0.02
+    q0 = np.zeros(ndof)
+    q0[0::4] = np.arange(nv) * dl
+    massVector = np.full(ndof, 1e-4)
+    Fg = np.zeros(ndof)
+    Fg[2::4] = -1e-3
+    a1, a2 = computeSpaceParallel(np.array([0.0, 1.0, 0.0]), q0)
+    refLen = np.full(nv - 1, dl)
+    voronoiRefLen = np.full(nv, dl)
+
+    stats = SolverStats()
+    u = np.zeros(ndof)
+    q = q0.copy()
+    for step in range(3):
+        q, u, a1, a2 = objfun(q.copy(), q, u, a1, a2, np.arange(7, ndof), 1e-2, 1e-10,
+                              np.zeros(nv), massVector, np.diag(massVector), 100.0, refLen,
+                              1e-4, 1e-4, voronoiRefLen, np.zeros((nv, 2)), np.zeros(nv), Fg,
+                              stats = stats)
+
+    d = stats.as_dict()
+    iterations = sum(stats.newton_iterations)
+    assert d['steps'] == 3 and iterations >= 3, "Test case 1 failed"
+    for phase in ('computeTimeParallel', 'getRefTwist', 'computeMaterialFrame',
+                  'getFb', 'getFt', 'getFs', 'solve', 'update'):
+        assert d['phases'][phase]['calls'] == iterations, "Test case 2 failed"
+    assert 'getFb' in stats.summary(), "Test case 3 failed"
+
+    print("All test cases passed")
+
+if __name__ == "__main__":
+    test_solver_stats()
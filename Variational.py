@@ -0,0 +1,256 @@
+"""
+Energy-momentum time integration of the DER rod for long undamped runs.
+
+The implicit midpoint rule (TimeIntegrators.ImplicitMidpoint) is the
+variational integrator of the midpoint discrete Lagrangian
+L_d = dt (1/2 v^T M v - V((q0 + q1) / 2)): it is symplectic and preserves
+the momentum maps of the rod, so its energy error stays bounded instead of
+being dissipated as in backward Euler. objfun_variational replaces the
+midpoint gradient of the potential by a discrete gradient (Gonzalez 1996),
+
+    grad_d V = grad V(q_mid) + (V(q1) - V(q0) - grad V(q_mid) . dq) / (d . dq) d,
+
+which makes the total energy (kinetic + stretching + bending + twisting -
+gravity work) exactly conserved up to the Newton tolerance at any dt. The
+correction direction d = M dq with the mass-weighted mean translation
+removed, so the correction exerts no net force and linear momentum is kept
+as well. totalEnergy and energyDrift provide the diagnostic.
+"""
+
+import numpy as np
+
+from DER import (computeTimeParallel, computeTangent, getRefTwist, computeMaterialFrame,
+                 getFs, getFb, getFt, getForces, getEnergies)
+from ModelSetup import addDiagonal
+
+def _frames(q, q0, a1, a2, refTwist):
+    # Reference frame, reference twist and material frame at q, transported from q0
+    a1q, a2q = computeTimeParallel(a1, q0, q)
+    refTwist_q = getRefTwist(a1q, computeTangent(q), refTwist.copy())
+    m1, m2 = computeMaterialFrame(a1q, a2q, q[3::4])
+    return a1q, a2q, refTwist_q, m1, m2
+
+def elasticEnergy(q, m1, m2, refTwist, EA, refLen, EI, GJ, voronoiRefLen, kappaBar, twistBar):
+    """Total elastic energy (stretching + bending + twisting) of the rod."""
+    return sum(getEnergies(q, m1, m2, refTwist, EA, refLen, EI, GJ,
+                           voronoiRefLen, kappaBar, twistBar))
+
+def totalEnergy(q, u, a1, a2, refTwist, massVector,
+                EA, refLen, EI, GJ, voronoiRefLen, kappaBar, twistBar, Fg):
+    """
+    Kinetic + elastic energy minus the work potential of the constant
+    external force Fg, with the reference frame (a1, a2) and reference twist
+    at q.
+    """
+    m1, m2 = computeMaterialFrame(a1, a2, q[3::4])
+    return (0.5 * np.dot(massVector * u, u)
+            + elasticEnergy(q, m1, m2, refTwist, EA, refLen, EI, GJ, voronoiRefLen, kappaBar, twistBar)
+            - np.dot(Fg, q))
+
+def energyDrift(energy, scale=None):
+    """
+    Relative energy drift (E - E[0]) / scale of an energy history. scale
+    defaults to the largest |E| of the history.
+    """
+    energy = np.asarray(energy)
+    if scale is None:
+        scale = max(np.max(np.abs(energy)), np.finfo(float).tiny)
+    return (energy - energy[0]) / scale
+
+def _momentum_free_projection(massVector, freeIndex):
+    # Symmetric matrix P with d = P dq: M dq restricted to the free DOFs,
+    # minus the mass-weighted mean translation of the nodes (the twist DOFs
+    # are not translations)
+    ndof = len(massVector)
+    w = np.zeros(ndof)
+    w[freeIndex] = massVector[freeIndex]
+    P = np.diag(w)
+    for k in range(3):
+        wk = np.zeros(ndof)
+        wk[k::4] = w[k::4]
+        if np.sum(wk) > 0:
+            P -= np.outer(wk, wk) / np.sum(wk)
+    return P
+
+def _residual(q, q0, u, a1, a2, refTwist, dt, massVector, mMat, params, Fg, V0, P):
+    # Residual of the energy-momentum step at q and its Jacobian
+    EA, refLen, EI, GJ, voronoiRefLen, kappaBar, twistBar = params
+    dq = q - q0
+
+    # Gradient and Hessian of the elastic energy at the midpoint
+    qMid = 0.5 * (q0 + q)
+    a1m, a2m, refTwist_m, m1m, m2m = _frames(qMid, q0, a1, a2, refTwist)
+    Fb, Jb = getFb(qMid, m1m, m2m, kappaBar, EI, voronoiRefLen)
+    Ft, Jt = getFt(qMid, refTwist_m, twistBar, GJ, voronoiRefLen)
+    Fs, Js = getFs(qMid, EA, refLen)
+    gradV = - (Fb + Ft + Fs)
+    hessV = - (Jb + Jt + Js)
+    J = addDiagonal(0.5 * hessV, 2 / dt**2, mMat)
+
+    # Discrete gradient correction beta * d and its derivative
+    if P is not None:
+        d = P @ dq
+        D = np.dot(d, dq)
+        if D > 0:
+            a1q, a2q, refTwist_q, m1q, m2q = _frames(q, q0, a1, a2, refTwist)
+            V1 = elasticEnergy(q, m1q, m2q, refTwist_q, *params)
+            gradV1 = - getForces(q, m1q, m2q, refTwist_q, *params)
+            N = V1 - V0 - np.dot(gradV, dq)
+            beta = N / D
+            dN = gradV1 - gradV - 0.5 * hessV @ dq
+            gradV = gradV + beta * d
+            J = J + beta * P + np.outer(d, dN / D - 2 * beta * d / D)
+
+    f = 2 * massVector * (dq / dt - u) / dt + gradV - Fg
+    return f, J
+
+def objfun_variational(qGuess, q0, u, a1, a2,
+                       freeIndex, # Boundary conditions
+                       dt, tol, # time stepping parameters
+                       refTwist, # reference twist at q0
+                       massVector, mMat, # Mass vector and mass matrix
+                       EA, refLen, # Stretching stiffness and reference length
+                       EI, GJ, voronoiRefLen, kappaBar, twistBar, # bending and twisting
+                       Fg,
+                       maximum_iter = 50,
+                       conserve_energy = True):
+    """
+    One energy-momentum step of the undamped DER equations of motion:
+
+        q1 - q0 = dt (u0 + u1) / 2,   M (u1 - u0) / dt = - grad_d V + Fg.
+
+    With conserve_energy = False grad_d V = grad V(q_mid) (implicit midpoint,
+    i.e. the midpoint variational integrator). The Newton matrix is
+    2 M / dt^2 + 1/2 Hess V(q_mid) plus the derivative of the
+    discrete-gradient correction, and the Newton step is halved until the
+    residual decreases (the midpoint equations are less forgiving than
+    backward Euler far from the solution). q0 + dt * u is a good qGuess.
+
+    Returns:
+    q, u : np.ndarray
+        DOFs and velocities at the end of the step.
+    a1, a2 : np.ndarray
+        Reference frame at q.
+    refTwist : np.ndarray
+        Reference twist at q.
+    flag : int
+        1 on success, -1 if maximum_iter was exceeded.
+    """
+    params = (EA, refLen, EI, GJ, voronoiRefLen, kappaBar, twistBar)
+
+    # Elastic energy at the start of the step
+    m1, m2 = computeMaterialFrame(a1, a2, q0[3::4])
+    V0 = elasticEnergy(q0, m1, m2, refTwist, *params)
+
+    P = _momentum_free_projection(massVector, freeIndex) if conserve_energy else None
+    args = (q0, u, a1, a2, refTwist, dt, massVector, mMat, params, Fg, V0, P)
+
+    q = qGuess.copy()
+    f, J = _residual(q, *args)
+    error = np.linalg.norm(f[freeIndex])
+    flag = 1
+    iter_count = 0
+    while error > tol:
+        if iter_count == maximum_iter:
+            flag = -1
+            break
+        iter_count += 1
+
+        dq_free = np.linalg.solve(J[np.ix_(freeIndex, freeIndex)], f[freeIndex])
+
+        # Backtracking on the norm of the residual
+        alpha = 1.0
+        while True:
+            q_trial = q.copy()
+            q_trial[freeIndex] -= alpha * dq_free
+            f_trial, J_trial = _residual(q_trial, *args)
+            error_trial = np.linalg.norm(f_trial[freeIndex])
+            if error_trial < error or alpha < 1e-3:
+                break
+            alpha /= 2
+
+        q, f, J, error = q_trial, f_trial, J_trial, error_trial
+
+    u1 = 2 * (q - q0) / dt - u
+    a1q, a2q, refTwist_q, m1q, m2q = _frames(q, q0, a1, a2, refTwist)
+    return q, u1, a1q, a2q, refTwist_q, flag
+
+def test_energy_conservation():
+    """
+    This function runs an undamped, clamped, slightly kinked and twisted rod
+    under gravity with a large step and checks that the energy-momentum
+    scheme keeps the energy to round-off level while backward Euler and the
+    implicit midpoint rule do not, and that a free rod keeps its linear
+    momentum.
+    """
+    from DER import computeSpaceParallel, objfun
+
+    nv = 8
+    ndof = 4 * nv - 1
+    r0, Y, rho = 1e-3, 1e7, 1000.0
+    EA = Y * np.pi * r0**2
+    EI = Y * np.pi * r0**4 / 4
+    GJ = Y / 3 * np.pi * r0**4 / 2
+    dl = 0.2 / (nv - 1)
+    refLen = np.full(nv - 1, dl)
+    voronoiRefLen = np.full(nv, dl)
+    voronoiRefLen[[0, -1]] = dl / 2
+    kappaBar = np.zeros((nv, 2))
+    twistBar = np.zeros(nv)
+
+    dm = np.pi * r0**2 * dl * rho
+    massVector = np.zeros(ndof)
+    for k in range(3):
+        massVector[k::4] = dm
+    massVector[3::4] = 0.5 * dm * r0**2
+    mMat = massVector
+    Fg = np.zeros(ndof)
+    Fg[2::4] = -9.81 * dm
+
+    rng = np.random.default_rng(3)
+    q0 = np.zeros(ndof)
+    q0[0::4] = np.arange(nv) * dl
+    q0[5::4] += 1e-4 * rng.standard_normal(nv - 1) # small transverse kinks
+    q0[7::4] += 1e-2 * rng.standard_normal(nv - 2) # and twist
+    a1_first = np.cross(computeTangent(q0)[0, :], np.array([0.0, 0.0, 1.0]))
+    a1, a2 = computeSpaceParallel(a1_first / np.linalg.norm(a1_first), q0)
+    refTwist = getRefTwist(a1, computeTangent(q0), np.zeros(nv))
+    params = (EA, refLen, EI, GJ, voronoiRefLen, kappaBar, twistBar)
+
+    dt, Nsteps = 5e-3, 40
+    tol = EI / 0.2**2 * 1e-9
+    freeIndex = np.arange(7, ndof)
+    drift = {}
+    for method in ('energy', 'midpoint', 'euler'):
+        q, u, A1, A2, rT = q0.copy(), np.zeros(ndof), a1, a2, refTwist.copy()
+        E = [totalEnergy(q, u, A1, A2, rT, massVector, *params, Fg)]
+        for step in range(Nsteps):
+            if method == 'euler':
+                q, u, A1, A2 = objfun(q.copy(), q, u, A1, A2, freeIndex, dt, tol, rT,
+                                      massVector, mMat, *params, Fg)
+                rT = getRefTwist(A1, computeTangent(q), rT)
+            else:
+                q, u, A1, A2, rT, flag = objfun_variational(q + dt * u, q, u, A1, A2, freeIndex, dt, tol,
+                                                            rT, massVector, mMat, *params, Fg,
+                                                            conserve_energy = method == 'energy')
+                assert flag > 0, "Newton did not converge"
+            E.append(totalEnergy(q, u, A1, A2, rT, massVector, *params, Fg))
+        drift[method] = np.max(np.abs(energyDrift(E)))
+
+    assert drift['energy'] < 1e-6, "Test case 1 failed"
+    assert drift['energy'] < 1e-2 * min(drift['midpoint'], drift['euler']), "Test case 2 failed"
+
+    # Free rod without gravity: linear momentum is conserved
+    allIndex = np.arange(ndof)
+    u0 = 0.1 * rng.standard_normal(ndof)
+    q, u, A1, A2, rT, flag = objfun_variational(q0.copy(), q0, u0, a1, a2, allIndex, dt, tol, refTwist,
+                                                massVector, mMat, *params, np.zeros(ndof))
+    for k in range(3):
+        P0 = np.dot(massVector[k::4], u0[k::4])
+        P1 = np.dot(massVector[k::4], u[k::4])
+        assert abs(P1 - P0) < 1e-8 * max(abs(P0), 1e-12) + 1e-12, "Test case 3 failed"
+
+    print("All test cases passed")
+
+if __name__ == "__main__":
+    test_energy_conservation()